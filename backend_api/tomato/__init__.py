@@ -59,9 +59,10 @@ from lib import util, cache
 stopped = threading.Event()
 
 import dump
+import change_listener
 
 def start():
-	logging.openDefault(settings.settings.get_log_filename())
+	logging.openDefault(settings.settings.get_log_filename(), config=settings.settings.get_logging_settings())
 	global starttime
 	rpcserver.start()
 	starttime = time.time()
@@ -71,13 +72,14 @@ def start():
 		print >>sys.stderr, "Running without tasks"
 	cache.init()# this does not depend on anything (except the scheduler variable being initialized), and nothing depends on this. No need to hurry this.
 	dump.init()
+	change_listener.init()
 
 def reload_(*args):
 	print >>sys.stderr, "Reloading..."
 	logging.closeDefault()
 	settings.settings.reload()
 	# fixme: all cached methods should be invalidated here
-	logging.openDefault(settings.settings.get_log_filename())
+	logging.openDefault(settings.settings.get_log_filename(), config=settings.settings.get_logging_settings())
 	#stopRPCserver()
 	#startRPCserver()
 
@@ -1,5 +1,5 @@
 from ..lib.error import UserError
-from .. import scheduler
+from .. import scheduler, change_listener
 import traceback, sys
 from api_helpers import getCurrentUserInfo
 from ..lib.debug import run
@@ -23,7 +23,8 @@ def _debug_stats_withoutauth():
 		"scheduler": scheduler.info(),
 		"threads": map(traceback.extract_stack, sys._current_frames().values()),
 		"system": service_status(),
-		"problems": problems()
+		"problems": problems(),
+		"change_feeds": change_listener.info()
 	}
 
 def debug_stats(tomato_module=Config.TOMATO_MODULE_BACKEND_API):
@@ -19,7 +19,7 @@ from api_helpers import checkauth, getCurrentUserInfo
 from ..lib.service import get_backend_core_proxy
 from ..lib.remote_info import get_host_info, get_site_info, get_host_list, HostInfo
 
-def host_list(site=None, organization=None):
+def host_list(site=None, organization=None, unhealthy=False):
 	"""
 	Returns a list of hosts. Depending on the parameter it either returns:
 		Site given: All hosts belonging to this site
@@ -27,9 +27,10 @@ def host_list(site=None, organization=None):
 		Both given: All hosts belonging to the given site, ignoring organization
 	:param site: Site name to filter hosts belonging to this site
 	:param organization: Organization name to filter hosts belonging to this organization
+	:param bool unhealthy: only return hosts with problems
 	:return: list of hosts
 	"""
-	return get_host_list(site, organization)
+	return get_host_list(site, organization, unhealthy)
 
 def host_create(name, site, attrs=None):
 	"""
@@ -141,8 +141,8 @@ def statistics():
 		information about the testbed's resources (host load, host availability, available resources, ...)
 	"""
 	stats = {}
-	for mod in Config.TOMATO_BACKEND_MODULES:
-		if not is_self(mod):
-			stat_update = get_tomato_inner_proxy(mod).statistics()
-			stats = joinDicts(stats, stat_update)
+	# query all modules at the same time
+	calls = [get_tomato_inner_proxy(mod).statistics.submit() for mod in Config.TOMATO_BACKEND_MODULES if not is_self(mod)]
+	for call in calls:
+		stats = joinDicts(stats, call.get())
 	return stats
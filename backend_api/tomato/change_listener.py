@@ -0,0 +1,35 @@
+from .lib.settings import settings, Config
+from .lib.service import get_tomato_inner_proxy
+from .lib.changefeed import ChangeListener
+from .lib import remote_info
+from . import scheduler
+
+# modules whose objects are cached in remote_info
+FOLLOWED_MODULES = (Config.TOMATO_MODULE_BACKEND_CORE, Config.TOMATO_MODULE_BACKEND_USERS)
+
+listeners = {}
+
+def _create_listener(tomato_module):
+	def fetch(epoch, seq):
+		return get_tomato_inner_proxy(tomato_module).change_feed(epoch, seq)
+	def on_reset():
+		remote_info.set_list_timeout(tomato_module, None)
+		remote_info.reset_caches(tomato_module)
+	return ChangeListener(fetch, remote_info.apply_change, on_reset)
+
+def poll(tomato_module):
+	listener = listeners[tomato_module]
+	listener.poll()
+	if listener.synchronized:
+		remote_info.set_list_timeout(tomato_module, settings.get_change_feed_settings()['list-cache-timeout'])
+
+def info():
+	return {module: listener.info() for module, listener in listeners.iteritems()}
+
+def init():
+	conf = settings.get_change_feed_settings()
+	if not conf['enabled']:
+		return
+	for tomato_module in FOLLOWED_MODULES:
+		listeners[tomato_module] = _create_listener(tomato_module)
+		scheduler.scheduleRepeated(conf['poll-interval'], poll, tomato_module, immediate=True, random_offset=False)
@@ -25,9 +25,10 @@ from .lib.error import Error, UserError, InternalError
 from lib.settings import settings
 
 def logCall(function, args, kwargs):
-	logging.log(category="api", method=function.__name__, args=args, kwargs=kwargs, user=getCurrentUserInfo().get_username() if getCurrentUserInfo() else None)
+	logging.logCall(function, args, kwargs, user=getCurrentUserInfo().get_username() if getCurrentUserInfo() else None)
 
 def handleError(error, function, args, kwargs):
+	logging.logCallError(function)
 	if not isinstance(error, Error):
 		if isinstance(error, TypeError) and function.__name__ in str(error):
 			error = UserError.wrap(error, data={"function": function.__name__, "args": args, "kwargs": kwargs})
@@ -36,8 +37,8 @@ def handleError(error, function, args, kwargs):
 	exceptionhandling.writedown_current_exception(exc=error)
 	return error
 
-def afterCall(*args, **kwargs):
-	pass
+def afterCall(function, args, kwargs, result):
+	logging.logCallEnd(function, args, kwargs, result)
 
 def runServer(server):
 	try:
@@ -41,13 +41,14 @@ database_obj = getattr(database_connnection, database_settings['database'])
 from lib import logging
 
 from lib import tasks #@UnresolvedImport
-scheduler = tasks.TaskScheduler(maxLateTime=30.0, minWorkers=5, maxWorkers=settings.settings.get_tasks_settings()[settings.Config.TASKS_MAX_WORKERS])
+scheduler = tasks.TaskScheduler(maxLateTime=30.0, minWorkers=5, maxWorkers=settings.settings.get_tasks_settings()[settings.Config.TASKS_MAX_WORKERS],
+                                classes=settings.settings.get_tasks_settings().get(settings.Config.TASKS_CLASSES))
 
 starttime = time.time()
 
 from . import db, host, rpcserver #@UnresolvedImport
 from lib.cmd import process #@UnresolvedImport
-from lib import util, cache, exceptionhandling #@UnresolvedImport
+from lib import util, cache, exceptionhandling, locks #@UnresolvedImport
 from lib.error import Error, InternalError
 
 def handleError():
@@ -63,7 +64,8 @@ import hierarchy
 hierarchy.init()
 
 def start():
-	logging.openDefault(settings.settings.get_log_filename())
+	logging.openDefault(settings.settings.get_log_filename(), config=settings.settings.get_logging_settings())
+	locks.configure(statistics=settings.settings.get_lock_settings()['statistics'])
 	if not os.environ.has_key("TOMATO_NO_MIGRATE"):
 		db.migrate()
 	else:
@@ -86,7 +88,7 @@ def reload_(*args):
 	logging.closeDefault()
 	settings.settings.reload()
 	# fixme: all cached methods should be invalidated here
-	logging.openDefault(settings.settings.get_log_filename())
+	logging.openDefault(settings.settings.get_log_filename(), config=settings.settings.get_logging_settings())
 	#stopRPCserver()
 	#startRPCserver()
 
@@ -22,14 +22,14 @@ from connections import connection_create, connection_info, connection_modify, c
 
 from debug import debug_stats, ping, debug_execute_task, debug_debug_internal_api_call, debug_throw_error
 
-from dump import dump_list
+from dump import dump_list, dump_info
 
 from elements import element_info, element_action, element_create, element_modify, element_remove
 
-from host import host_dump_list, host_name_list,\
+from host import host_dump_list, host_dump_info, host_name_list,\
 	host_modify, host_create, host_info, host_list, host_action, host_remove, host_users, host_execute_function
 
-from misc import link_statistics, notifyAdmins, statistics
+from misc import link_statistics, notifyAdmins, statistics, change_feed
 
 from network import network_create, network_info, network_list, network_modify, network_remove
 
@@ -1,6 +1,7 @@
-from .. import scheduler
+from .. import scheduler, host
 from ..service_status import service_status, problems
 from ..lib.debug import run
+from ..lib import locks
 from ..lib.error import InternalError
 from ..lib.exceptionhandling import wrap_and_handle_current_exception
 import traceback, sys
@@ -9,13 +10,17 @@ def ping():
 	return True
 
 def debug_stats():
-	from .. import database_obj
+	from .. import database_obj, rpcserver
 	stats = {
 		"db": database_obj.command("dbstats"),
 		"scheduler": scheduler.info(),
+		"rpc_server": rpcserver.info(),
 		"threads": map(traceback.extract_stack, sys._current_frames().values()),
 		"system": service_status(),
-		"problems": problems()
+		"problems": problems(),
+		"locks": locks.info(),
+		"host_sync": host.syncStatistics(),
+		"accounting": host.accountingStatistics()
 	}
 	stats["db"]["collections"] = {name: database_obj.command("collstats", name) for name in
 	                              database_obj.collection_names()}
@@ -28,7 +28,7 @@ def _getHost(name):
 	UserError.check(h, code=UserError.ENTITY_DOES_NOT_EXIST, message="Host with that name does not exist", data={"name": name})
 	return h
 
-def _host_list(site=None, organization=None):
+def _host_list(site=None, organization=None, unhealthy=False):
 	"""
 	Returns a list of hosts. Depending on the parameter it either returns:
 		Site given: All hosts belonging to this site
@@ -36,25 +36,28 @@ def _host_list(site=None, organization=None):
 		Both given: All hosts belonging to the given site, ignoring organization
 	:param site: Site name to filter hosts belonging to this site
 	:param organization: Organization name to filter hosts belonging to this organization
+	:param bool unhealthy: only hosts with problems
 	:return: list of hosts
 	"""
+	hosts = Host.objects(healthy=False) if unhealthy else Host.objects
 	if site:
 		UserError.check(Site.get(site) is not None, code=UserError.ENTITY_DOES_NOT_EXIST, message="Site with that name does not exist")
 		site = Site.get(site)
-		return Host.objects(site=site)
+		return hosts.filter(site=site)
 	elif organization:
 		UserError.check(get_organization_info(organization).exists(), code=UserError.ENTITY_DOES_NOT_EXIST, message="Organization with that name does not exist")
 		sites = Site.objects(organization=organization)
-		return Host.objects(site__in=sites)
+		return hosts.filter(site__in=sites)
 	else:
-		return Host.objects.all()
+		return hosts.all()
 
-def host_list(site=None, organization=None):
+def host_list(site=None, organization=None, unhealthy=False):
 	"""
 	return a list of hosts
+	:param bool unhealthy: only hosts with problems
 	:rtype: list(str)
 	"""
-	return [h.info() for h in _host_list(site, organization)]
+	return [h.info() for h in _host_list(site, organization, unhealthy)]
 
 def host_name_list(site=None, organization=None):
 	"""
@@ -63,16 +66,29 @@ def host_name_list(site=None, organization=None):
 	"""
 	return [h.name for h in _host_list(site, organization)]
 
-def host_dump_list(name, after):
+def host_dump_list(name, after, after_id=None, limit=None, include_data=True):
 	"""
-	return all dumps of this host since last_updatetime.
+	return the dumps of this host since last_updatetime, see dump_list of the hostmanager.
 	return None if the host is currently unreachable
 	"""
 	host = _getHost(name)
 	if not host.is_reachable():
 		return None
 	try:
-		return host.getProxy().dump_list(after)
+		return host.getProxy().dump_list(after, after_id, limit, include_data)
+	except TransportError:
+		return None
+
+def host_dump_info(name, dump_id):
+	"""
+	return a dump of this host including its data.
+	return None if the host is currently unreachable or the dump does not exist anymore.
+	"""
+	host = _getHost(name)
+	if not host.is_reachable():
+		return None
+	try:
+		return host.getProxy().dump_info(dump_id)
 	except TransportError:
 		return None
 
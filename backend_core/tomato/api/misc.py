@@ -20,6 +20,14 @@ from ..lib.cache import cached
 from ..lib.service import get_backend_users_proxy
 from ..lib.settings import settings
 from ..lib.userflags import Flags
+from ..lib import changefeed
+
+def change_feed(epoch=None, seq=0):
+	"""
+	get the objects that have changed since the given position of the change feed.
+	Used by backend_api to keep its caches up to date. See lib.changefeed.ChangeFeed.since.
+	"""
+	return changefeed.since(epoch, seq)
 
 def link_statistics(siteA, siteB):
 	return link.getStatisticsInfo(siteA, siteB)
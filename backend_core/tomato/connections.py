@@ -26,26 +26,45 @@ from .lib.error import UserError, InternalError
 from .lib.cache import cached #@UnresolvedImport
 from .lib.constants import ActionName, StateName, TypeName, ConnectionDistance
 from .lib.exceptionhandling import wrap_and_handle_current_exception
+from .lib.hierarchy import ClassName
+from .lib import changefeed, locks
 from .link import getStatistics
+from .host import memoized
 
 REMOVE_ACTION = "(remove)"
 
 ST_CREATED = StateName.CREATED
 ST_STARTED = StateName.STARTED
 
-LOCKS = {}
-LOCKS_LOCK = threading.RLock()
+LOCKS = locks.LockRegistry("connection_start_stop")
 
 def getLock(obj):
-	with LOCKS_LOCK:
-		if not obj.id in LOCKS:
-			LOCKS[obj.id] = threading.RLock()
-		return LOCKS[obj.id]
-	
-def removeLock(obj):
-	with LOCKS_LOCK:
-		with getLock(obj):
-			del LOCKS[obj.id]
+	return LOCKS.get(obj.id)
+
+def _linkStatistics(siteA, siteB):
+	link_stats_ = getStatistics(siteA, siteB)
+	if link_stats_:
+		link_stats_info = link_stats_.quickInfo()
+		recent = None
+		average = None
+		for key in ["5minutes", "hour", "day", "month", "year"]:
+			if link_stats_info[key]:
+				recent = link_stats_info[key]
+				break
+		for key in ["year", "month", "day", "hour", "5minutes"]:
+			if link_stats_info[key]:
+				average = link_stats_info[key]
+				break
+		if recent or average:
+			link_stats = {
+				"recent": recent.info(),
+				"average": average.info()
+			}
+		else:
+			link_stats = None
+	else:
+		link_stats = None
+	return link_stats
 
 starting_list = set()
 starting_list_lock = threading.RLock()
@@ -460,12 +479,7 @@ class Connection(LockedStatefulEntity, BaseDocument):
 	def host_info(self):
 		host = self.host
 		if not host: return None
-		return {
-			'address': host.address,
-			'problems':	host.problems(),
-			'site':	host.site.name,
-			'fileserver_port': host.hostInfo.get('fileserver_port', None)
-		}
+		return host.componentInfo()
 
 	def link_stats(self):
 		if self.elementFrom.state == ST_CREATED or self.elementTo.state == ST_CREATED:
@@ -487,28 +501,7 @@ class Connection(LockedStatefulEntity, BaseDocument):
 			else:
 				distance = ConnectionDistance.INTER_SITE
 
-			link_stats_ = getStatistics(siteA, siteB)
-			if link_stats_:
-				link_stats_info = link_stats_.quickInfo()
-				recent = None
-				average = None
-				for key in ["5minutes", "hour", "day", "month", "year"]:
-					if link_stats_info[key]:
-						recent = link_stats_info[key]
-						break
-				for key in ["year", "month", "day", "hour", "5minutes"]:
-					if link_stats_info[key]:
-						average = link_stats_info[key]
-						break
-				if recent or average:
-					link_stats = {
-						"recent": recent.info(),
-						"average": average.info()
-					}
-				else:
-					link_stats = None
-			else:
-				link_stats = None
+			link_stats = memoized(("link_stats", siteA, siteB), lambda: _linkStatistics(siteA, siteB))
 
 		return {
 			"hostA": hostA,
@@ -519,6 +512,14 @@ class Connection(LockedStatefulEntity, BaseDocument):
 			"statistics": link_stats
 		}
 
+	CHANGE_CLASS = ClassName.CONNECTION
+
+	def publishChange(self, membership=False):
+		super(Connection, self).publishChange(membership)
+		if self.topologyId:
+			# topology info contains the connection list and the state of its components
+			changefeed.publish(ClassName.TOPOLOGY, self.topologyId)
+
 	ACTIONS = {
 		Entity.REMOVE_ACTION: StatefulAction(_remove, check=checkRemove)
 	}
@@ -103,6 +103,53 @@ class DataHub:
 
 data = DataHub()
 
+def prefetch(documents, fields, loaded=None):
+	"""
+	resolve the references in the given fields of all documents with one query per referenced class, similar
+	to QuerySet.select_related() but limited to these fields.
+	Fields that a document does not have are skipped, so documents of different classes can be mixed.
+	:param documents: documents to resolve the references of
+	:param list fields: names of ReferenceFields or ListFields of ReferenceFields
+	:param dict loaded: id -> document, documents that have been loaded before. Newly loaded documents are added.
+	:return: the referenced documents
+	:rtype: list
+	"""
+	if loaded is None:
+		loaded = {}
+	refs = []  # (document, field name, is list)
+	pending = {}  # document class -> set of ids
+	for doc in documents:
+		for name in fields:
+			field = doc._fields.get(name)
+			isList = isinstance(field, ListField)
+			refField = field.field if isList else field
+			if not isinstance(refField, ReferenceField):
+				continue
+			values = doc._data.get(name)
+			if not isList:
+				values = [values]
+			refs.append((doc, name, isList))
+			for value in values or []:
+				if isinstance(value, bson.DBRef) and not value.id in loaded:
+					pending.setdefault(refField.document_type, set()).add(value.id)
+	for cls, ids in pending.items():
+		for obj in cls.objects(id__in=list(ids)):
+			loaded[obj.id] = obj
+	referenced = {}
+	for doc, name, isList in refs:
+		values = doc._data.get(name)
+		if not values:
+			continue
+		if not isList:
+			values = [values]
+		resolved = [loaded.get(v.id, v) if isinstance(v, bson.DBRef) else v for v in values]
+		if any(isinstance(v, bson.DBRef) for v in values):
+			doc._data[name] = resolved if isList else resolved[0]
+		for obj in resolved:
+			if isinstance(obj, Document):
+				referenced[obj.id] = obj
+	return referenced.values()
+
 def js_code(name):
 	path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "%s.js" % name)
 	return open(path).read()
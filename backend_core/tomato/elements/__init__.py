@@ -25,6 +25,8 @@ from ..lib.cache import cached
 from ..lib.error import UserError
 from ..connections import Connection
 from ..lib.constants import ActionName
+from ..lib.hierarchy import ClassName
+from ..lib import changefeed
 
 TYPES = {}
 
@@ -279,6 +281,14 @@ class Element(LockedStatefulEntity, BaseDocument):
 					sitePrefs[site] = sitePrefs.get(site, 0.0) + pref
 		return (hostPrefs, sitePrefs)
 
+	def placementRequest(self):
+		"""
+		get the arguments of host.select() that action_prepare() uses to place this element.
+		Elements that do not select a host when they are prepared return None.
+		:rtype: dict
+		"""
+		return None
+
 	def triggerConnectionStart(self):
 		if self.connection:
 			self.connection.triggerStart()
@@ -379,12 +389,7 @@ class Element(LockedStatefulEntity, BaseDocument):
 	def host_info(self):
 		host = self.host
 		if not host: return None
-		return {
-			'address': host.address,
-			'problems':	host.problems(),
-			'site':	host.site.name,
-			'fileserver_port': host.hostInfo.get('fileserver_port', None)
-		}
+		return host.componentInfo()
 
 	@property
 	def childrenIds(self):
@@ -394,6 +399,14 @@ class Element(LockedStatefulEntity, BaseDocument):
 			chs = [ch.id for ch in self.children.only('id')]
 		return map(str, chs)
 
+	CHANGE_CLASS = ClassName.ELEMENT
+
+	def publishChange(self, membership=False):
+		super(Element, self).publishChange(membership)
+		if self.topologyId:
+			# topology info contains the element list and the state of its components
+			changefeed.publish(ClassName.TOPOLOGY, self.topologyId)
+
 	ACTIONS = {
 		Entity.REMOVE_ACTION: StatefulAction(_remove, check=checkRemove)
 	}
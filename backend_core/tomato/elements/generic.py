@@ -178,9 +178,12 @@ class VMElement(Element):
 	def _select_tech(self, _host):
 		return self.type
 
-	def action_prepare(self):
+	def placementRequest(self):
 		hPref, sPref = self.getLocationPrefs()
-		_host = host.select(site=self.site if self.site else self.topology.site, elementTypeConfigurations=self._get_elementTypeConfigurations(), hostPrefs=hPref, sitePrefs=sPref, template=self.template)  # fixme: use tech
+		return dict(site=self.site if self.site else self.topology.site, elementTypeConfigurations=self._get_elementTypeConfigurations(), hostPrefs=hPref, sitePrefs=sPref, template=self.template)  # fixme: use tech
+
+	def action_prepare(self):
+		_host = host.selectFor(self)
 		UserError.check(_host, code=UserError.NO_RESOURCES, message="No matching host found for element",
 			data={"type": self.TYPE, "configs": self._get_elementTypeConfigurations()})
 		attrs = self._remoteAttrs
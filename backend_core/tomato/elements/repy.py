@@ -46,9 +46,12 @@ class Repy(VMElement):
 		self.update_or_save()
 
 
-	def action_prepare(self):
+	def placementRequest(self):
 		hPref, sPref = self.getLocationPrefs()
-		_host = host.select(site=self.site, elementTypeConfigurations=[[self.TYPE]+self.CAP_CHILDREN.keys()], hostPrefs=hPref, sitePrefs=sPref, template=self.template)
+		return dict(site=self.site, elementTypeConfigurations=[[self.TYPE]+self.CAP_CHILDREN.keys()], hostPrefs=hPref, sitePrefs=sPref, template=self.template)
+
+	def action_prepare(self):
+		_host = host.selectFor(self)
 		UserError.check(_host, code=UserError.NO_RESOURCES, message="No matching host found for element", data={"type": self.TYPE})
 		attrs = self._remoteAttrs
 		attrs.update({
@@ -69,8 +69,11 @@ class UDPEndpoint(Element):
 				self.element = None
 			self.save()
 
+	def placementRequest(self):
+		return dict(elementTypeConfigurations=[[self.HOST_TYPE]])
+
 	def action_prepare(self):
-		_host = host.select(elementTypeConfigurations=[[self.HOST_TYPE]])
+		_host = host.selectFor(self)
 		UserError.check(_host, code=UserError.NO_RESOURCES, message="No matching host found for element", data={"type": self.TYPE})
 		attrs = self._remoteAttrs
 		attrs.update({
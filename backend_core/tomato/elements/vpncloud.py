@@ -189,9 +189,12 @@ class VpnCloudEndpoint(ConnectingElement, Element):
 				self.element = None
 			self.save()
 
-	def action_prepare(self):
+	def placementRequest(self):
 		hPref, sPref = self.getLocationPrefs()
-		_host = host.select(elementTypeConfigurations=[[self.HOST_TYPE]], hostPrefs=hPref, sitePrefs=sPref)
+		return dict(elementTypeConfigurations=[[self.HOST_TYPE]], hostPrefs=hPref, sitePrefs=sPref)
+
+	def action_prepare(self):
+		_host = host.selectFor(self)
 		UserError.check(_host, code=UserError.NO_RESOURCES, message="No matching host found for element", data={"type": self.TYPE})
 		attrs = self._remoteAttrs
 		attrs.update(network_id=self.parent.network_id)
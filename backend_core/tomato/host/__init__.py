@@ -16,12 +16,14 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>
 
 import time
-import traceback, threading
+import traceback, threading, hashlib
 
 from .. import starttime, scheduler
 from ..db import *
 from ..generic import *
 from ..lib import rpc, util, logging, error
+from ..lib import anyjson as json
+from ..lib.tasks import TaskClass
 from ..lib.cache import cached
 from ..lib.error import TransportError, InternalError, UserError, Error
 from ..lib.exceptionhandling import wrap_and_handle_current_exception, deprecated
@@ -30,10 +32,56 @@ from ..lib.settings import settings, Config
 from ..lib.userflags import Flags
 from ..lib.constants import TechName, TypeName, TypeTechTrans
 from ..lib.references import Reference
+from ..lib.hierarchy import ClassName
 
 
 element_caps = {}
 connection_caps = {}
+caps_sizes = {}  # ("elements"|"connections", type) -> size of the description in element_caps/connection_caps
+converted_caps = {}  # digest of host capabilities -> (converted capabilities, sizes of the descriptions)
+CONVERTED_CAPS_MAX = 100
+status_versions = {}  # host name -> versions of the host_status sections last received from the host
+status_unsupported = {}  # host name -> time when host_status failed, separate calls are used for a while
+STATUS_RETRY_INTERVAL = 3600
+resource_sync_state = {}  # (host name, resource type) -> digest of the host and backend resources after a sync without changes
+sync_stats = {}  # host name -> statistics of the synchronization of the host, see syncStatistics()
+sync_stats_lock = threading.RLock()
+accounting_stats = {}  # host name -> statistics of the accounting pulls, see accountingStatistics()
+ACCOUNTING_PAGE_SIZE = 1000
+
+HEALTH_CRITICAL = "critical"  # the host can not be used at all
+HEALTH_WARNING = "warning"  # the host may work but should not be used
+HEALTH_WARNING_PENALTY = 0.25  # each warning reduces the health score by this value
+
+_memo = threading.local()
+
+class InfoMemo(object):
+	"""
+	While this context is active, memoized() values are only computed once per key (in this thread).
+	Used while building the info of a whole topology, so that its components share the info of their hosts.
+	"""
+	__slots__ = ("outermost",)
+
+	def __enter__(self):
+		self.outermost = getattr(_memo, "values", None) is None
+		if self.outermost:
+			_memo.values = {}
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		if self.outermost:
+			_memo.values = None
+
+def memoized(key, fn):
+	"""
+	:return: the result of fn(), computed only once per key while an InfoMemo is active
+	"""
+	values = getattr(_memo, "values", None)
+	if values is None:
+		return fn()
+	if not key in values:
+		values[key] = fn()
+	return values[key]
 
 class RemoteWrapper:
 	def __init__(self, url, host, *args, **kwargs):
@@ -61,10 +109,12 @@ class RemoteWrapper:
 				except Error as err:
 					if isinstance(err, TransportError):
 						err.todump = False
-						self._proxy = None
-						if retries >= 0:
-							print >>sys.stderr, "Retrying after error on %s: %s, retries left: %d" % (self._host, err, retries)
-							continue
+						# an unknown method will not appear by retrying, the connection is fine
+						if err.code != TransportError.UNKNOWN_METHOD:
+							self._proxy = None
+							if retries >= 0:
+								print >>sys.stderr, "Retrying after error on %s: %s, retries left: %d" % (self._host, err, retries)
+								continue
 						if not err.data:
 							err.data = {}
 						err.data["host"] = self._host
@@ -102,6 +152,7 @@ class Host(Entity, BaseDocument):
 	hostInfo = DictField(db_field='host_info')
 	hostInfoTimestamp = FloatField(db_field='host_info_timestamp', required=True)
 	accountingTimestamp = FloatField(db_field='accounting_timestamp', required=True)
+	accountingCursor = StringField(db_field='accounting_cursor')  # position after the last usage record that has been pushed
 	lastResourcesSync = FloatField(db_field='last_resource_sync', required=True)
 	enabled = BooleanField(default=True)
 	componentErrors = IntField(default=0, db_field='component_errors')
@@ -110,10 +161,12 @@ class Host(Entity, BaseDocument):
 	availability = FloatField(default=1.0)
 	description = StringField()
 	hostNetworks = ListField(db_field='host_networks')
+	health = DictField()  # see evaluateHealth()
+	healthy = BooleanField(default=True)  # whether health contains no problems
 	meta = {
 		'ordering': ['site', 'name'],
 		'indexes': [
-			'name', 'site'
+			'name', 'site', 'healthy'
 		]
 	}
 
@@ -138,6 +191,12 @@ class Host(Entity, BaseDocument):
 		self.synchronizeResources(True)
 		return self.info()
 
+	CHANGE_CLASS = ClassName.HOST
+	CHANGE_MEMBERSHIP_ATTRIBUTES = frozenset(["site"])
+
+	def changeId(self):
+		return self.name
+
 	ACTIONS = {"forced_update": Action(fn=action_forced_update)}
 	ATTRIBUTES = {
 		"name": Attribute(field=name, schema=schema.Identifier()),
@@ -149,10 +208,11 @@ class Host(Entity, BaseDocument):
 			get=lambda obj: obj.site.name,
 			schema=schema.Identifier()
 		),
-		"enabled": Attribute(field=enabled, schema=schema.Bool()),
+		"enabled": Attribute(field=enabled, set=lambda obj, val: obj.setEnabled(val), schema=schema.Bool()),
 		"description": Attribute(field=description, schema=schema.String(null=True)),
 		"organization": Attribute(readOnly=True, get=lambda obj: obj.site.organization, schema=schema.Identifier()),
 		"problems": Attribute(readOnly=True, get=lambda obj: obj.problems(), schema=schema.List(items=schema.String())),
+		"health": Attribute(readOnly=True, get=lambda obj: obj.healthInfo(), schema=schema.StringMap(additional=True)),
 		"component_errors": Attribute(field=componentErrors, readOnly=True, schema=schema.Int()),
 		"load": Attribute(readOnly=True, get=lambda obj: obj.getLoad(), schema=schema.List(items=schema.Number())),
 		"element_types": Attribute(field=elementTypes, readOnly=True, schema=schema.List(items=schema.Identifier())),
@@ -192,6 +252,7 @@ class Host(Entity, BaseDocument):
 		# this value is reset on every sync
 		logging.logMessage("component error", category="host", host=self.name)
 		self.componentErrors += 1
+		self.evaluateHealth()
 		self.save_if_exists()
 
 	def update(self):
@@ -200,39 +261,84 @@ class Host(Entity, BaseDocument):
 		if not self.enabled:
 			return
 		before = time.time()
-		self.hostInfo = self.getProxy(True).host_info()
-		after = time.time()
+		status = self._fetchStatus()
+		# the host collects its info first, the time spent on the other sections is not part of the query
+		after = time.time() - status.get("status_time", 0)
+		self.hostInfo = status["info"]
 		self.hostInfoTimestamp = (before + after) / 2.0
 		self.hostInfo["query_time"] = after - before
 		self.hostInfo["time_diff"] = self.hostInfo["time"] - self.hostInfoTimestamp
-		try:
-			self.hostNetworks = self.getProxy().host_networks()
-		except:
-			self.hostNetworks = []
-		hostCapabilities = self.getProxy().host_capabilities()
-		caps = self._convertCapabilities(hostCapabilities)
-		self.elementTypes = caps["elements"].keys()
-		global element_caps
-		for k, v in caps["elements"].iteritems():
-			if not k in element_caps:
-				element_caps[k] = v
-			else:
-				if len(repr(element_caps[k])) < len(repr(v)):
+		if "networks" in status:
+			self.hostNetworks = status["networks"]
+		caps = None
+		if "capabilities" in status:
+			caps, sizes = self._cachedCapabilities(status["capabilities"])
+			self.elementTypes = caps["elements"].keys()
+			global element_caps
+			for k, v in caps["elements"].iteritems():
+				if not k in element_caps or caps_sizes.get(("elements", k), 0) < sizes[("elements", k)]:
 					element_caps[k] = v
-		self.connectionTypes = caps["connections"].keys()
-		global connection_caps
-		for k, v in caps["connections"].iteritems():
-			if not k in connection_caps:
-				connection_caps[k] = v
-			else:
-				if len(repr(connection_caps[k])) < len(repr(v)):
+					caps_sizes[("elements", k)] = sizes[("elements", k)]
+			self.connectionTypes = caps["connections"].keys()
+			global connection_caps
+			for k, v in caps["connections"].iteritems():
+				if not k in connection_caps or caps_sizes.get(("connections", k), 0) < sizes[("connections", k)]:
 					connection_caps[k] = v
+					caps_sizes[("connections", k)] = sizes[("connections", k)]
+		if "versions" in status:
+			status_versions[self.name] = status["versions"]
 		self.componentErrors = max(0, self.componentErrors / 2)
-		if not self.problems():
+		if not self.evaluateHealth()["problems"]:
 			self.availability += 1.0 - settings.get_host_connections_settings()[Config.HOST_AVAILABILITY_FACTOR]
 		self.save_if_exists()
 		logging.logMessage("info", category="host", name=self.name, info=self.hostInfo)
-		logging.logMessage("capabilities", category="host", name=self.name, capabilities=caps)
+		if caps:
+			logging.logMessage("capabilities", category="host", name=self.name, capabilities=caps)
+
+	def _fetchStatus(self):
+		"""
+		get the info, networks and capabilities of the host with one host_status call. Networks and capabilities
+		are only included if they have changed since the last call.
+		Hosts that do not support host_status are asked with separate calls.
+		:return: dict containing 'info', 'versions' (if supported) and, if changed, 'networks' and 'capabilities'
+		:rtype: dict
+		"""
+		if time.time() - status_unsupported.get(self.name, 0) > STATUS_RETRY_INTERVAL:
+			try:
+				return self.getProxy(True).host_status(status_versions.get(self.name, {}))
+			except Error as err:
+				if isinstance(err, TransportError) and err.code != TransportError.UNKNOWN_METHOD:
+					raise
+				status_unsupported[self.name] = time.time()
+				status_versions.pop(self.name, None)
+		status = {"info": self.getProxy(True).host_info()}
+		try:
+			status["networks"] = self.getProxy().host_networks()
+		except:
+			status["networks"] = []
+		status["capabilities"] = self.getProxy().host_capabilities()
+		return status
+
+	def _cachedCapabilities(self, hostCapabilities):
+		"""
+		convert the capabilities of the host. Hosts that report the same capabilities share the result.
+		:return: the converted capabilities and the sizes of their element and connection descriptions
+		:rtype: tuple
+		"""
+		try:
+			key = hashlib.md5(json.dumps(hostCapabilities, sort_keys=True)).hexdigest()
+		except TypeError:
+			key = None
+		res = converted_caps.get(key)
+		if not res:
+			caps = self._convertCapabilities(hostCapabilities)
+			sizes = {(kind, k): len(repr(v)) for kind in ("elements", "connections") for k, v in caps[kind].iteritems()}
+			res = (caps, sizes)
+			if key:
+				if len(converted_caps) >= CONVERTED_CAPS_MAX:
+					converted_caps.clear()
+				converted_caps[key] = res
+		return res
 
 	def _convertCapabilities(self, caps):
 		def convertActions(actions, next_state):
@@ -419,85 +525,180 @@ class Host(Entity, BaseDocument):
 		# TODO: implement for other resources
 		from ..resources import template
 
-		hostNets = {}
-		for net in self.getProxy().resource_list("network"):
-			hostNets[net["attrs"]["bridge"]] = net
-		for net in self.networks.all():
-			key = net.bridge
-			attrs = {"bridge": net.bridge, "kind": net.getKind(), "preference": net.network.preference}
-			if not key in hostNets:
-				# create resource
-				self.getProxy().resource_create("network", attrs)
-				logging.logMessage("network create", category="host", name=self.name, network=attrs)
-			else:
-				hNet = hostNets[key]
-				if hNet["attrs"] != attrs:
-					# update resource
-					self.getProxy().resource_modify(hNet["id"], attrs)
-					logging.logMessage("network update", category="host", name=self.name, network=attrs)
-		tpls = {}
-		for tpl in self.getProxy().resource_list("template"):
-			tpls[(tpl["attrs"]["tech"], tpl["attrs"]["name"])] = tpl
-		avail = []
-		for tpl in template.Template.objects():
-			type_ = tpl.type
-			attrs_base = tpl.info_for_hosts()
-			# for multitech element types: inflate
-			for tech in TypeTechTrans.TECH_DICT.get(type_, type_):
-				if tech in self.elementTypes:
-					attrs = attrs_base.copy()
-					attrs["tech"] = tech
-					if not (attrs["tech"], attrs["name"]) in tpls:
-						# create resource
-						self.getProxy().resource_create("template", attrs)
-
-						logging.logMessage("template create", category="host", name=self.name, template=attrs)
-					else:
-						hTpl = tpls[(attrs["tech"], attrs["name"])]
-						if hTpl["attrs"].get("checksum") != tpl.checksum:
-							self.getProxy().resource_modify(hTpl["id"], attrs)
-							logging.logMessage("template update", category="host", name=self.name, template=attrs)
+		networks = [{"bridge": net.bridge, "kind": net.getKind(), "preference": net.network.preference} for net in self.networks.all()]
+		digest = self._resourceDigest("network", networks)
+		if forced or resource_sync_state.get((self.name, "network")) != digest:
+			hostNets = {}
+			for net in self.getProxy().resource_list("network"):
+				hostNets[net["attrs"]["bridge"]] = net
+			changed = False
+			for attrs in networks:
+				key = attrs["bridge"]
+				if not key in hostNets:
+					# create resource
+					self.getProxy().resource_create("network", attrs)
+					logging.logMessage("network create", category="host", name=self.name, network=attrs)
+					changed = True
+				else:
+					hNet = hostNets[key]
+					if hNet["attrs"] != attrs:
+						# update resource
+						self.getProxy().resource_modify(hNet["id"], attrs)
+						logging.logMessage("network update", category="host", name=self.name, network=attrs)
+						changed = True
+			self._resourcesSynced("network", None if changed else digest)
+		templates = list(template.Template.objects())
+		digest = self._resourceDigest("template", [(tpl.info_for_hosts(), tpl.checksum) for tpl in templates],
+									  sorted(self.elementTypes), self.address, self.hostInfo.get("templateserver_port"))
+		if forced or resource_sync_state.get((self.name, "template")) != digest:
+			tpls = {}
+			for tpl in self.getProxy().resource_list("template"):
+				tpls[(tpl["attrs"]["tech"], tpl["attrs"]["name"])] = tpl
+			avail = []
+			changed = False
+			for tpl in templates:
+				type_ = tpl.type
+				attrs_base = tpl.info_for_hosts()
+				# for multitech element types: inflate
+				for tech in TypeTechTrans.TECH_DICT.get(type_, type_):
+					if tech in self.elementTypes:
+						attrs = attrs_base.copy()
+						attrs["tech"] = tech
+						if not (attrs["tech"], attrs["name"]) in tpls:
+							# create resource
+							self.getProxy().resource_create("template", attrs)
+
+							logging.logMessage("template create", category="host", name=self.name, template=attrs)
+							changed = True
 						else:
-							avail.append(tpl)
-		for tpl in template.Template.objects():
-			tpl.update_host_state(self, tpl in avail)
+							hTpl = tpls[(attrs["tech"], attrs["name"])]
+							if hTpl["attrs"].get("checksum") != tpl.checksum:
+								self.getProxy().resource_modify(hTpl["id"], attrs)
+								logging.logMessage("template update", category="host", name=self.name, template=attrs)
+								changed = True
+							else:
+								avail.append(tpl)
+			for tpl in templates:
+				tpl.update_host_state(self, tpl in avail)
+			self._resourcesSynced("template", None if changed else digest)
 		logging.logMessage("resource_sync end", category="host", name=self.name)
 		self.lastResourcesSync = time.time()
+		self.evaluateHealth()
 		self.save_if_exists()
 
+	def _resourceDigest(self, type_, *backendState):
+		"""
+		get a digest of the resources of a type on the host (checksum reported by host_status) and the state of the
+		backend that is synchronized to them. None if the host did not report a checksum.
+		"""
+		checksum = status_versions.get(self.name, {}).get("resources", {}).get(type_)
+		if not checksum:
+			return None
+		return hashlib.md5(checksum + json.dumps(backendState, sort_keys=True)).hexdigest()
+
+	def _resourcesSynced(self, type_, digest):
+		"""
+		remember the digest of a synchronization that did not change anything on the host. The next synchronization
+		of this resource type is skipped if the digest is still the same. None to always synchronize next time.
+		"""
+		if digest:
+			resource_sync_state[(self.name, type_)] = digest
+		else:
+			resource_sync_state.pop((self.name, type_), None)
+
 	def updateAccountingData(self):
 		logging.logMessage("accounting_sync begin", category="host", name=self.name)
+		start = time.time()
+		result = (0, None)
 		try:
-			orig_data = self.getProxy().accounting_statistics(type="single", after=self.accountingTimestamp)
-			data = {"elements": {}, "connections": {}}
-			max_timestamp = self.accountingTimestamp
-
-			# check for completeness
-			for el in self.elements.all():
-				if not str(el.num) in orig_data["elements"]:
-					print >>sys.stderr, "Missing accounting data for element #%s on host %s" % (str(el.num), self.name)
-			for con in self.connections.all():
-				if not str(con.num) in orig_data["connections"]:
-					print >>sys.stderr, "Missing accounting data for connection #%s on host %s" % (str(con.num), self.name)
-					continue
+			try:
+				result = self._pullAccountingRecords()
+			except Error as err:
+				if isinstance(err, TransportError) and err.code != TransportError.UNKNOWN_METHOD:
+					raise
+				# hostmanagers without accounting_records
+				result = self._pullAccountingStatistics()
+		finally:
+			recordAccounting(self.name, result[0], time.time() - start, result[1])
+			logging.logMessage("accounting_sync end", category="host", name=self.name, records=result[0])
 
-			# transform
-			for type_ in ("elements", "connections"):
-				for obj_id, obj_recs in orig_data[type_].iteritems():
-					id_ = "%s@%s" % (obj_id, self.name)
-					for obj_rec in obj_recs:
-						new_rec = (int(obj_rec["begin"]), obj_rec["usage"]["memory"], obj_rec["usage"]["diskspace"], obj_rec["usage"]["traffic"], obj_rec["usage"]["cputime"])
-						max_timestamp = max(obj_rec["begin"], max_timestamp)
-						if obj_id in data[type_]:
-							data[type_][id_].append(new_rec)
-						else:
-							data[type_][id_] = [new_rec]
+	def _pullAccountingRecords(self):
+		"""
+		get the new usage records from the host page by page and push each page to backend_accounting as soon as it
+		has been received. The position after the pushed records is saved after every page, so an interrupted pull
+		continues where it stopped.
+		:return: number of records and end of the newest record
+		:rtype: tuple
+		"""
+		proxy = self.getProxy()
+		accounting = get_backend_accounting_proxy()
+		count, newest = 0, None
+		objects = True
+		while True:
+			args = dict(type="single", limit=ACCOUNTING_PAGE_SIZE, objects=objects)
+			if self.accountingCursor:
+				args["cursor"] = self.accountingCursor
+			else:
+				args["after"] = self.accountingTimestamp
+			page = proxy.accounting_records(**args)
+			if objects:
+				self._checkAccountingCompleteness(page["objects"])
+				objects = False
+			elements, connections, records, maxBegin, maxEnd = self._transformAccountingData(page)
+			if records:
+				accounting.push_usage(elements, connections)
+				count += records
+				newest = max(newest, maxEnd)
+				self.accountingTimestamp = max(self.accountingTimestamp, maxBegin + 1)
+			self.accountingCursor = page["cursor"]
+			self.save_if_exists()
+			if not page["more"]:
+				return count, newest
 
-			get_backend_accounting_proxy().push_usage(data["elements"], data["connections"])
-			self.accountingTimestamp = max_timestamp + 1  # one second greater than last record.
+	def _pullAccountingStatistics(self):
+		"""
+		get all new usage records from the host with one call and push them to backend_accounting.
+		:return: number of records and end of the newest record
+		:rtype: tuple
+		"""
+		data = self.getProxy().accounting_statistics(type="single", after=self.accountingTimestamp)
+		self._checkAccountingCompleteness(data)
+		elements, connections, records, maxBegin, maxEnd = self._transformAccountingData(data)
+		get_backend_accounting_proxy().push_usage(elements, connections)
+		if records:
+			self.accountingTimestamp = max(self.accountingTimestamp, maxBegin + 1)  # one second greater than last record.
 			self.save_if_exists()
-		finally:
-			logging.logMessage("accounting_sync end", category="host", name=self.name)
+		return records, maxEnd
+
+	def _checkAccountingCompleteness(self, objects):
+		"""
+		:param dict objects: ids of the elements and connections with accounting data on the host, by 'elements' and 'connections'
+		"""
+		from .element import HostElement
+		from .connection import HostConnection
+		for type_, cls in (("elements", HostElement), ("connections", HostConnection)):
+			missing = set(obj.num for obj in cls.objects(host=self).only("num")) - set(objects[type_])
+			if missing:
+				print >>sys.stderr, "Missing accounting data for %s %s on host %s" % (type_, ", ".join("#%s" % num for num in sorted(missing)), self.name)
+
+	def _transformAccountingData(self, data):
+		"""
+		convert usage records of the host into the records of backend_accounting.
+		:return: element records, connection records, number of records, latest begin and latest end of the records
+		:rtype: tuple
+		"""
+		res = {"elements": {}, "connections": {}}
+		count, maxBegin, maxEnd = 0, None, None
+		for type_ in ("elements", "connections"):
+			for obj_id, obj_recs in data[type_].iteritems():
+				res[type_]["%s@%s" % (obj_id, self.name)] = [
+					(int(rec["begin"]), rec["usage"]["memory"], rec["usage"]["diskspace"], rec["usage"]["traffic"], rec["usage"]["cputime"])
+					for rec in obj_recs]
+				for rec in obj_recs:
+					maxBegin = max(maxBegin, rec["begin"])
+					maxEnd = max(maxEnd, rec["end"])
+				count += len(obj_recs)
+		return res["elements"], res["connections"], count, maxBegin, maxEnd
 
 	def getNetworkKinds(self):
 		nets = [net.getKind() for net in self.networks.all()]
@@ -553,48 +754,123 @@ class Host(Entity, BaseDocument):
 	def is_reachable(self):
 		return time.time() - self.hostInfoTimestamp <= 2 * settings.get_host_connections_settings()[Config.HOST_UPDATE_INTERVAL]
 
-	def problems(self):
+	def componentInfo(self):
+		"""
+		host info as included in the info of elements and connections
+		:rtype: dict
+		"""
+		return memoized(("host_info", self.id), lambda: {
+			'address': self.address,
+			'problems':	self.problems(),
+			'site':	self.site.name,
+			'fileserver_port': self.hostInfo.get('fileserver_port', None)
+		})
+
+	def setEnabled(self, enabled):
+		self.enabled = enabled
+		self.evaluateHealth()
+
+	def _findProblems(self, now, config):
+		"""
+		:return: list of (message, severity) and the time when the time-dependent checks may change their result
+		:rtype: tuple
+		"""
 		problems = []
 		if not self.enabled:
-			problems.append("Manually disabled")
+			problems.append(("Manually disabled", HEALTH_CRITICAL))
 		hi = self.hostInfo
-		if time.time() - self.hostInfoTimestamp > 2 * settings.get_host_connections_settings()[Config.HOST_UPDATE_INTERVAL] + 300:
-			problems.append("Host unreachable")
+		reachableUntil = self.hostInfoTimestamp + 2 * config[Config.HOST_UPDATE_INTERVAL] + 300
+		if now > reachableUntil:
+			problems.append(("Host unreachable", HEALTH_CRITICAL))
 		if problems:
-			return problems
-		if time.time() - self.lastResourcesSync > 2 * settings.get_host_connections_settings()[Config.HOST_RESOURCE_SYNC_INTERVAL] + 300:
-			problems.append("Host is not synchronized")
+			return problems, None
+		syncedUntil = self.lastResourcesSync + 2 * config[Config.HOST_RESOURCE_SYNC_INTERVAL] + 300
+		validUntil = min(reachableUntil, syncedUntil)
+		if now > syncedUntil:
+			problems.append(("Host is not synchronized", HEALTH_WARNING))
+			validUntil = reachableUntil
 		if not hi:
-			problems.append("Node info is missing")
-			return problems
+			problems.append(("Node info is missing", HEALTH_CRITICAL))
+			return problems, validUntil
 		if hi["uptime"] < 10 * 60:
-			problems.append("Node just booted")
+			problems.append(("Node just booted", HEALTH_WARNING))
 		if hi["time_diff"] > 5 * 60:
-			problems.append("Node clock is out of sync")
+			problems.append(("Node clock is out of sync", HEALTH_WARNING))
 		if hi["query_time"] > 5:
-			problems.append("Last query took very long")
+			problems.append(("Last query took very long", HEALTH_WARNING))
 		res = hi["resources"]
 		cpus = res["cpus_present"]
 		if not cpus["count"]:
-			problems.append("No CPUS ?!?")
+			problems.append(("No CPUS ?!?", HEALTH_CRITICAL))
 		if cpus["bogomips_avg"] < 1000:
-			problems.append("Slow CPUs")
+			problems.append(("Slow CPUs", HEALTH_WARNING))
 		if res["loadavg"][1] > cpus["count"]:
-			problems.append("High load")
+			problems.append(("High load", HEALTH_WARNING))
 		disks = res["diskspace"]
 		if int(disks["root"]["total"]) - int(disks["root"]["used"]) < 1e6:
-			problems.append("Root disk full")
+			problems.append(("Root disk full", HEALTH_CRITICAL))
 		if int(disks["data"]["total"]) - int(disks["data"]["used"]) < 10e6:
-			problems.append("Data disk full")
+			problems.append(("Data disk full", HEALTH_CRITICAL))
 		if int(res["memory"]["total"]) - int(res["memory"]["used"]) < 1e6:
-			problems.append("Memory full")
+			problems.append(("Memory full", HEALTH_CRITICAL))
 		if self.componentErrors > 2:
-			problems.append("Multiple component errors")
+			problems.append(("Multiple component errors", HEALTH_WARNING))
 		if "dumps" in hi and hi["dumps"] >= 100:
-			problems.append("Lots of error dumps")
+			problems.append(("Lots of error dumps", HEALTH_WARNING))
 		if "problems" in hi:
-			problems += hi["problems"]
-		return problems
+			problems += [(problem, HEALTH_WARNING) for problem in hi["problems"]]
+		return problems, validUntil
+
+	def evaluateHealth(self):
+		"""
+		evaluate the problems of the host and store the result in health. This is done whenever the data that the
+		problems depend on changes. The result contains the time until which it is valid, problems() evaluates
+		the health again when this time has passed (e.g. when the host has become unreachable).
+		:return: the new health record: dict containing 'problems' (list of dicts with 'message' and 'severity'),
+		         'score' (1.0 without problems, 0.0 with critical problems), 'timestamp' and 'valid_until'
+		         (None if the result only changes with the next update)
+		:rtype: dict
+		"""
+		now = time.time()
+		problems, validUntil = self._findProblems(now, settings.get_host_connections_settings())
+		if [severity for _, severity in problems if severity == HEALTH_CRITICAL]:
+			score = 0.0
+		else:
+			score = max(0.0, 1.0 - HEALTH_WARNING_PENALTY * len(problems))
+		self.health = {
+			"problems": [{"message": message, "severity": severity} for message, severity in problems],
+			"score": score,
+			"timestamp": now,
+			"valid_until": validUntil
+		}
+		self.healthy = not problems
+		return self.health
+
+	def _currentHealth(self):
+		health = self.health
+		validUntil = health.get("valid_until", 0) if health else 0
+		if validUntil is not None and time.time() > validUntil:
+			health = self.evaluateHealth()
+		return health
+
+	def problems(self):
+		"""
+		:return: messages of the current problems of the host
+		:rtype: list(str)
+		"""
+		return [problem["message"] for problem in self._currentHealth()["problems"]]
+
+	def healthScore(self):
+		"""
+		:return: health score between 0.0 (unusable) and 1.0 (no problems), weighted with the availability
+		:rtype: float
+		"""
+		return self._currentHealth()["score"] * max(0.0, min(self.availability, 1.0))
+
+	def healthInfo(self):
+		health = dict(self._currentHealth())
+		health["score"] = self.healthScore()
+		return health
 
 	def sendMessageToHostManagers(self, title, message, ref, subject_group):
 		api = get_backend_users_proxy()
@@ -737,6 +1013,150 @@ class HostObject(BaseDocument):
 		return ret
 
 
+class HostState(object):
+	"""
+	The data of a host that select() uses. Values are read when they are first needed.
+	"""
+	__slots__ = ("host", "_problems", "_networkKinds", "_load", "elementCount", "connectionCount")
+
+	def __init__(self, host):
+		self.host = host
+		self._problems = None
+		self._networkKinds = None
+		self._load = None
+		self.elementCount = None
+		self.connectionCount = None
+
+	@property
+	def problems(self):
+		if self._problems is None:
+			self._problems = self.host.problems()
+		return self._problems
+
+	@property
+	def networkKinds(self):
+		if self._networkKinds is None:
+			self._networkKinds = set(self.host.getNetworkKinds())
+		return self._networkKinds
+
+	@property
+	def load(self):
+		if self._load is None:
+			self._load = self.host.getLoad()
+		return self._load
+
+	def counts(self):
+		"""
+		:return: number of host elements and host connections on this host
+		"""
+		if self.elementCount is None:
+			self.elementCount = self.host.elements.count()
+			self.connectionCount = self.host.connections.count()
+		return self.elementCount, self.connectionCount
+
+
+_placements = threading.local()
+
+class Placement(object):
+	"""
+	Places several elements, e.g. all elements of a topology that are prepared together.
+
+	The state of all hosts is read once for all selections instead of once per select() call. Elements placed
+	by this placement are counted for the selected hosts, so that the following selections spread the load
+	like separate select() calls would do.
+	plan() selects the hosts of several elements in one pass and takes the planned hosts of connected elements
+	into account. While the placement is active (with statement, in every thread that uses it), select() uses
+	its host states and selectFor() returns the planned hosts.
+	"""
+
+	def __init__(self):
+		self._lock = threading.RLock()
+		self._states = None
+		self._planned = {}  # element id -> host
+
+	@classmethod
+	def current(cls):
+		stack = getattr(_placements, "stack", None)
+		return stack[-1] if stack else None
+
+	def __enter__(self):
+		if getattr(_placements, "stack", None) is None:
+			_placements.stack = []
+		_placements.stack.append(self)
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		_placements.stack.pop()
+
+	def hostStates(self, site=None):
+		with self._lock:
+			if self._states is None:
+				hosts = list(Host.getAll())
+				prefetch(hosts, ["site"])
+				self._states = [HostState(h) for h in hosts]
+			return [state for state in self._states if not site or state.host.site == site]
+
+	def record(self, state):
+		"""
+		count an element that has been placed on the host
+		"""
+		with self._lock:
+			state.counts()
+			state.elementCount += 1
+
+	def planned(self, element):
+		"""
+		:return: the host planned for the element or None
+		"""
+		return self._planned.get(element.idStr)
+
+	def _neighborPrefs(self, element, hostPrefs, sitePrefs):
+		# connected elements that have been planned but not created yet are not included in getLocationPrefs()
+		for el in [element] + list(element.children):
+			peer = el.connectedElement
+			if not peer or peer.hostElements:
+				continue
+			host = self._planned.get(peer.idStr) or self._planned.get(peer.parentId)
+			if not host:
+				continue
+			hostPrefs[host] = hostPrefs.get(host, 0.0) + peer.SAME_HOST_AFFINITY + el.SAME_HOST_AFFINITY
+			sitePrefs[host.site] = sitePrefs.get(host.site, 0.0) + peer.SAME_SITE_AFFINITY + el.SAME_SITE_AFFINITY
+
+	def plan(self, elements):
+		"""
+		select the hosts of the elements. Elements that do not select hosts themselves
+		(placementRequest() returns None) and elements without matching hosts are skipped.
+		:return: element id -> host
+		:rtype: dict
+		"""
+		with self:
+			for el in elements:
+				request = el.placementRequest()
+				if request is None:
+					continue
+				request["hostPrefs"] = dict(request.get("hostPrefs") or {})
+				request["sitePrefs"] = dict(request.get("sitePrefs") or {})
+				self._neighborPrefs(el, request["hostPrefs"], request["sitePrefs"])
+				try:
+					self._planned[el.idStr] = select(**request)
+				except UserError:
+					continue  # the error is raised again when the element selects its host
+		return dict(self._planned)
+
+
+def selectFor(element):
+	"""
+	select the host for an element with the arguments from element.placementRequest().
+	If the active placement has planned a host for the element, this host is returned.
+	"""
+	placement = Placement.current()
+	if placement:
+		host = placement.planned(element)
+		if host:
+			return host
+	return select(**element.placementRequest())
+
+
 def select(site=None, elementTypeConfigurations=None, connectionTypes=None, networkKinds=None, hostPrefs=None, sitePrefs=None, best=True, template=None):
 	# STEP 1: limit host choices to what is possible
 	if not sitePrefs: sitePrefs = {}
@@ -744,10 +1164,15 @@ def select(site=None, elementTypeConfigurations=None, connectionTypes=None, netw
 	if not networkKinds: networkKinds = []
 	if not connectionTypes: connectionTypes = []
 	if not elementTypeConfigurations: elementTypeConfigurations = [[]]
-	all_ = Host.getAll(site=site) if site else Host.getAll()
-	hosts = []
-	for host in all_:
-		if host.problems():
+	placement = Placement.current()
+	if placement:
+		all_ = placement.hostStates(site)
+	else:
+		all_ = [HostState(h) for h in (Host.getAll(site=site) if site else Host.getAll())]
+	states = []
+	for state in all_:
+		host = state.host
+		if state.problems:
 			continue
 
 		fulfillsConfig = False  # accept host if one config is fulfilled
@@ -760,49 +1185,56 @@ def select(site=None, elementTypeConfigurations=None, connectionTypes=None, netw
 
 		if connectionTypes and set(connectionTypes) - set(host.connectionTypes):
 			continue
-		if networkKinds and set(networkKinds) - set(host.getNetworkKinds()):
+		if networkKinds and set(networkKinds) - state.networkKinds:
 			continue
 		if template and host.name not in template.hosts:
 			continue
 		if not best:
+			if placement:
+				placement.record(state)
 			return host
-		hosts.append(host)
-	UserError.check(hosts, code=UserError.INVALID_CONFIGURATION, message="No hosts found for requirements", data={
+		states.append(state)
+	UserError.check(states, code=UserError.INVALID_CONFIGURATION, message="No hosts found for requirements", data={
 		'site': site.name if site else None, 'element_type_configurations': elementTypeConfigurations, 'connection_types': connectionTypes, 'network_kinds': networkKinds
 	})
 	# any host in hosts can handle the request
-	prefs = dict([(h, 0.0) for h in hosts])
+	prefs = dict([(s, 0.0) for s in states])
 	# STEP 2: calculate preferences based on host load
 	els = 0.0
 	cons = 0.0
-	for h in hosts:
-		prefs[h] -= h.componentErrors * 25  # discourage hosts with previous errors
-		prefs[h] -= h.getLoad() * 100  # up to -100 points for load
-		els += h.elements.count()
-		cons += h.connections.count()
-	avgEls = els / len(hosts)
-	avgCons = cons / len(hosts)
-	for h in hosts:
+	for s in states:
+		prefs[s] -= s.host.componentErrors * 25  # discourage hosts with previous errors
+		prefs[s] -= s.load * 100  # up to -100 points for load
+		prefs[s] -= (1.0 - s.host.healthScore()) * 50  # up to -50 points for low availability
+		elCount, conCount = s.counts()
+		els += elCount
+		cons += conCount
+	avgEls = els / len(states)
+	avgCons = cons / len(states)
+	for s in states:
+		elCount, conCount = s.counts()
 		# between -30 and +30 points for element/connection over-/under-population
 		if avgEls:
-			prefs[h] -= max(-20.0, min(10.0 * (h.elements.count() - avgEls) / avgEls, 20.0))
+			prefs[s] -= max(-20.0, min(10.0 * (elCount - avgEls) / avgEls, 20.0))
 		if avgCons:
-			prefs[h] -= max(-10.0, min(10.0 * (h.connections.count() - avgCons) / avgCons, 10.0))
+			prefs[s] -= max(-10.0, min(10.0 * (conCount - avgCons) / avgCons, 10.0))
 		# STEP 3: calculate preferences based on host location
-	for h in hosts:
-		if h in hostPrefs:
-			prefs[h] += hostPrefs[h]
-		if h.site in sitePrefs:
-			prefs[h] += sitePrefs[h.site]
+	for s in states:
+		if s.host in hostPrefs:
+			prefs[s] += hostPrefs[s.host]
+		if s.host.site in sitePrefs:
+			prefs[s] += sitePrefs[s.host.site]
 	#STEP 4: select the best host
-	hosts.sort(key=lambda h: prefs[h], reverse=True)
-	logging.logMessage("select", category="host", result=hosts[0].name,
-					   prefs=dict([(k.name, v) for k, v in prefs.iteritems()]),
+	states.sort(key=lambda s: prefs[s], reverse=True)
+	if placement:
+		placement.record(states[0])
+	logging.logMessage("select", category="host", result=states[0].host.name,
+					   prefs=dict([(k.host.name, v) for k, v in prefs.iteritems()]),
 					   site=site.name if site else None, element_types=elementTypes, connection_types=connectionTypes,
 					   network_types=networkKinds,
 					   host_prefs=dict([(k.name, v) for k, v in hostPrefs.iteritems()]),
 					   site_prefs=dict([(k.name, v) for k, v in sitePrefs.iteritems()]))
-	return hosts[0]
+	return states[0].host
 
 
 def getElementTypes():
@@ -837,11 +1269,14 @@ def synchronizeHost(host_name):
 		if host in checkingHosts:
 			return
 		checkingHosts.add(host)
+	start = time.time()
+	failed = True
 	try:
 		try:
 			try:
 				host.update()
 				host.synchronizeResources()
+				failed = False
 			except Exception as e:
 				print >>sys.stderr, "Error updating host information from %s" % host_name
 				if isinstance(e, TransportError):
@@ -854,6 +1289,63 @@ def synchronizeHost(host_name):
 	finally:
 		with checkingHostsLock:
 			checkingHosts.remove(host)
+		recordSync(host_name, time.time() - start, failed)
+
+SYNC_STATS_WEIGHT = 0.2  # weight of the latest duration in the moving average
+
+def recordSync(host_name, duration, failed=False):
+	with sync_stats_lock:
+		stats = sync_stats.get(host_name)
+		if not stats:
+			stats = sync_stats[host_name] = {"count": 0, "errors": 0, "last": duration, "avg": duration, "max": 0.0}
+		stats["count"] += 1
+		if failed:
+			stats["errors"] += 1
+		stats["last"] = duration
+		stats["avg"] += SYNC_STATS_WEIGHT * (duration - stats["avg"])
+		stats["max"] = max(stats["max"], duration)
+		stats["timestamp"] = time.time()
+	logging.logMessage("sync", category="host", name=host_name, duration=duration, failed=failed)
+
+def recordAccounting(host_name, records, duration, newest=None):
+	"""
+	:param int records: number of records that have been pulled
+	:param float duration: duration of the pull
+	:param float newest: end of the newest record that has been pulled, if any
+	"""
+	now = time.time()
+	with sync_stats_lock:
+		stats = accounting_stats.get(host_name)
+		if not stats:
+			stats = accounting_stats[host_name] = {"records": 0, "pulls": 0, "newest": None}
+		stats["pulls"] += 1
+		stats["records"] += records
+		stats["last_records"] = records
+		stats["duration"] = duration
+		stats["rate"] = records / duration if duration else 0.0
+		if newest:
+			stats["newest"] = max(stats["newest"], newest)
+		stats["lag"] = now - stats["newest"] if stats["newest"] else None
+		stats["timestamp"] = now
+
+def accountingStatistics():
+	"""
+	get the statistics of the accounting pulls.
+	:return: host name -> dict containing 'pulls', 'records' (in total), 'last_records', 'duration', 'rate' (records
+	         per second) of the last pull, 'lag' (age of the newest record that has been pulled) and 'timestamp'
+	:rtype: dict
+	"""
+	with sync_stats_lock:
+		return dict([(name, stats.copy()) for name, stats in accounting_stats.iteritems()])
+
+def syncStatistics():
+	"""
+	get the durations of the host synchronizations.
+	:return: host name -> dict containing 'count', 'errors', 'last', 'avg' (moving average), 'max' and 'timestamp' (of the last synchronization)
+	:rtype: dict
+	"""
+	with sync_stats_lock:
+		return dict([(name, stats.copy()) for name, stats in sync_stats.iteritems()])
 
 updatingAccountingHostsLock = threading.RLock()
 updatingAccountingHosts = set()
@@ -887,6 +1379,6 @@ def list_host_names():
 	return [h.name for h in Host.getAll().only("name")]
 
 scheduler.scheduleMaintenance(settings.get_host_connections_settings()[Config.HOST_UPDATE_INTERVAL],
-                              list_host_names, synchronizeHost)
+                              list_host_names, synchronizeHost, taskClass=TaskClass.HOST_SYNC)
 scheduler.scheduleMaintenance(settings.get_host_connections_settings()[Config.HOST_UPDATE_INTERVAL],
-                              list_host_names, updateAccounting)
+                              list_host_names, updateAccounting, taskClass=TaskClass.ACCOUNTING)
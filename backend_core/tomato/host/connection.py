@@ -2,6 +2,7 @@ from ..db import *
 from ..lib import logging, error, util
 from ..lib.exceptionhandling import wrap_and_handle_current_exception
 from .. import scheduler
+from ..lib.tasks import TaskClass
 
 from . import HostObject
 from .element import HostElement
@@ -113,14 +114,44 @@ HostConnection.register_delete_rule(HostElement, "connection", NULLIFY)
 
 
 
+def updateInfos(host):
+	"""
+	update the info of all connections of a host with one connection_list call. Connections that do not belong to a
+	topology anymore or do not exist on the host are removed, only connections whose info has changed are saved.
+	:param Host host: host of the connections
+	"""
+	infos = dict([(str(info["id"]), info) for info in host.getProxy().connection_list()])
+	for hcon in HostConnection.objects(host=host):
+		try:
+			if not hcon._data.get("topologyElement") and not hcon._data.get("topologyConnection"):
+				hcon.remove()
+				continue
+			info = infos.get(hcon.num)
+			if not info:
+				logging.logMessage("missing connection", category="host", host=host.name, id=hcon.num)
+				hcon.remove()
+				continue
+			if info != hcon.objectInfo or info["state"] != hcon.state:
+				hcon.objectInfo = info
+				hcon.state = info["state"]
+				logging.logMessage("connection_info", category="host", host=host.name, id=hcon.num, info=info)
+				hcon.save()
+		except:
+			wrap_and_handle_current_exception(re_raise=False, data={'host': host.address})
+
 def list():
-	return [e.id for e in HostConnection.objects.all()]
+	from . import Host
+	return [h.name for h in Host.getAll().only("name")]
 
 @util.wrap_task
-def synchronize(id_):
+def synchronize(host_name):
+	from . import Host
 	try:
-		HostConnection.objects.get(id=id_).synchronize()
+		host = Host.objects.get(name=host_name)
 	except DoesNotExist:
-		pass  # nothing to synchronize
+		return  # nothing to synchronize
+	if not host.enabled or not host.is_reachable():
+		return
+	updateInfos(host)
 
-scheduler.scheduleMaintenance(3600, list, synchronize)
+scheduler.scheduleMaintenance(3600, list, synchronize, taskClass=TaskClass.HOST_SYNC)
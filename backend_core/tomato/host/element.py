@@ -3,6 +3,7 @@ from ..lib import logging, error, util
 from ..lib.exceptionhandling import wrap_and_handle_current_exception
 from ..lib.settings import settings
 from .. import scheduler
+from ..lib.tasks import TaskClass
 import time
 from . import HostObject
 
@@ -136,14 +137,67 @@ class HostElement(HostObject):
 			wrap_and_handle_current_exception(re_raise=False, data={'host': self.host.address if self.host else None})
 
 
+RENEW_BATCH_SIZE = 1000  # maximum number of elements whose timeouts are renewed with one call
+
+def _renewTimeoutsSeparately(host, elements, until):
+	# hostmanagers without element_renew_timeouts
+	for hel in elements:
+		try:
+			hel.modify(timeout=until)
+		except error.UserError, err:
+			if err.code != error.UserError.UNSUPPORTED_ATTRIBUTE:
+				wrap_and_handle_current_exception(re_raise=False, data={'host': host.address})
+		except:
+			wrap_and_handle_current_exception(re_raise=False, data={'host': host.address})
+
+def renewTimeouts(host):
+	"""
+	renew the timeouts of all elements of a host with one call per RENEW_BATCH_SIZE elements and update them in
+	the database at once. Elements that do not belong to a topology anymore or do not exist on the host are removed.
+	:param Host host: host to renew the elements on
+	"""
+	until = time.time() + settings.get_host_connections_settings()['component-timeout']
+	live = []
+	for hel in HostElement.objects(host=host).only("id", "num", "host", "topologyElement", "topologyConnection"):
+		if not hel._data.get("topologyElement") and not hel._data.get("topologyConnection"):
+			hel.remove()
+		else:
+			live.append(hel)
+	if not live:
+		return
+	logging.logMessage("element_renew_timeouts", category="host", host=host.name, count=len(live))
+	proxy = host.getProxy()
+	for start in xrange(0, len(live), RENEW_BATCH_SIZE):
+		batch = live[start:start + RENEW_BATCH_SIZE]
+		try:
+			missing = set(proxy.element_renew_timeouts([hel.num for hel in batch], until))
+		except error.Error as err:
+			if isinstance(err, error.TransportError) and err.code != error.TransportError.UNKNOWN_METHOD:
+				raise
+			# hostmanagers without element_renew_timeouts
+			_renewTimeoutsSeparately(host, HostElement.objects(id__in=[hel.id for hel in batch]), until)
+			continue
+		renewed = [hel.id for hel in batch if not hel.num in missing]
+		if renewed:
+			HostElement.objects(id__in=renewed).update(set__objectInfo__timeout=until)
+		for hel in batch:
+			if hel.num in missing:
+				logging.logMessage("missing element", category="host", host=host.name, id=hel.num)
+				hel.remove()
+
 def list():
-	return [e.id for e in HostElement.objects.all()]
+	from . import Host
+	return [h.name for h in Host.getAll().only("name")]
 
 @util.wrap_task
-def synchronize(id_):
+def synchronize(host_name):
+	from . import Host
 	try:
-		HostElement.objects.get(id=id_).synchronize()
+		host = Host.objects.get(name=host_name)
 	except DoesNotExist:
-		pass  # nothong to synchronize
+		return  # nothing to synchronize
+	if not host.enabled or not host.is_reachable():
+		return
+	renewTimeouts(host)
 
-scheduler.scheduleMaintenance(min(3600, settings.get_host_connections_settings()['component-timeout']), list, synchronize)
\ No newline at end of file
+scheduler.scheduleMaintenance(min(3600, settings.get_host_connections_settings()['component-timeout']), list, synchronize, taskClass=TaskClass.HOST_SYNC)
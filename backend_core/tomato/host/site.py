@@ -3,6 +3,7 @@ from ..lib import logging
 from ..lib.error import UserError
 from ..generic import *
 from ..lib.remote_info import get_organization_info
+from ..lib.hierarchy import ClassName
 
 class Site(Entity, BaseDocument):
 	name = StringField(unique=True, required=True)
@@ -42,6 +43,12 @@ class Site(Entity, BaseDocument):
 		if self.id:
 			self.delete()
 
+	CHANGE_CLASS = ClassName.SITE
+	CHANGE_MEMBERSHIP_ATTRIBUTES = frozenset(["organization"])
+
+	def changeId(self):
+		return self.name
+
 	ACTIONS = {
 		Entity.REMOVE_ACTION: Action(fn=_remove, check=_checkRemove)
 	}
@@ -0,0 +1 @@
+../../../shared/lib/dump_store.py
\ No newline at end of file
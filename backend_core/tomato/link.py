@@ -20,6 +20,7 @@ from . import scheduler
 from datetime import timedelta
 from .host.site import Site
 from lib import util, logging #@UnresolvedImport
+from lib.tasks import TaskClass #@UnresolvedImport
 from lib.error import UserError
 import time, random, threading
 
@@ -241,5 +242,5 @@ def getStatisticsInfo(siteA, siteB): #@ReservedAssignment
 	return getStatistics(siteA, siteB).info()
 
 
-scheduler.scheduleMaintenance(60, get_site_pairs, lambda pair: ping(pair[0], pair[1], ignore_missing_site=True))  # every minute
-scheduler.scheduleRepeated(60, housekeep)  # every minute
\ No newline at end of file
+scheduler.scheduleMaintenance(60, get_site_pairs, lambda pair: ping(pair[0], pair[1], ignore_missing_site=True), taskClass=TaskClass.LINK_PING)  # every minute
+scheduler.scheduleRepeated(60, housekeep, taskClass=TaskClass.HOUSEKEEPING)  # every minute
\ No newline at end of file
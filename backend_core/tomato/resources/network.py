@@ -19,6 +19,7 @@ from ..db import *
 from ..generic import *
 from ..host import Host
 from ..lib.error import UserError
+from ..lib.hierarchy import ClassName
 
 class Network(Entity, BaseDocument):
 	kind = StringField(required=True, unique=True)
@@ -46,6 +47,11 @@ class Network(Entity, BaseDocument):
 		UserError.check(not self.instances.count(), code=UserError.NOT_EMPTY, message="Cannot remove network with instances")
 		return True
 
+	CHANGE_CLASS = ClassName.NETWORK
+
+	def changeId(self):
+		return self.kind
+
 	ACTIONS = {
 		Entity.REMOVE_ACTION: Action(fn=_remove, check=_checkRemove)
 	}
@@ -99,6 +105,9 @@ class NetworkInstance(Entity, BaseDocument):
 		if self.id:
 			self.delete()
 
+	CHANGE_CLASS = ClassName.NETWORK_INSTANCE
+	CHANGE_MEMBERSHIP_ATTRIBUTES = frozenset(["network", "host"])
+
 	ACTIONS = {
 		Entity.REMOVE_ACTION: Action(fn=remove)
 	}
@@ -20,6 +20,7 @@ from ..db import *
 from ..lib.error import UserError, InternalError
 from ..lib.constants import TypeName
 from ..lib.exceptionhandling import wrap_errors
+from ..lib.hierarchy import ClassName
 
 
 TECHS = [TypeName.FULL_VIRTUALIZATION, TypeName.CONTAINER_VIRTUALIZATION, TypeName.REPY]
@@ -50,6 +51,8 @@ class Profile(Entity, BaseDocument):
 		if self.id:
 			self.delete()
 
+	CHANGE_CLASS = ClassName.PROFILE
+
 	ACTIONS = {
 		Entity.REMOVE_ACTION: Action(fn=remove)
 	}
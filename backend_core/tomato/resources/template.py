@@ -23,6 +23,7 @@ from ..lib.newcmd import aria2
 from ..lib.newcmd.util import fs
 from ..lib.constants import TypeName
 from ..lib.repy_doc_reader import read_repy_doc
+from ..lib.hierarchy import ClassName
 from .. import scheduler
 import os, os.path, shutil, threading
 
@@ -231,6 +232,8 @@ class Template(LockedEntity, BaseDocument):
 			obj.remove()
 			raise
 
+	CHANGE_CLASS = ClassName.TEMPLATE
+
 	ACTIONS = {
 		Entity.REMOVE_ACTION: Action(fn=remove)
 	}
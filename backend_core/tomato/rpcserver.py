@@ -28,9 +28,13 @@ from lib.settings import settings
 import ssl
 
 def logCall(function, args, kwargs):
-	logging.log(category="api", method=function.__name__, args=args, kwargs=kwargs)
+	logging.logCall(function, args, kwargs)
+
+def afterCall(function, args, kwargs, result):
+	logging.logCallEnd(function, args, kwargs, result)
 
 def handleError(error, function, args, kwargs):
+	logging.logCallError(function)
 	if not isinstance(error, Error):
 		if isinstance(error, TypeError) and function.__name__ in str(error):
 			error = UserError.wrap(error, data={"function": function.__name__, "args": args, "kwargs": kwargs})
@@ -53,12 +57,18 @@ def start():
 	def wrapError(error, method, args, kwargs):
 		error = handleError(error, method, args, kwargs)
 		return sslrpc2.Failure(error.raw)
+	server_conf = settings.get_rpc_server_settings()
 	for config in settings.get_own_interface_config():
-		server = sslrpc2.Server(('0.0.0.0', config['port']), beforeExecute=logCall, onError=wrapError, keyfile=settings.get_ssl_key_filename(),
-							certfile=settings.get_ssl_cert_filename(), ca_certs=settings.get_ssl_ca_filename(), cert_reqs=ssl.CERT_REQUIRED)
+		server = sslrpc2.Server(('0.0.0.0', config['port']), beforeExecute=logCall, afterExecute=afterCall, onError=wrapError, keyfile=settings.get_ssl_key_filename(),
+							certfile=settings.get_ssl_cert_filename(), ca_certs=settings.get_ssl_ca_filename(), cert_reqs=ssl.CERT_REQUIRED,
+							maxWorkers=server_conf['max-workers'], connectionQueueSize=server_conf['connection-queue-size'],
+							requestTimeout=server_conf['request-timeout'], batchParallelism=server_conf['batch-parallelism'])
 		server.registerContainer(api)
 		util.start_thread(server.serve_forever)
 		print >>sys.stderr, "done."
 
 def stop():
-	server.shutdown()
\ No newline at end of file
+	server.shutdown()
+
+def info():
+	return server.info()
\ No newline at end of file
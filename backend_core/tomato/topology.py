@@ -17,11 +17,12 @@
 
 from .db import *
 from .generic import *
-import time
+import time, threading, sys
 from lib import logging #@UnresolvedImport
 from . import scheduler
-from .lib.error import UserError #@UnresolvedImport
+from .lib.error import UserError, Error #@UnresolvedImport
 from .lib import util
+from .lib.tasks import TaskClass
 from .lib.topology_role import Role
 from .lib.remote_info import get_user_info
 from .lib.service import get_backend_users_proxy
@@ -29,6 +30,7 @@ from .lib.constants import StateName, ActionName
 from .lib.exceptionhandling import wrap_and_handle_current_exception
 from .lib.references import Reference
 from .lib.constants import TypeName
+from .lib.hierarchy import ClassName
 
 class TimeoutStep:
 	INITIAL = 0
@@ -116,7 +118,8 @@ class Topology(Entity, BaseDocument):
 										   TypeName.EXTERNAL_NETWORK,
 										   TypeName.EXTERNAL_NETWORK_ENDPOINT,
 										   TypeName.FIXED_BRIDGE,
-										   TypeName.BRIDGE])
+										   TypeName.BRIDGE],
+							 parallel=True)
 
 	def action_destroy(self):
 		try:
@@ -164,14 +167,27 @@ class Topology(Entity, BaseDocument):
 		self.timeout = time.time() + timeout
 		self.timeoutStep = TimeoutStep.INITIAL if timeout > topology_config[Config.TOPOLOGY_TIMEOUT_WARNING] else TimeoutStep.WARNED
 		
-	def _compoundAction(self, action, stateFilter, typeOrder, typesExclude):
+	def _compoundAction(self, action, stateFilter, typeOrder, typesExclude, parallel=False):
+		"""
+		execute an action on the elements and connections of the topology.
+		:param bool parallel: place all elements at once and execute the action on the elements of each type
+		                      concurrently (see _parallelAction)
+		"""
+		elements = list(self.elements)
+		selected = lambda el: stateFilter(el.state) and el.type not in typesExclude
+		placement = None
+		if parallel:
+			placement = Placement()
+			placement.plan([el for el in elements if el.type in typeOrder and selected(el)])
 		# execute action in order
 		for type_ in typeOrder:
-			for el in self.elements:
-				if el.type != type_ or not stateFilter(el.state) or el.type in typesExclude:
-					continue
+			els = [el for el in elements if el.type == type_ and selected(el)]
+			if parallel:
+				self._parallelAction(els, action, placement)
+				continue
+			for el in els:
 				el.action(action)
-		# execute action on rest
+		# execute action on rest, the states of these elements may have been changed by their parents
 		for el in self.elements:
 			if not stateFilter(el.state) or el.type in typesExclude or el.type in typeOrder:
 				continue
@@ -182,9 +198,79 @@ class Topology(Entity, BaseDocument):
 				continue
 			con.action(action)
 
-
-
-
+	def _parallelAction(self, elements, action, placement):
+		"""
+		execute an action on several elements concurrently.
+		The elements are ordered so that the planned hosts alternate, at most prepare-per-host elements of one host
+		and prepare-parallelism elements in total are processed at the same time. Every finished element is logged.
+		All elements are processed even if some of them fail. Afterwards, the first error is raised, if it is an
+		Error, its data contains the results of all elements in 'elements'.
+		:param list elements: elements to execute the action on
+		:param str action: name of the action
+		:param host.Placement placement: placement that has planned the hosts of the elements
+		"""
+		if not elements:
+			return
+		topology_config = settings.get_topology_settings()
+		byHost = {}
+		for el in elements:
+			_host = placement.planned(el)
+			byHost.setdefault(_host.name if _host else None, []).append(el)
+		semaphores = dict([(name, threading.BoundedSemaphore(topology_config[Config.TOPOLOGY_PREPARE_PER_HOST]))
+						   for name in byHost if name])
+		queue = []
+		queues = byHost.values()
+		while queues:
+			for q in queues:
+				queue.append(q.pop(0))
+			queues = [q for q in queues if q]
+		queue.reverse()
+		total = len(queue)
+		results = []  # [(element, host name, exc_info)]
+		lock = threading.RLock()
+		topology = self
+		class WorkerThread(threading.Thread):
+			def run(self):
+				while True:
+					with lock:
+						if not queue:
+							return
+						el = queue.pop()
+					_host = placement.planned(el)
+					hostName = _host.name if _host else None
+					semaphore = semaphores.get(hostName)
+					exc_info = None
+					if semaphore:
+						semaphore.acquire()
+					try:
+						with placement:
+							el.action(action)
+					except:
+						exc_info = sys.exc_info()
+					finally:
+						if semaphore:
+							semaphore.release()
+					with lock:
+						results.append((el, hostName, exc_info))
+						logging.logMessage("compound action progress", category="topology", id=topology.idStr,
+										   action=action, element=el.idStr, done=len(results), total=total, state=el.state,
+										   host=hostName, error=repr(exc_info[1]) if exc_info else None)
+		threads = []
+		for _ in xrange(0, min(total, topology_config[Config.TOPOLOGY_PREPARE_PARALLELISM])):
+			thread = WorkerThread()
+			threads.append(thread)
+			thread.start()
+		for thread in threads:
+			thread.join()
+		failed = [exc_info for _, _, exc_info in results if exc_info]
+		if not failed:
+			return
+		report = dict([(el.idStr, {"state": el.state, "host": hostName, "error": repr(exc_info[1]) if exc_info else None})
+					   for el, hostName, exc_info in results])
+		exc_type, exc, trace = failed[0]
+		if isinstance(exc, Error):
+			exc.data = dict(exc.data or {}, elements=report)
+		raise exc_type, exc, trace
 
 	def set_role(self, username, role, skip_save=False):
 		"""
@@ -205,17 +291,15 @@ class Topology(Entity, BaseDocument):
 				return
 			else:
 				self.permissions.append(Permission(user=username, role=role))
-				if not skip_save:
-					self.save()
 		else:
 			if role == Role.null:
 				self.permissions.remove(target_permission)
-				if not skip_save:
-					self.save()
 			else:
 				target_permission.role = role
-				if not skip_save:
-					self.save()
+		if not skip_save:
+			self.save()
+			# topology lists are filtered by permissions
+			self.publishChange(membership=True)
 
 
 	def user_has_role(self, username, role):
@@ -287,6 +371,7 @@ class Topology(Entity, BaseDocument):
 		logging.logMessage("disown", category="topology", id=self.idStr, info=self.info())
 		self.permissions = []
 		self.save()
+		self.publishChange(membership=True)
 
 	def modify_site(self, val):
 		if val:
@@ -328,11 +413,25 @@ class Topology(Entity, BaseDocument):
 				return state
 		return StateName.CREATED
 
+	def _prefetchComponents(self, els, cons):
+		"""
+		load the objects that the info of the elements and connections refers to with one query per collection
+		instead of one query per reference.
+		"""
+		loaded = {el.id: el for el in els}
+		prefetch(cons, ["elementFrom", "elementTo"], loaded)
+		hostObjects = prefetch(els, ["element", "hostElements", "hostConnections", "site", "profile", "template"], loaded)
+		hostObjects += prefetch(cons, ["connectionFrom", "connectionTo"], loaded)
+		hosts = prefetch(hostObjects, ["host"], loaded)
+		prefetch(hosts, ["site"], loaded)
+
 	def info(self, full=False):
 		info = Entity.info(self)
 		if full:
 			# Speed optimization: use existing information to avoid database accesses
-			els = self.elements
+			els = list(self.elements)
+			cons = list(self.connections)
+			self._prefetchComponents(els, cons)
 			childs = {}
 			for el in els:
 				if not el.parentId:
@@ -347,10 +446,11 @@ class Topology(Entity, BaseDocument):
 					continue
 				if not el.connectionId in connections:
 					connections[el.connectionId] = []
-				cons = connections[el.connectionId]
-				cons.append(el)
-			elements = [el.info(childs.get(el.id,[])) for el in els]
-			connections = [con.info(connections.get(con.id, [])) for con in self.connections]
+				conEls = connections[el.connectionId]
+				conEls.append(el)
+			with InfoMemo():
+				elements = [el.info(childs.get(el.id,[])) for el in els]
+				connections = [con.info(connections.get(con.id, [])) for con in cons]
 		else:
 			elements = [str(el.id) for el in self.elements.only('id')]
 			connections = [str(con.id) for con in self.connections.only('id')]
@@ -365,6 +465,8 @@ class Topology(Entity, BaseDocument):
 	def __repr__(self):
 		return "Topology(%s)" % self
 
+	CHANGE_CLASS = ClassName.TOPOLOGY
+
 	ACTIONS = {
 		Entity.REMOVE_ACTION: Action(_remove, check=checkRemove),
 		ActionName.START: Action(action_start, check=lambda self: self.checkCompoundAction(ActionName.START), paramSchema=schema.Constant({})),
@@ -445,7 +547,7 @@ def timeout_task():
 		except:
 			wrap_and_handle_current_exception(re_raise=False)
 
-scheduler.scheduleRepeated(600, timeout_task)
+scheduler.scheduleRepeated(600, timeout_task, taskClass=TaskClass.HOUSEKEEPING)
 
 @util.wrap_task
 def remove_disowned_topologies():
@@ -455,9 +557,10 @@ def remove_disowned_topologies():
 		except:
 			wrap_and_handle_current_exception(re_raise=False)
 
-scheduler.scheduleRepeated(3600*24, remove_disowned_topologies)
+scheduler.scheduleRepeated(3600*24, remove_disowned_topologies, taskClass=TaskClass.HOUSEKEEPING)
 
 import elements
 from .connections import Connection
 from lib.settings import settings, Config
 from .host.site import Site
+from .host import InfoMemo, Placement
@@ -5,4 +5,4 @@ from misc import statistics
 from dumpmanager import errordump_info, errordump_list, errordumps_force_refresh,\
 	errorgroup_remove, errorgroup_modify, errorgroup_favorite, errorgroup_hide, errorgroup_info, errorgroup_list
 
-from dump_collection import dump_push_from_backend, receive_dump_from_api
+from dump_collection import dump_push_from_backend, dump_push_many_from_backend, receive_dump_from_api
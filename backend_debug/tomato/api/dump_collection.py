@@ -1,4 +1,4 @@
-from ..dumpmanager import insert_dump
+from ..dumpmanager import insert_dump, insert_dumps
 from ..dumpmanager.fetching.api import ApiDumpSource
 from ..dumpmanager.fetching.backend import BackendDumpSource
 from ..lib.error import UserError
@@ -11,6 +11,15 @@ def dump_push_from_backend(tomato_module, dump_dict):
 	source = BackendDumpSource(tomato_module)
 	insert_dump(dump_dict, source)
 
+def dump_push_many_from_backend(tomato_module, dump_dicts):
+	"""
+	actively push several dumps to the dumpmanager.
+	Only call this as a backend service.
+	:return: ids of the dumps that have been stored. The others should be pushed again later.
+	"""
+	source = BackendDumpSource(tomato_module)
+	return insert_dumps(dump_dicts, source)
+
 def receive_dump_from_api(source_name, dump_dict):
 	"""
 	receive a dump from the api
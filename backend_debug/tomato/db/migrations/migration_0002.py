@@ -0,0 +1,52 @@
+from mongoengine.connection import get_db
+
+# dumps used to be embedded into their error group. Move them to their own collection and store the counters
+# and distinct values of the group in the group document.
+
+KEEP_FIRST = 5
+KEEP_LAST = 5
+MAX_VALUES = 100
+
+def _remember(values, value):
+	if value in values or len(values) >= MAX_VALUES:
+		return False
+	values.append(value)
+	return True
+
+def migrate_group(db, group):
+	dumps = group.get('dumps', [])
+	count = group.get('removed_dumps', 0) + len(dumps)
+	sources, versions, types, descriptions = [], [], [], []
+	last_timestamp = 0
+	docs = []
+	for i, dump in enumerate(dumps):
+		new_source = _remember(sources, dump.get('source'))
+		new_version = _remember(versions, dump.get('software_version'))
+		_remember(types, dump.get('type'))
+		_remember(descriptions, dump.get('description'))
+		last_timestamp = max(last_timestamp, dump.get('timestamp', 0))
+		doc = dict(dump)
+		doc['group_id'] = group['group_id']
+		doc['seq'] = count - len(dumps) + i
+		# the remaining dumps have survived shrinking before, only the last ones may be removed later.
+		doc['pinned'] = i < KEEP_FIRST or i < len(dumps) - KEEP_LAST or new_source or new_version
+		docs.append(doc)
+	for doc in docs:
+		db['error_dump'].update_one({'group_id': doc['group_id'], 'source': doc['source'], 'dump_id': doc['dump_id']},
+		                            {'$setOnInsert': doc}, upsert=True)
+	db['error_group'].update_one({'_id': group['_id']}, {
+		'$set': {
+			'dump_count': count,
+			'last_timestamp': last_timestamp,
+			'sources': sources,
+			'software_versions': versions,
+			'types': types,
+			'descriptions': descriptions
+		},
+		'$unset': {'dumps': ''}
+	})
+
+def migrate():
+	db = get_db()
+	for group in db['error_group'].find({'dumps': {'$exists': True}}):
+		migrate_group(db, group)
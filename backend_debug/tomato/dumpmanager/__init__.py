@@ -6,6 +6,7 @@ from errordump import ErrorDump
 from errorgroup import get_group, ErrorGroup
 from ..lib.settings import settings, Config
 from ..lib.exceptionhandling import wrap_and_handle_current_exception
+from ..lib.tasks import TaskClass
 from .. import scheduler
 import fetching
 
@@ -31,11 +32,43 @@ def insert_dump(dump_dict, source):
 				group.save()
 
 
+def insert_dumps(dump_dicts, source):
+	"""
+	insert several dumps. Dumps are grouped by their error group, so every group is only shrunk and saved once.
+	:param list dump_dicts: dumps to insert
+	:return: ids of the dumps that have been handled. Dumps of groups that failed are not included.
+	:rtype: list
+	"""
+	by_group = {}
+	for dump_dict in dump_dicts:
+		by_group.setdefault(dump_dict['group_id'], []).append(dump_dict)
+	handled = []
+	for group_id, group_dumps in by_group.iteritems():
+		try:
+			group = get_group(group_id, True, group_dumps[0]['description'], source.dump_source_name())
+			with group.lock:
+				try:
+					for dump_dict in group_dumps:
+						dump_obj = ErrorDump.from_dict(dump_dict, source)
+						if dump_obj.timestamp >= source.get_last_updatetime():
+							group.insert_dump(dump_obj)
+				finally:
+					try:
+						group.shrink()
+					finally:
+						group.save()
+			handled.extend(dump_dict['dump_id'] for dump_dict in group_dumps)
+		except:
+			wrap_and_handle_current_exception(re_raise=False)
+	return handled
+
+
 def fetch_from(source_name):
 	"""
 	:param str source: source to fetch from
 	"""
-	fetching.get_source_by_name(source_name).fetch_new_dumps(insert_dump)
+	page_size = settings.get_dumpmanager_config()[Config.DUMPMANAGER_FETCH_PAGE_SIZE]
+	fetching.get_source_by_name(source_name).fetch_new_dumps(insert_dump, page_size)
 
 def list_all_dumpsource_names():
 	return [s.dump_source_name() for s in fetching.get_all_dumpsources()]
@@ -45,11 +78,11 @@ def _get_sync_tasks():
 	return {t.args[0]: tid for tid, t in scheduler.tasks.items() if t.fn == fetch_from}
 
 def update_all():
+	"""
+	fetch dumps from all sources now. The sources are fetched in the background, in parallel.
+	"""
 	for source in fetching.get_all_dumpsources():
-		try:
-			source.fetch_new_dumps(insert_dump)
-		except:
-			wrap_and_handle_current_exception(re_raise=False)
+		scheduler.scheduleOnce(0, fetch_from, source.dump_source_name(), taskClass=TaskClass.DUMP_FETCH)
 
 def start():
 	"""
@@ -57,8 +90,10 @@ def start():
 	auto-pushing sources may result in empty results, that's OK.
 	:return:
 	"""
-	scheduler.scheduleMaintenance(settings.get_dumpmanager_config()[Config.DUMPMANAGER_COLLECTION_INTERVAL],
-	                              list_all_dumpsource_names, fetch_from)
+	config = settings.get_dumpmanager_config()
+	scheduler.configureClass(TaskClass.DUMP_FETCH, maxConcurrent=config[Config.DUMPMANAGER_FETCH_CONCURRENCY])
+	scheduler.scheduleMaintenance(config[Config.DUMPMANAGER_COLLECTION_INTERVAL],
+	                              list_all_dumpsource_names, fetch_from, taskClass=TaskClass.DUMP_FETCH)
 
 def stop():
 	pass
\ No newline at end of file
@@ -2,21 +2,47 @@ from ..db import *
 import fetching
 import time
 
-class ErrorDump(EmbeddedDocument):
+class ErrorDump(BaseDocument):
+	"""
+	A dump of an error group. Dumps are stored in their own collection, the group only keeps counters and summaries.
+	"""
+	groupId = StringField(db_field='group_id', required=True)
 	source = StringField(required=True)
-	dumpId = StringField(db_field='dump_id', required=True)  # not unique, different semantics on embedded documents
+	dumpId = StringField(db_field='dump_id', required=True)  # only unique per group and source
 	description = DictField(required=True)
 	data = DictField()
+	dataAvailable = BooleanField(default=True, db_field='data_available')  # False if the data is still on the source
 	type = StringField(required=True)
 	softwareVersion = DictField(db_field='software_version')
 	timestamp = FloatField(required=True)
+	seq = IntField(required=True)  # position in the group, in the order the dumps have been inserted
+	pinned = BooleanField(default=False)  # this dump is never removed when the group is shrunk
 	meta = {
-		'ordering': ['+timestamp'],
+		'collection': 'error_dump',
+		'ordering': ['+seq'],
+		'indexes': [
+			{'fields': ['groupId', 'source', 'dumpId'], 'unique': True},
+			('groupId', 'seq'),
+			('groupId', 'pinned', 'seq')
+		]
 	}
 
 	def getSource(self):
 		return fetching.get_source_by_name(self.source)
 
+	def load_data(self):
+		"""
+		fetch the data from the source if it has not been transferred with the dump.
+		:return: whether the data is available
+		"""
+		if not self.dataAvailable:
+			data = self.getSource().fetch_dump_data(self.dumpId)
+			if data is not None:
+				self.data = data
+				self.dataAvailable = True
+				self.save()
+		return self.dataAvailable
+
 	def info(self, include_data=False):
 		dump = {
 			'source': self.source,
@@ -24,9 +50,11 @@ class ErrorDump(EmbeddedDocument):
 			'description': self.description,
 			'type': self.type,
 			'software_version': self.softwareVersion,
-			'timestamp': self.timestamp
+			'timestamp': self.timestamp,
+			'data_available': self.dataAvailable
 		}
 		if include_data:
+			dump['data_available'] = self.load_data()
 			dump['data'] = self.data
 		return dump
 
@@ -39,5 +67,6 @@ class ErrorDump(EmbeddedDocument):
 			description=dump_dict.get('description', None),
 			type=dump_dict.get('type', "API_receive"),
 			softwareVersion=dump_dict.get('software_version', None),
-			data=dump_dict.get("data", None)
+			data=dump_dict.get("data", None),
+			dataAvailable="data" in dump_dict
 		)
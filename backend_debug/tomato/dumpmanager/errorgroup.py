@@ -6,15 +6,23 @@ from ..lib.exceptionhandling import wrap_and_handle_current_exception
 from ..lib.service import get_backend_users_proxy
 from ..lib.userflags import Flags
 from ..lib.references import Reference
+from ..lib import locks
 
 class ErrorGroup(BaseDocument):
 	"""
-	:type dumps: list of ErrorDump
+	A group of dumps that happened due to the same reason.
+	The dumps are stored as ErrorDump documents, the group only holds counters and the distinct values of
+	some dump fields, which are updated whenever a dump is inserted.
 	"""
 	groupId = StringField(db_field='group_id', required=True, unique=True)
 	description = StringField(required=True)
+	dumpCount = IntField(default=0, db_field='dump_count')  # number of dumps ever inserted
 	removedDumps = IntField(default=0, db_field='removed_dumps')
-	dumps = ListField(EmbeddedDocumentField(ErrorDump))
+	lastTimestamp = FloatField(default=0, db_field='last_timestamp')
+	sources = ListField(StringField())
+	softwareVersions = ListField(DictField(), db_field='software_versions')
+	types = ListField(StringField())
+	descriptions = ListField(DictField())
 	hidden = BooleanField(default=False)
 	users_favorite = ListField(StringField())
 	clientData = DictField(db_field='client_data')
@@ -26,8 +34,11 @@ class ErrorGroup(BaseDocument):
 		]
 	}
 
-	LOCKS = {}
-	LOCKS_LOCK = threading.RLock()
+	KEEP_FIRST = 5  # the first dumps of a group are kept under any circumstance
+	KEEP_LAST = 5  # the last dumps of a group are kept under any circumstance
+	MAX_VALUES = 100  # maximum number of distinct values that are remembered per field
+
+	LOCKS = locks.LockRegistry("error_group")
 
 	GROUP_LIST_LOCK = threading.RLock()
 	"""
@@ -36,13 +47,7 @@ class ErrorGroup(BaseDocument):
 
 	@property
 	def lock(self):
-		key = self.groupId
-		with self.LOCKS_LOCK:
-			lock = self.LOCKS.get(key)
-			if not lock:
-				lock = threading.RLock()
-				self.LOCKS[key] = lock
-			return lock
+		return self.LOCKS.get(self.groupId)
 
 	def add_favorite_user(self, username):
 		with self.lock:
@@ -67,60 +72,29 @@ class ErrorGroup(BaseDocument):
 												message="Unsupported attribute for error group", data={'key': k, 'value': v})
 
 	def shrink(self):
+		"""
+		remove dumps that are not needed anymore.
+		The first and last dumps are kept as well as the first dump of every source and every software version.
+		"""
 		with self.lock:
-			oldLen = len(self.dumps)
-			if oldLen <= 10:
-				return
-
-			# first and last 5 dumps are kept under any circumstance.
-			#            first 5          last 5
-			dumps_keep = self.dumps[:5] + self.dumps[-5:]
-			# all except first and last 5
-			toremove = self.dumps[5:-5]
-
-			tokeep = []  # dumps in toremove, that should be kept
-			sources = set()  # sources that have been found in following loop
-			versions = []  # versions that have been found in following loop
-
-			for d in dumps_keep + toremove:  # prioritize those that are kept under any circumstance.
-				keep = False
-				if d.source not in sources:  # this source has not been found in a previous loop cycle
-					sources.add(d.source)
-					keep = True
-				if d.softwareVersion not in versions:  # this version has not been found in a previous loop cycle
-					versions.append(d.softwareVersion)
-					keep = True
-				if keep and (d in toremove):  # source or version haven't been found in previous cycle.
-					# Also make sure that tokeep is a subset of toremove
-					tokeep.append(d)
-
-			#            first 5                   last 5
-			self.dumps = self.dumps[:5] + tokeep + self.dumps[-5:]
-			# before:    self.dumps[:5] + toremove + self.dumps[-5:]
-			self.removedDumps += oldLen - len(self.dumps)
+			removed = ErrorDump.objects(groupId=self.groupId, pinned=False, seq__lt=self.dumpCount - self.KEEP_LAST).delete()
+			self.removedDumps += removed or 0
 
 	def info(self, as_user=None):
 		with self.lock:
 			res = {
 				'group_id': self.groupId,
 				'description': self.description,
-				'count': self.removedDumps,
-				'last_timestamp': 0,
-				'dump_contents': {}
+				'count': self.dumpCount,
+				'last_timestamp': self.lastTimestamp,
+				'dump_contents': {
+					'softwareVersion': list(self.softwareVersions),
+					'source': list(self.sources),
+					'type': list(self.types),
+					'description': list(self.descriptions)
+				}
 			}
 
-			select_unique_values = ['softwareVersion', 'source', 'type', 'description']
-			for val in select_unique_values:
-				res['dump_contents'][val] = []
-
-			res['count'] += len(self.dumps)
-			for dump in self.dumps:
-				if dump.timestamp > res['last_timestamp']:
-					res['last_timestamp'] = dump.timestamp
-				for val in select_unique_values:
-					if not dump[val] in res['dump_contents'][val]:
-						res['dump_contents'][val].append(getattr(dump, val))
-
 			for k, v in self.clientData.iteritems():
 				res['_'+k] = v
 
@@ -133,36 +107,59 @@ class ErrorGroup(BaseDocument):
 		"""
 		:rtype: list(ErrorDump)
 		"""
-		with self.lock:
-			return [d for d in self.dumps if ((source_filter is None) or (d.source == source_filter))]
+		if source_filter is None:
+			return list(ErrorDump.objects(groupId=self.groupId))
+		return list(ErrorDump.objects(groupId=self.groupId, source=source_filter))
 
 	def get_dump(self, dump_id, source_name):
 		"""
 		:rtype: ErrorDump
 		"""
-		with self.lock:
-			for d in self.dumps:
-				if d.dumpId == dump_id and d.source == source_name:
-					return d
+		try:
+			return ErrorDump.objects.get(groupId=self.groupId, dumpId=dump_id, source=source_name)
+		except ErrorDump.DoesNotExist:
 			raise UserError(UserError.ENTITY_DOES_NOT_EXIST, message="no such dump", data={"group_id": self.groupId, "dump_id": dump_id, "source_name": source_name})
 
 	def hide(self):
 		with self.lock:
 			self.hidden = True
 
+	def _remember(self, values, value):
+		"""
+		add value to the distinct values of a field.
+		:return: whether the value is new
+		"""
+		if value in values or len(values) >= self.MAX_VALUES:
+			return False
+		values.append(value)
+		return True
+
 	def insert_dump(self, dump_obj):
+		"""
+		store a dump in this group. The group has to be saved afterwards.
+		:return: the dump or None if it already was in this group
+		"""
 		with self.lock:
-			for d in self.dumps:
-				if d.dumpId == dump_obj.dumpId and d.source == dump_obj.source:
-					return None  # this dump is already in this group.
+			if ErrorDump.objects(groupId=self.groupId, dumpId=dump_obj.dumpId, source=dump_obj.source).count():
+				return None  # this dump is already in this group.
+			new_source = self._remember(self.sources, dump_obj.source)
+			new_version = self._remember(self.softwareVersions, dump_obj.softwareVersion)
+			self._remember(self.types, dump_obj.type)
+			self._remember(self.descriptions, dump_obj.description)
+			dump_obj.groupId = self.groupId
+			dump_obj.seq = self.dumpCount
+			dump_obj.pinned = self.dumpCount < self.KEEP_FIRST or new_source or new_version
+			dump_obj.save()
+			self.dumpCount += 1
+			self.lastTimestamp = max(self.lastTimestamp, dump_obj.timestamp)
 			self.hidden = False
-			self.dumps.append(dump_obj)
 			return dump_obj
 
 	def remove(self):
 		with ErrorGroup.GROUP_LIST_LOCK:
 			with self.lock:
 				if self.id:
+					ErrorDump.objects(groupId=self.groupId).delete()
 					self.delete()
 
 	@staticmethod
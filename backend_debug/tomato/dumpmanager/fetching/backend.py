@@ -1,7 +1,7 @@
 from dumpsource import PullingDumpSource
 from ...lib.service import get_tomato_inner_proxy, is_reachable, is_self
 from ...lib.settings import settings, Config
-from ...dump import getAll
+from ...dump import getAll, getDump
 from ...lib.error import InternalError
 from ...lib.constants import DumpSourcePrefix
 
@@ -20,17 +20,24 @@ class BackendDumpSource(PullingDumpSource):
 	def dump_source_name(self):
 		return DumpSourcePrefix.BACKEND + self.tomato_module
 
-	def _fetch_dumps(self, last_updatetime):
+	def _fetch_dumps(self, last_updatetime, last_dump_id, limit):
 		# no need to fetch if dumps are disabled...
 		if not settings.get_dumpmanager_enabled(self.tomato_module):
 			return None
 
 		if is_self(self.tomato_module):
-			return getAll(last_updatetime)
+			return getAll(last_updatetime, last_dump_id, limit, include_data=False)
 		else:
 			if not is_reachable(self.tomato_module):
 				return None  # no need to throw an exception here, just wait for the service to become reachable again.
-			return get_tomato_inner_proxy(self.tomato_module).dump_list(last_updatetime)
+			return get_tomato_inner_proxy(self.tomato_module).dump_list(last_updatetime, last_dump_id, limit, False)
+
+	def _fetch_dump(self, dump_id):
+		if is_self(self.tomato_module):
+			return getDump(dump_id)
+		if not is_reachable(self.tomato_module):
+			return None
+		return get_tomato_inner_proxy(self.tomato_module).dump_info(dump_id)
 
 	def _clock_offset(self):
 		if is_self(self.tomato_module):
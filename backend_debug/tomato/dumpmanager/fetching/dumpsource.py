@@ -1,12 +1,12 @@
 """
 this contains abstract dump source classes.
 """
-import time
 from ...lib.error import Error, InternalError, TransportError
 from ...lib.exceptionhandling import on_error_continue, wrap_and_handle_current_exception
 from ...db import data
 
 DB_FORMAT = "dumpsource:%s/last_updatetime"
+DB_FORMAT_LAST_ID = "dumpsource:%s/last_dump_id"
 
 class DumpSource(object):
 	"""
@@ -38,6 +38,14 @@ class DumpSource(object):
 		"""
 		data.set(DB_FORMAT % self.dump_source_name(), last_updatetime)
 
+	def fetch_dump_data(self, dump_id):
+		"""
+		get the data of a dump whose data has not been transferred together with the dump.
+		:param str dump_id: id of the dump on this source
+		:return: data of the dump or None if it is not available (anymore)
+		"""
+		return None
+
 
 
 class PullingDumpSource(DumpSource):
@@ -47,15 +55,36 @@ class PullingDumpSource(DumpSource):
 
 	__slots__ = ()
 
-	def _fetch_dumps(self, last_updatetime):
+	def _fetch_dumps(self, last_updatetime, last_dump_id, limit):
 		"""
-		fetch dumps from the source after the given timestamp.
-		:param float last_updatetime: last update time. timestamp should be put as seen by the remote.
-		:return: a list of dump dicts. Return None if fetching is currently not possible.
+		fetch dumps from the source after the given position, without their data.
+		:param float last_updatetime: timestamp of the last fetched dump, as seen by the remote.
+		:param str last_dump_id: id of the last fetched dump. None to fetch all dumps with timestamp >= last_updatetime.
+		:param int limit: maximum number of dumps to fetch
+		:return: a list of dump dicts, ordered by timestamp and id. Return None if fetching is currently not possible.
 		:rtype: list(dict) or None
 		"""
 		raise NotImplementedError()
 
+	def _fetch_dump(self, dump_id):
+		"""
+		fetch a dump including its data.
+		:return: dump dict or None if it is not available
+		:rtype: dict or None
+		"""
+		raise NotImplementedError()
+
+	def fetch_dump_data(self, dump_id):
+		dump_dict = self._fetch_dump(dump_id)
+		return dump_dict.get('data') if dump_dict else None
+
+	def _get_last_dump_id(self):
+		return data.get(DB_FORMAT_LAST_ID % self.dump_source_name(), None)
+
+	def _set_cursor(self, last_updatetime, last_dump_id):
+		self._set_last_updatetime(last_updatetime)
+		data.set(DB_FORMAT_LAST_ID % self.dump_source_name(), last_dump_id)
+
 	def _clock_offset(self):
 		"""
 		get clock offset.
@@ -65,11 +94,14 @@ class PullingDumpSource(DumpSource):
 		raise NotImplementedError()
 
 	@on_error_continue()
-	def fetch_new_dumps(self, insert_dump_func):
+	def fetch_new_dumps(self, insert_dump_func, page_size=100):
 		"""
 		refresh dumps
 		for each dump: call insert_dump_func(dump_dict, self)
+		Dumps are fetched page by page without their data. The position of the last fetched dump is saved after
+		every page, so an interrupted fetch continues there.
 		:param func insert_dump_func: function to insert dumps
+		:param int page_size: number of dumps fetched at once
 		:return: None
 		:rtype: None
 		"""
@@ -78,17 +110,20 @@ class PullingDumpSource(DumpSource):
 			return  # if this is unavailable, something really strange is happening on backend_core. Let's not fetch for now.
 							# probably, this is simply because backend_core hasn't received any host info yet.
 
-
-		this_fetch_time = time.time() - offset
-
-		fetch_results = self._fetch_dumps(self.get_last_updatetime())
-		if fetch_results is None:
-			return  # this means that fetching is currently not possible.
-
-		for dump_dict in fetch_results:
-			try:
-				insert_dump_func(dump_dict, self)
-			except:
-				wrap_and_handle_current_exception(re_raise=False)
-
-		self._set_last_updatetime(this_fetch_time)
+		last_updatetime, last_dump_id = self.get_last_updatetime(), self._get_last_dump_id()
+		while True:
+			fetch_results = self._fetch_dumps(last_updatetime, last_dump_id, page_size)
+			if fetch_results is None:
+				return  # this means that fetching is currently not possible.
+
+			for dump_dict in fetch_results:
+				try:
+					insert_dump_func(dump_dict, self)
+				except:
+					wrap_and_handle_current_exception(re_raise=False)
+
+			if fetch_results:
+				last_updatetime, last_dump_id = fetch_results[-1]['timestamp'], fetch_results[-1]['dump_id']
+				self._set_cursor(last_updatetime, last_dump_id)
+			if len(fetch_results) < page_size:
+				return
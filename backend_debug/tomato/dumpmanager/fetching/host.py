@@ -15,11 +15,17 @@ class HostDumpSource(PullingDumpSource):
 	def dump_source_name(self):
 		return DumpSourcePrefix.HOST + self.name
 
-	def _fetch_dumps(self, last_updatetime):
+	def _fetch_dumps(self, last_updatetime, last_dump_id, limit):
 		host = get_host_info(self.name)
 		if not host.exists():
 			return None  # be silent in this case. it may happen that a host gets deleted ;)
-		return host.get_dumps(last_updatetime)
+		return host.get_dumps(last_updatetime, last_dump_id, limit, include_data=False)
+
+	def _fetch_dump(self, dump_id):
+		host = get_host_info(self.name)
+		if not host.exists():
+			return None
+		return host.get_dump(dump_id)
 
 	def _clock_offset(self):
 		return get_host_info(self.name).get_clock_offset()
@@ -0,0 +1 @@
+../../../shared/lib/changefeed.py
\ No newline at end of file
@@ -0,0 +1 @@
+../../../shared/lib/locks.py
\ No newline at end of file
@@ -18,3 +18,4 @@
 from .db import DataEntry
 
 from dumpmanager.errorgroup import ErrorGroup
+from dumpmanager.errordump import ErrorDump
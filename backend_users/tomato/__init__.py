@@ -32,7 +32,7 @@ from mongoengine import connect
 database_connection = connect(settings.settings.get_db_settings()['database'], host=settings.settings.get_db_settings()['host'])
 database_obj = getattr(database_connection, settings.settings.get_db_settings()['database'])
 
-from .lib import logging
+from .lib import logging, locks
 
 from .lib import tasks #@UnresolvedImport
 scheduler = tasks.TaskScheduler(maxLateTime=30.0, minWorkers=5, maxWorkers=settings.settings.get_tasks_settings()['max-workers'])
@@ -51,7 +51,8 @@ hierarchy.init()
 
 
 def start():
-	logging.openDefault(settings.settings.get_log_filename())
+	logging.openDefault(settings.settings.get_log_filename(), config=settings.settings.get_logging_settings())
+	locks.configure(statistics=settings.settings.get_lock_settings()['statistics'])
 	if not os.environ.has_key("TOMATO_NO_MIGRATE"):
 		db.migrate()
 	else:
@@ -71,7 +72,7 @@ def reload_(*args):
 	print >>sys.stderr, "Reloading..."
 	logging.closeDefault()
 	settings.settings.reload()
-	logging.openDefault(settings.settings.get_log_filename())
+	logging.openDefault(settings.settings.get_log_filename(), config=settings.settings.get_logging_settings())
 
 def _printStackTraces():
 	import traceback
@@ -1,6 +1,6 @@
 from auth import user_check_password
 
-from dump import dump_list
+from dump import dump_list, dump_info
 
 from debug import debug_stats, ping, debug_execute_task, debug_debug_internal_api_call, debug_throw_error
 
@@ -13,6 +13,6 @@ from organization import organization_remove, organization_modify, organization_
 from user import user_create, user_exists, user_info, user_list, user_modify, user_modify_password,\
 	user_remove, username_list
 
-from misc import statistics
+from misc import statistics, change_feed
 
 from hierarchy import object_exists, object_parents, objects_available
@@ -1,10 +1,26 @@
-from ..dump import getAll
+from ..dump import getAll, getDump
 
-def dump_list(after=None):
+def dump_list(after=None, after_id=None, limit=None, include_data=True):
 	"""
-	returns a list of dumps.
+	returns a list of dumps, ordered by timestamp and id.
 
 	Parameter *after*:
 		If set, only include dumps which have a timestamp after this time.
+
+	Parameter *after_id*:
+		If set together with *after*, only include dumps after the dump with this id and the timestamp *after*.
+		Together with *limit*, this allows to fetch all dumps page by page.
+
+	Parameter *limit*:
+		If set, return at most this many dumps.
+
+	Parameter *include_data*:
+		If False, the (possibly big) data of the dumps is not included. Use dump_info to get it.
+	"""
+	return getAll(after=after, after_id=after_id, limit=limit, include_data=include_data)
+
+def dump_info(dump_id):
+	"""
+	returns a dump including its data, or None if it does not exist (anymore).
 	"""
-	return getAll(after=after)
+	return getDump(dump_id)
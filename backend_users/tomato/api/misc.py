@@ -1,4 +1,5 @@
 from ..lib.cache import cached
+from ..lib import changefeed
 from ..user import User
 import time
 
@@ -10,3 +11,10 @@ def statistics():
 			'users_active_30days': User.objects.filter(lastLogin__gte = time.time() - 30*24*60*60).count()
 		}
 	}
+
+def change_feed(epoch=None, seq=0):
+	"""
+	get the objects that have changed since the given position of the change feed.
+	Used by backend_api to keep its caches up to date. See lib.changefeed.ChangeFeed.since.
+	"""
+	return changefeed.since(epoch, seq)
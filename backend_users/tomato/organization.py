@@ -3,6 +3,7 @@ from .lib import logging
 from .lib.error import UserError
 from .generic import *
 from .lib.service import get_backend_core_proxy
+from .lib.hierarchy import ClassName
 
 class Organization(Entity, BaseDocument):
 	name = StringField(unique=True, required=True)
@@ -49,6 +50,11 @@ class Organization(Entity, BaseDocument):
 		except Organization.DoesNotExist:
 			return None
 
+	CHANGE_CLASS = ClassName.ORGANIZATION
+
+	def changeId(self):
+		return self.name
+
 	ACTIONS = {
 		Entity.REMOVE_ACTION: Action(fn=_remove, check=_checkRemove)
 	}
@@ -24,6 +24,7 @@ from .lib.settings import settings, Config
 from .lib.error import UserError, InternalError
 
 from .lib.userflags import Flags
+from .lib.hierarchy import ClassName
 
 
 USER_ATTRS = ["realname", "email", "password"]
@@ -279,6 +280,12 @@ class User(Entity, BaseDocument):
 		if did_del:
 			self.save()
 
+	CHANGE_CLASS = ClassName.USER
+	CHANGE_MEMBERSHIP_ATTRIBUTES = frozenset(["organization", "flags"])
+
+	def changeId(self):
+		return self.name
+
 	ACTIONS = {
 		Entity.REMOVE_ACTION: Action(fn=_remove),
 	}
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark for the sslrpc2 message framing.
+
+Compares the framing used up to now (string concatenation, compression of everything over 100 bytes,
+decoding from one string) with the current implementation of Message.writeTo/readFrom.
+For every payload, the bytes copied per call are counted: output of packing and compression
+(including compression samples), frames built by concatenation, data read from the connection,
+decompressed data and data fed into a streaming unpacker.
+
+Usage: python sslrpc2_framing_benchmark.py [rounds]
+"""
+
+import os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared", "lib", "rpc"))
+import sslrpc2, msgpack, snappy
+
+
+class Counter:
+	def __init__(self):
+		self.copied = 0
+		self.produced = set()
+
+	def produce(self, data):
+		self.copied += len(data)
+		self.produced.add(id(data))
+		return data
+
+counter = Counter()
+
+
+class CountingConnection:
+	def __init__(self):
+		self.frames = []
+		self.pos = 0
+		self.data = ""
+
+	def write(self, *chunks):
+		for chunk in chunks:
+			if id(chunk) not in counter.produced:
+				# the frame has been built by copying
+				counter.copied += len(chunk)
+			self.frames.append(chunk)
+
+	def read(self, size):
+		if not self.data:
+			self.data, self.pos = "".join(self.frames), 0
+			self.frames = []
+		data = self.data[self.pos:self.pos+size]
+		self.pos += size
+		counter.copied += len(data)
+		return data
+
+
+def instrument():
+	packb, unpackb, compress, uncompress = msgpack.packb, msgpack.unpackb, snappy.compress, snappy.uncompress
+	msgpack.packb = lambda obj: counter.produce(packb(obj))
+	snappy.compress = lambda data: counter.produce(compress(data))
+	snappy.uncompress = lambda data: counter.produce(uncompress(data))
+	msgpack.unpackb = unpackb
+	Unpacker = msgpack.Unpacker
+	class CountingUnpacker(Unpacker):
+		def feed(self, data):
+			counter.copied += len(data)
+			return Unpacker.feed(self, data)
+	msgpack.Unpacker = CountingUnpacker
+
+
+def legacy_write(message, con):
+	bytes = msgpack.packb(message.encode())
+	method = sslrpc2.Message.Encoding.Raw
+	if len(bytes) > 100:
+		compressed = snappy.compress(bytes)
+		if len(compressed) < len(bytes):
+			bytes = compressed
+			method = sslrpc2.Message.Encoding.Snappy
+	size = len(bytes)
+	con.write(chr(method) + chr(size>>16) + chr((size>>8) & 0xff) + chr(size & 0xff) + bytes)
+
+def legacy_read(cls, con):
+	header = con.read(4)
+	method = ord(header[0])
+	size = (ord(header[1]) << 16) + (ord(header[2]) << 8) + (ord(header[3]))
+	bytes = con.read(size)
+	if method == sslrpc2.Message.Encoding.Snappy:
+		bytes = snappy.uncompress(bytes)
+	return cls.decode(msgpack.unpackb(bytes))
+
+def current_write(message, con):
+	message.writeTo(con)
+
+def current_read(cls, con):
+	return cls.readFrom(con)
+
+
+def payloads():
+	yield "small reply", {"id": "1234", "state": "started", "attrs": {"name": "test"}}
+	yield "topology_info(full=True)", {"elements": [
+		{"id": "%024x" % i, "type": "kvmqm", "state": "started", "parent": None, "connection": "%024x" % (i + 1),
+		 "attrs": {"name": "element %d" % i, "template": "debian-8", "ram": 512, "cpus": 1, "usbtablet": True}}
+		for i in xrange(5000)]}
+	yield "dump payload (incompressible)", {"data": os.urandom(2 << 20)}
+
+
+def run(write, read, value, rounds):
+	counter.copied = 0
+	start = time.time()
+	for _ in xrange(rounds):
+		counter.produced.clear()
+		con = CountingConnection()
+		write(sslrpc2.Reply(1, sslrpc2.Reply.Result.Success, value), con)
+		read(sslrpc2.Reply, con)
+	return counter.copied / rounds, (time.time() - start) / rounds
+
+
+def main():
+	rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+	instrument()
+	print "%-32s %10s %18s %18s %12s %12s" % ("payload", "size", "copied (legacy)", "copied (current)", "ms (legacy)", "ms (current)")
+	for name, value in payloads():
+		size = len(msgpack.packb(value))
+		legacy_copied, legacy_time = run(legacy_write, legacy_read, value, rounds)
+		copied, duration = run(current_write, current_read, value, rounds)
+		print "%-32s %10d %18d %18d %12.2f %12.2f" % (name, size, legacy_copied, copied, legacy_time * 1000, duration * 1000)
+
+if __name__ == "__main__":
+	main()
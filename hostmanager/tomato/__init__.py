@@ -78,7 +78,7 @@ stopped = threading.Event()
 httpd_pid = None
 
 def start():
-	logging.openDefault(config.LOG_FILE)
+	logging.openDefault(config.LOG_FILE, config=config.LOGGING)
 	if not os.environ.has_key("TOMATO_NO_MIGRATE"):
 		db.migrate()
 	else:
@@ -96,7 +96,7 @@ def reload_(*args):
 	print >>sys.stderr, "Reloading..."
 	logging.closeDefault()
 	reload(config)
-	logging.openDefault(config.LOG_FILE)
+	logging.openDefault(config.LOG_FILE, config=config.LOGGING)
 
 def _printStackTraces():
 	import traceback
@@ -215,6 +215,7 @@ class UsageStatistics(BaseDocument):
     
 class UsageRecord(BaseDocument):
     statistics = ReferenceField(UsageStatistics)
+    statisticsId = ReferenceFieldId(statistics)
     type = StringField(choices=[(t, t) for t in TYPES], max_length=10) #@ReservedAssignment
     begin = FloatField() #unix timestamp
     end = FloatField() #unix timestamp
@@ -225,7 +226,10 @@ class UsageRecord(BaseDocument):
     traffic = FloatField() #unit: bytes
     cputime = FloatField() #unit: cpu seconds
     
-    meta = {"allow_inheritance": True}
+    meta = {
+        "allow_inheritance": True,
+        "indexes": [("type", "begin")]
+    }
 
 
     def init(self, statistics, type, begin, end, measurements, usage): #@ReservedAssignment
@@ -249,6 +253,33 @@ class UsageRecord(BaseDocument):
             "usage": {"cputime": self.cputime, "diskspace": self.diskspace, "memory": self.memory, "traffic": self.traffic},
         }
         
+PAGE_SIZE_MAX = 10000
+
+def recordPage(statistics, type_="single", after=None, cursor=None, limit=1000):
+    """
+    get a page of usage records, ordered by begin and id.
+    :param list statistics: ids of the usage statistics to get records of
+    :param float after: only records that begin at or after this time. Ignored if cursor is given.
+    :param str cursor: only records after the last record of the previous page, as returned by the previous call
+    :param int limit: maximum number of records
+    :return: list of records, cursor of the last record (the given cursor if there are no records), whether more records exist
+    :rtype: tuple
+    """
+    limit = max(1, min(limit, PAGE_SIZE_MAX))
+    query = UsageRecord.objects(type=type_, statistics__in=statistics)
+    if cursor:
+        begin, id_ = cursor.split(":", 1)
+        begin = float(begin)
+        query = query.filter(Q(begin__gt=begin) | Q(begin=begin, id__gt=id_))
+    elif after:
+        query = query.filter(begin__gte=after)
+    records = list(query.order_by("begin", "id").limit(limit + 1))
+    more = len(records) > limit
+    records = records[:limit]
+    if records:
+        cursor = "%r:%s" % (records[-1].begin, records[-1].id)
+    return records, cursor, more
+
 @util.wrap_task
 def update():
     for us in UsageStatistics.objects.all():
@@ -15,10 +15,10 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>
 
-from host import host_info, host_capabilities, host_networks, host_ping, host_server_logs
+from host import host_info, host_capabilities, host_networks, host_status, host_ping, host_server_logs
 
 from elements import element_remove, element_modify, element_create, element_action, element_info,\
-	element_list
+	element_list, element_renew_timeouts
 
 from connections import connection_action, connection_remove, connection_modify,\
 	connection_info, connection_create, connection_list
@@ -29,6 +29,7 @@ from docs import DOC_CONNECTION_BRIDGE, DOC_CONNECTION_FIXED_BRIDGE, DOC_ELEMENT
 	DOC_ELEMENT_KVMQM, DOC_ELEMENT_KVMQM_INTERFACE, DOC_ELEMENT_OPENVZ, DOC_ELEMENT_OPENVZ_INTERFACE,\
 	DOC_ELEMENT_REPY, DOC_ELEMENT_REPY_INTERFACE, DOC_ELEMENT_TINC, DOC_ELEMENT_UDP_TUNNEL, docs
 
-from accounting import accounting_connection_statistics, accounting_element_statistics, accounting_statistics
+from accounting import accounting_connection_statistics, accounting_element_statistics, accounting_statistics,\
+	accounting_records
 
-from dump import dump_count, dump_list
+from dump import dump_count, dump_list, dump_info
@@ -58,6 +58,75 @@ def accounting_statistics(type=None, after=None, before=None): #@ReservedAssignm
     conSt = dict([(str(con.id), con.getUsageStatistics().info(type, after, before)) for con in connections.getAll(owner=currentUser())])
     return {"elements": elSt, "connections": conSt}
 
+def accounting_records(type="single", after=None, cursor=None, limit=1000, objects=False): #@ReservedAssignment
+    """
+    Returns the usage records of all elements and all connections page by 
+    page, ordered by their start date. Other than 
+    :py:func:`accounting_statistics`, this only reads the records of one
+    page.
+    
+    Parameter *type*:
+      Only usage records of the given type are returned.
+      
+    Parameter *after*:
+      If this parameter is set, only usage records with a start date at or 
+      after the given date will be returned. The date must be given as the 
+      number of seconds since the epoch (1970-01-01 00:00:00).
+      This parameter is ignored if *cursor* is set.
+      
+    Parameter *cursor*:
+      To get the next page, this parameter must be set to the field 
+      ``cursor`` of the previous result. If this parameter is omitted, the
+      first page is returned.
+      
+    Parameter *limit*:
+      The maximum number of records in this page (at most 10000).
+      
+    Parameter *objects*:
+      If this parameter is set, the ids of all elements and connections that
+      record their usage are returned as well.
+      
+    Return value:
+      This method returns a dict with the following keys.
+      
+      ``elements``:
+        A dict with the usage records of this page by element id, elements 
+        without records on this page are left out.
+      
+      ``connections``:
+        A dict with the usage records of this page by connection id, 
+        connections without records on this page are left out.
+      
+      ``cursor``:
+        The position after the last record of this page. It must be passed
+        to the next call and can also be used to continue later.
+        
+      ``more``:
+        Whether more records exist after this page.
+      
+      ``objects``:
+        Only if *objects* is set: a dict with the lists ``elements`` and 
+        ``connections`` of the ids of all elements and connections that 
+        record their usage, regardless of whether they have records on this
+        page.
+    """
+    statistics = {}
+    for type_, query in (("elements", elements.Element.objects(owner=currentUser())),
+                         ("connections", connections.Connection.objects(owner=currentUser()))):
+        for obj in query.only("id", "usageStatistics"):
+            if obj.usageStatisticsId:
+                statistics[obj.usageStatisticsId] = (type_, str(obj.id))
+    records, nextCursor, more = accounting.recordPage(statistics.keys(), type, after, cursor, limit)
+    res = {"elements": {}, "connections": {}, "cursor": nextCursor, "more": more}
+    for record in records:
+        type_, id_ = statistics[record.statisticsId]
+        res[type_].setdefault(id_, []).append(record.info())
+    if objects:
+        res["objects"] = {"elements": [], "connections": []}
+        for type_, id_ in statistics.itervalues():
+            res["objects"][type_].append(id_)
+    return res
+
 def accounting_element_statistics(id, type=None, after=None, before=None): #@ReservedAssignment
     """
     Returns accounting statistics for one element.
@@ -120,4 +189,4 @@ def accounting_connection_statistics(id, type=None, after=None, before=None): #@
 
 from elements import _getElement
 from connections import _getConnection
-from .. import currentUser, elements, connections
\ No newline at end of file
+from .. import currentUser, elements, connections, accounting
\ No newline at end of file
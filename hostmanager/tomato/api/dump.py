@@ -23,20 +23,27 @@ def dump_count():
 	"""
 	return dump.getCount()
 
-def dump_list(after=None):
+def dump_list(after=None, after_id=None, limit=None, include_data=True):
 	"""
-	returns a list of dumps.
+	returns a list of dumps, ordered by timestamp and id.
 	
 	Parameter *after*: 
 		If set, only include dumps which have a timestamp after this time.
 
-		Parameter *list_only*:
-			If True, only include dump IDs.
+	Parameter *after_id*:
+		If set together with *after*, only include dumps after the dump with this id and the timestamp *after*.
+		Together with *limit*, this allows to fetch all dumps page by page.
 
-		Parameter *include_data*:
-			If True, include detailed data. This may be about 1M per dump.
+	Parameter *limit*:
+		If set, return at most this many dumps.
 
-		Parameter *compress_data*:
-			If True and include_data, compress the detailed data before returning. It may still be around 20M per dump after compressing.
+	Parameter *include_data*:
+		If False, the detailed data (about 1M per dump) is not included. Use dump_info to get it.
 	"""
-	return dump.getAll(after=after)
+	return dump.getAll(after=after, after_id=after_id, limit=limit, include_data=include_data)
+
+def dump_info(dump_id):
+	"""
+	returns a dump including its detailed data, or None if it does not exist (anymore).
+	"""
+	return dump.getDump(dump_id)
@@ -228,6 +228,29 @@ def element_info(id):  # @ReservedAssignment
 	return el.info()
 
 
+def element_renew_timeouts(ids, until):
+	"""
+	Sets the timeout of several elements at once. This is equivalent to
+	modifying the attribute ``timeout`` of each element but does not 
+	require the elements to be idle.
+
+	Parameter *ids*:
+	  A list of element ids.
+
+	Parameter *until*:
+	  The new timeout in seconds since the epoch. Timeouts that are further
+	  in the future than allowed are set to the maximum timeout.
+
+	Return value:
+	  A list with the ids of the elements that do not exist or belong to 
+	  another owner. The timeouts of all other elements have been set.
+
+	Exceptions:
+	  If *until* is in the past, an exception *invalid value* is raised.
+	"""
+	return elements.renewTimeouts(ids, until)
+
+
 def element_list(type_filter=None):
 	"""
 	Retrieves information about all elements of the user.
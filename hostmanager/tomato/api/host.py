@@ -260,6 +260,58 @@ def host_capabilities():
 		"resources": dict([(type_, {}) for type_ in resources.TYPES]),
 	})
 
+def _version(data):
+	return hashlib.md5(json.dumps(data, sort_keys=True)).hexdigest()
+
+def host_status(since=None):
+	"""
+	Retrieves the information of :py:func:`host_info`, :py:func:`host_networks`
+	and :py:func:`host_capabilities` in one call. Sections that have not 
+	changed since the previous call are left out.
+	
+	Parameter *since*:
+	  The ``versions`` field returned by the previous call or ``None`` to
+	  retrieve all sections.
+	
+	Return value:
+	  A dict with the following fields:
+	
+	``info``
+	  The same information as returned by :py:func:`host_info`. This field is
+	  always included.
+	``networks``
+	  The same information as returned by :py:func:`host_networks`. Only 
+	  included if the version differs from ``since``.
+	``capabilities``
+	  The same information as returned by :py:func:`host_capabilities`. Only 
+	  included if the version differs from ``since``.
+	``versions``
+	  A dict containing the versions (checksums) of the fields ``networks``
+	  and ``capabilities`` and a dict ``resources`` with one checksum per
+	  resource type. The checksum of a resource type changes whenever the 
+	  result of :py:func:`resource_list` for this type changes.
+	``status_time``
+	  The time in seconds spent on the other fields after ``info`` has been
+	  collected.
+	"""
+	if not since: since = {}
+	info = host_info()
+	start = time.time()
+	networks = host_networks()
+	capabilities = host_capabilities()
+	versions = {
+		"networks": _version(networks),
+		"capabilities": _version(capabilities),
+		"resources": dict([(type_, _version(sorted([r.info() for r in resources.getAll(type=type_)], key=lambda r: r["id"])))
+						   for type_ in resources.TYPES])
+	}
+	res = {"info": info, "versions": versions, "status_time": time.time() - start}
+	if since.get("networks") != versions["networks"]:
+		res["networks"] = networks
+	if since.get("capabilities") != versions["capabilities"]:
+		res["capabilities"] = capabilities
+	return res
+
 def host_ping(dst):
 	return net.ping(dst)
 
@@ -284,4 +336,5 @@ def host_server_logs():
 
 from .. import dump, elements, connections, resources, config, currentUser
 from ..lib.cmd import hostinfo, net, dhcp #@UnresolvedImport
-import time
+from ..lib import anyjson as json #@UnresolvedImport
+import time, hashlib
@@ -51,6 +51,27 @@ already include configuration entries for logrotate that have to be adapted
 if this setting is changed.  
 """
 
+LOGGING = {
+	"categories": {},
+	"api-calls": {
+		"mode": "calls",
+		"sample-rate": 1.0,
+		"sample-rates": {},
+		"max-arg-length": 1000,
+		"aggregate-interval": 60
+	}
+}
+"""
+Settings of the logger.
+Entries of categories set to False in *categories* are not logged.
+API calls are either logged as one entry per call (mode *calls*), as a summary
+per method every *aggregate-interval* seconds (mode *aggregate*) or not at all
+(mode *off*). In mode *calls*, only the given fraction of the calls is logged
+(*sample-rate*, or *sample-rates* per method, e.g. {"host_info": 0.01}) and
+strings in arguments are truncated to *max-arg-length*.
+See the logging section of the backend configuration for further settings.
+"""
+
 DUMP_DIR = "/var/log/tomato/dumps_hostmanager"
 """
 The location of the dump files that are created when unexpected errors occur.
@@ -25,8 +25,14 @@ def getCount():
 def dumpException(**kwargs):
     return dump_lib.dumpException(**kwargs)
 
-def getAll(after=None):
-    return dump_lib.getAll(after=after,list_only=False,include_data=True)
+def getAll(after=None, after_id=None, limit=None, include_data=True):
+    return dump_lib.getAll(after=after,list_only=False,include_data=include_data,after_id=after_id,limit=limit)
+
+def getDump(dump_id):
+    try:
+        return dump_lib.load_dump(dump_id, load_data=True)
+    except dump_lib.InternalError:
+        return None  # removed in the meantime
 
 
 def init():
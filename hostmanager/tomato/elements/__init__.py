@@ -540,6 +540,24 @@ def create(type_, parent=None, attrs=None):
 	return el
 
 
+def renewTimeouts(ids, until):
+	"""
+	set the timeout of several elements of the current user at once.
+	Timeouts later than the maximum timeout are set to the maximum.
+	:param list ids: ids of the elements
+	:param float until: new timeout
+	:return: the ids of the elements that do not exist
+	:rtype: list
+	"""
+	UserError.check(until > time.time(), UserError.INVALID_VALUE, "Refusing to set timeout into the past")
+	until = min(until, time.time() + config.MAX_TIMEOUT)
+	ids = [str(id_) for id_ in ids]
+	found = set(str(el.id) for el in Element.objects(id__in=ids, owner=currentUser()).only("id"))
+	if found:
+		Element.objects(id__in=list(found)).update(set__timeout=until)
+	return [id_ for id_ in ids if not id_ in found]
+
+
 @util.wrap_task
 def checkTimeout():
 	for el in Element.objects.filter(timeout__lte=time.time()):
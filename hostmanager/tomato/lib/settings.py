@@ -5,6 +5,8 @@ class Config:
 	DUMPS_DIRECTORY = "directory"
 	DUMPS_LIFETIME = "lifetime"
 	DUMPS_AUTO_PUSH = "auto-push"
+	DUMPS_COMPRESSION_LEVEL = "compression-level"
+	DUMPS_SEGMENT_SIZE = "segment-size"
 
 class settings:
 
@@ -26,7 +26,7 @@ from .lib.error import Error, InternalError
 
 
 def logCall(function, args, kwargs):
-	logging.log(category="api", method=function.__name__, args=args, kwargs=kwargs, user=currentUser().name)
+	logging.logCall(function, args, kwargs, user=currentUser().name)
 
 class Wrapper:
 	def __init__(self):
@@ -37,6 +37,7 @@ class Wrapper:
 		self.semaphore.release()
 
 def handleError(error, function, args, kwargs):
+	logging.logCallError(function)
 	if not isinstance(error, Error):
 		error = InternalError.wrap(error)
 	if isinstance(error, InternalError):
@@ -44,8 +45,8 @@ def handleError(error, function, args, kwargs):
 	return error
 
 
-def afterCall(*args, **kwargs):
-	pass
+def afterCall(function, args, kwargs, result):
+	logging.logCallEnd(function, args, kwargs, result)
 
 
 def runServer(server):
@@ -1,6 +1,6 @@
 import threading
 from .lib.error import UserError as Error
-from .lib import schema
+from .lib import schema, changefeed, locks
 
 class Action(object):
 	__slots__ = ("fn", "description", "checkFn", "paramSchema", "beforeFn", "afterFn")
@@ -89,6 +89,57 @@ class IdAttribute(Attribute):
 	def __init__(self):
 		Attribute.__init__(self, readOnly=True, get=lambda obj: str(obj.id), schema=schema.String())
 
+_units = threading.local()
+_capabilitiesCache = {}  # class -> (key of ACTIONS and ATTRIBUTES, capabilities)
+
+def _copy(value):
+	if isinstance(value, dict):
+		return dict(value)
+	if isinstance(value, list):
+		return list(value)
+	return value
+
+
+class UnitOfWork(object):
+	"""
+	Coalesces the writes of nested modify() and action() calls of an entity.
+
+	Only the outermost unit of an entity (per thread) writes the entity, once, when it ends. Nested units
+	only record that a write is needed.
+	"""
+	__slots__ = ("entity", "outermost", "state")
+
+	def __init__(self, entity):
+		self.entity = entity
+
+	def __enter__(self):
+		units = _units.__dict__.setdefault("open", {})
+		key = id(self.entity)
+		self.outermost = not key in units
+		if self.outermost:
+			units[key] = {"write": False, "removed": False, "membership": False}
+		self.state = units[key]
+		return self
+
+	def changed(self, membership=False):
+		self.state["write"] = True
+		if membership:
+			self.state["membership"] = True
+
+	def removed(self):
+		self.state["removed"] = True
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		if not self.outermost:
+			return
+		del _units.open[id(self.entity)]
+		if self.state["removed"]:
+			return
+		if self.state["write"]:
+			self.entity.update_or_save()
+		if self.state["membership"]:
+			self.entity.publishChange(membership=True)
+
 class Entity(object):
 	__slots__ = ()
 
@@ -97,13 +148,33 @@ class Entity(object):
 	DEFAULT_ATTRIBUTES = {}
 	REMOVE_ACTION = "(remove)"
 
-	save = id = delete = update = None
-	del save, id, delete, update
+	CHANGE_CLASS = None # class name to publish changes under (see lib.changefeed). None disables publishing.
+	CHANGE_MEMBERSHIP_ATTRIBUTES = frozenset() # attributes that list results are filtered by
+
+	id = update = None
+	del id, update
 
 	@property
 	def type(self):
 		return self.__class__.__name__.lower()
 
+	def changeId(self):
+		return str(self.id)
+
+	def publishChange(self, membership=False):
+		if self.CHANGE_CLASS and self.id:
+			changefeed.publish(self.CHANGE_CLASS, self.changeId(), membership)
+
+	def save(self, *args, **kwargs):
+		created = not self.id
+		res = super(Entity, self).save(*args, **kwargs)
+		self.publishChange(membership=created)
+		return res
+
+	def delete(self, *args, **kwargs):
+		self.publishChange(membership=True)
+		return super(Entity, self).delete(*args, **kwargs)
+
 	def init(self, **attrs):
 		toSet = {}
 		toSet.update(self.DEFAULT_ATTRIBUTES)
@@ -111,15 +182,19 @@ class Entity(object):
 			toSet.update(attrs)
 		self.modify(**toSet)
 
+	def unitOfWork(self):
+		return UnitOfWork(self)
+
 	def update_or_save(self, **kwargs):
-		if not self.id:
-			self.save()
-		if not self.__class__.objects.with_id(str(self.id)):
-			self.save()
-		if kwargs:
-			print kwargs
-			self.update(**kwargs)
-		else:
+		"""
+		write the changes of this entity.
+		Documents that have been loaded or saved before are not looked up again and only written if fields have
+		changed. In this case, mongoengine only sends the changed fields ($set/$unset).
+		:param kwargs: fields to set before writing
+		"""
+		for key, value in kwargs.iteritems():
+			setattr(self, key, value)
+		if not self.id or getattr(self, "_created", True) or self._get_changed_fields():
 			self.save()
 
 	def checkUnknownAttribute(self, key, value):
@@ -132,6 +207,11 @@ class Entity(object):
 		pass
 
 	def modify(self, **attrs):
+		with self.unitOfWork() as unit:
+			self._modify(attrs)
+			unit.changed(membership=not self.CHANGE_MEMBERSHIP_ATTRIBUTES.isdisjoint(attrs))
+
+	def _modify(self, attrs):
 		ATTRIBUTES = self.ATTRIBUTES
 		for key, value in attrs.items():
 			attr = ATTRIBUTES.get(key)
@@ -158,7 +238,6 @@ class Entity(object):
 				raise
 		if unknownAttrs:
 			self.setUnknownAttributes(unknownAttrs)
-		self.update_or_save()
 
 
 	def checkUnknownAction(self, action, params=None):
@@ -178,21 +257,24 @@ class Entity(object):
 
 	def action(self, action, params=None):
 		if not params: params = {}
-		try:
-			actn = self.ACTIONS.get(action)
-			if actn:
-				actn.check(self, **params)
-				return actn(self, **params)
-			else:
-				self.checkUnknownAction(action, params)
-				return self.executeUnknownAction(action, params)
-		except Error as err:
-			err.data.update(type=self.type, action=action)
-			self.onError(err)
-			raise
-		finally:
-			if action != self.REMOVE_ACTION:
-				self.update_or_save()
+		with self.unitOfWork() as unit:
+			try:
+				actn = self.ACTIONS.get(action)
+				if actn:
+					actn.check(self, **params)
+					return actn(self, **params)
+				else:
+					self.checkUnknownAction(action, params)
+					return self.executeUnknownAction(action, params)
+			except Error as err:
+				err.data.update(type=self.type, action=action)
+				self.onError(err)
+				raise
+			finally:
+				if action != self.REMOVE_ACTION:
+					unit.changed()
+				else:
+					unit.removed()
 
 	def remove(self, params=None):
 		self.action(self.REMOVE_ACTION, params)
@@ -201,12 +283,27 @@ class Entity(object):
 		return {key: attr.get(self) for key, attr in self.ATTRIBUTES.items()}
 
 	@classmethod
-	def capabilities(cls):
+	def _capabilities(cls):
 		return {
 			"actions": {key: action.info() for key, action in cls.ACTIONS.items()},
 			"attributes": {key: attr.info() for key, attr in cls.ATTRIBUTES.items() if not attr.readOnly},
 		}
 
+	@classmethod
+	def capabilities(cls):
+		"""
+		get the description of the actions and attributes of this class.
+		The description is built once per class and rebuilt when ACTIONS or ATTRIBUTES are replaced or entries
+		are added or removed.
+		:return: a copy of the description, the outer dict and the dicts/lists in it can be modified by the caller
+		:rtype: dict
+		"""
+		key = (id(cls.ACTIONS), len(cls.ACTIONS), id(cls.ATTRIBUTES), len(cls.ATTRIBUTES))
+		cached = _capabilitiesCache.get(cls)
+		if not cached or cached[0] != key:
+			cached = _capabilitiesCache[cls] = (key, cls._capabilities())
+		return {name: _copy(value) for name, value in cached[1].iteritems()}
+
 	@classmethod
 	def create(cls, **kwargs):
 		obj = cls()
@@ -253,8 +350,7 @@ class StatefulAttribute(Attribute):
 class LockedEntity(Entity):
 	__slots__ = ()
 
-	LOCKS = {}
-	LOCKS_LOCK = threading.RLock()
+	LOCKS = locks.LockRegistry("entity")
 
 	LOCKED_MODIFY = True
 	LOCKED_ACTIONS = True
@@ -263,13 +359,7 @@ class LockedEntity(Entity):
 
 	@property
 	def lock(self):
-		key = (self.type, self.id)
-		with self.LOCKS_LOCK:
-			lock = self.LOCKS.get(key)
-			if not lock:
-				lock = threading.RLock()
-				self.LOCKS[key] = lock
-			return lock
+		return self.LOCKS.get((self.type, self.id))
 
 	@property
 	def busy(self):
@@ -336,7 +426,7 @@ class StatefulEntity(Entity):
 		super(StatefulEntity, self).init(**attrs)
 
 	@classmethod
-	def capabilities(cls):
+	def _capabilities(cls):
 		return {
 			"actions": {key: action.info() for key, action in cls.ACTIONS.iteritems()},
 			"attributes": {key: attr.info() for key, attr in cls.ATTRIBUTES.iteritems() if not attr.readOnly},
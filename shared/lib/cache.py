@@ -16,6 +16,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>
 
 import time, sys, threading
+from collections import OrderedDict
 
 class CacheUpdater:
 	caches = []
@@ -31,14 +32,37 @@ class CacheUpdater:
 			cache.update_all()
 cache_updater = None
 
+class _Flight:
+	"""
+	A running backend call for one key.
+	Concurrent misses on the same key wait for the leading call instead of issuing their own.
+	An invalidation that affects the key detaches the flight from the cache, its result is then not saved.
+	"""
+	__slots__ = ("event", "value", "error", "args", "kwargs", "detached", "invalidatedTags")
+	def __init__(self, args, kwargs):
+		self.event = threading.Event()
+		self.value = None
+		self.error = None
+		self.args = args
+		self.kwargs = kwargs
+		self.detached = False
+		self.invalidatedTags = set() #tags invalidated while running. The tags of the result are not known before.
+	def wait(self):
+		self.event.wait()
+		if self.error is not None:
+			raise self.error[0], self.error[1], self.error[2]
+		return self.value
+
 class Cache:
-	def __init__(self, fn=None, maxSize=100, timeout=None, autoupdate=False):
-		self._values={} #{key:{value, timeout, auto_timeout, args, kwargs}}
-		self._order=[]  #[key]
+	def __init__(self, fn=None, maxSize=100, timeout=None, autoupdate=False, tags=None):
+		self._values=OrderedDict() #{key:{value, timeout, auto_timeout, args, kwargs, tags}}, ordered from least to most recently used
+		self._flights={}  #{key:_Flight}, backend calls that are currently running
+		self._tagFn = tags #function that returns the tags of a value, used by invalidate_tag
+		self._tags={}  #{tag:set(key)}
 		self._maxSize=maxSize
 		self._timeout=timeout
 		self._fn = fn
-		self._lock = threading.RLock()
+		self._lock = threading.RLock() # only guards the bookkeeping. self._fn is never called while holding it.
 		self._autoupdate = autoupdate
 		self._autoupdate_registered = not self._autoupdate # registration for auto-updates will be checked when a value is set.
 															# this is false iff this cache needs to be added to the auto updater.
@@ -48,77 +72,153 @@ class Cache:
 	def get(self, args, kwargs):
 		key = Cache.getKey(args, kwargs)
 		with self._lock:
-			if (not key in self._values) or (self._values[key]['timeout'] <= time.time()):
-				self.update(args, kwargs)
-			return self._values[Cache.getKey(args, kwargs)]['value']
+			entry = self._values.get(key)
+			if entry is not None and entry['timeout'] > time.time():
+				#mark as most recently used
+				del self._values[key]
+				self._values[key] = entry
+				return entry['value']
+		return self._fetch(key, args, kwargs)
+	def _fetch(self, key, args, kwargs):
+		with self._lock:
+			flight = self._flights.get(key)
+			if flight is not None:
+				leader = False
+			else:
+				flight = _Flight(args, kwargs)
+				self._flights[key] = flight
+				leader = True
+		if not leader:
+			return flight.wait()
+		try:
+			calltime = time.time()
+			flight.value = self._fn(*args, **kwargs)
+			self.set(args, kwargs, flight.value, calltime=calltime, flight=flight)
+		except:
+			flight.error = sys.exc_info()
+			raise
+		finally:
+			with self._lock:
+				if self._flights.get(key) is flight:
+					del self._flights[key]
+			flight.event.set()
+		return flight.value
 	def update(self, args, kwargs):
-		calltime = time.time()
-		value = self._fn(*args, **kwargs) #there may be concurrent method calls here. set() will resolve this.
-		self.set(args, kwargs, value, calltime=calltime)
-	def set(self, args, kwargs, value, calltime=None):
+		self._fetch(Cache.getKey(args, kwargs), args, kwargs)
+	def set(self, args, kwargs, value, calltime=None, flight=None):
 		key = Cache.getKey(args, kwargs)
 		if calltime is None:
 			calltime = time.time()
+		timeout = (calltime + self._timeout) if self._timeout else sys.maxint
+		auto_timeout = timeout - 0.25*self._timeout if self._timeout else sys.maxint #auto-refresh triggers after 3/4 timeout
+		tags = frozenset(self._tagFn(value)) if self._tagFn else frozenset()
 		with self._lock:
-			
-			timeout = (calltime + self._timeout) if self._timeout else sys.maxint
-			auto_timeout = timeout - 0.25*self._timeout if self._timeout else sys.maxint #auto-refresh triggers after 3/4 timeout
-			
-			#check whether another thread has accessed this function concurrently (may happen in update). If yes, do not save this.
-			if key in self._values:
-				if self._values[key]['timeout'] > timeout:
-					return
-			
-			#clear oldest entry if cache is full
-			if len(self._order) >= self._maxSize:
-				delkey = self._order.pop(0)
-				del self._values[delkey]
-				
-			#make sure that this key is not in _order (it may only be once in there)
-			if key in self._values:
-				self._order.remove(key)
-				
+
+			#check whether the key has been invalidated while the value was fetched. If yes, it may be outdated already.
+			if flight is not None and (flight.detached or flight.invalidatedTags & tags):
+				return
+
+			#check whether another thread has set a newer value concurrently. If yes, do not save this.
+			old = self._values.get(key)
+			if old is not None and old['timeout'] > timeout:
+				return
+			self._drop(key)
+
+			#clear least recently used entries if cache is full
+			while len(self._values) >= self._maxSize:
+				self._drop(next(iter(self._values)))
+
 			#save
-			self._order.append(key)
 			self._values[key] = {'value':value,
 								 'timeout':timeout,
 								 'auto_timeout':auto_timeout,
 								 'args':args,
-								 'kwargs':kwargs}
-			
+								 'kwargs':kwargs,
+								 'tags':tags}
+			for tag in tags:
+				self._tags.setdefault(tag, set()).add(key)
+
 			#finally, register this cache for auto-update if needed.
 			if not self._autoupdate_registered:
 				if cache_updater is not None:
 					cache_updater.add(self)
 					self._autoupdate_registered = True
+	def _detach(self, key):
+		#later calls for this key start a new fetch instead of waiting for the running one.
+		flight = self._flights.pop(key, None)
+		if flight is not None:
+			flight.detached = True
+	def _drop(self, key):
+		entry = self._values.pop(key, None)
+		if entry is None:
+			return
+		for tag in entry['tags']:
+			keys = self._tags[tag]
+			keys.discard(key)
+			if not keys:
+				del self._tags[tag]
 	def remove(self, args, kwargs):
+		key = Cache.getKey(args, kwargs)
 		with self._lock:
-			key = Cache.getKey(args, kwargs)
-			del self._values[key]
-			self._order.remove(key)
+			self._detach(key)
+			if not key in self._values:
+				raise KeyError(key)
+			self._drop(key)
 	def contains(self, args, kwargs):
 		with self._lock:
 			return Cache.getKey(args, kwargs) in self._values
+	def peek(self, args, kwargs, default=None):
+		"""
+		return the cached value if there is a valid one, default otherwise.
+		Never calls the cached function and does not change the eviction order.
+		"""
+		with self._lock:
+			entry = self._values.get(Cache.getKey(args, kwargs))
+			if entry is None or entry['timeout'] <= time.time():
+				return default
+			return entry['value']
 	def clear(self):
 		with self._lock:
-			self._values = {}
-			self._order = []
+			for key in list(self._flights):
+				self._detach(key)
+			self._values.clear()
+			self._tags.clear()
+	def invalidate_where(self, predicate):
+		"""
+		remove all entries whose call arguments match.
+		:param predicate: function(args, kwargs) that returns True for entries that should be removed.
+		"""
+		with self._lock:
+			for key in [key for key, flight in self._flights.iteritems() if predicate(flight.args, flight.kwargs)]:
+				self._detach(key)
+			for key in [key for key, entry in self._values.iteritems() if predicate(entry['args'], entry['kwargs'])]:
+				self._drop(key)
+	def invalidate_tag(self, tag):
+		"""
+		remove all entries whose value has been tagged with this tag.
+		"""
+		with self._lock:
+			for key in list(self._tags.get(tag, ())):
+				self._detach(key)
+				self._drop(key)
+			#running fetches for other keys may still return a value with this tag.
+			for flight in self._flights.itervalues():
+				flight.invalidatedTags.add(tag)
+	def set_timeout(self, timeout):
+		"""
+		change the timeout for values that are set from now on.
+		"""
+		with self._lock:
+			self._timeout = timeout
 	def update_all(self):
 		if self._autoupdate:
-			for key in list(self._order): #since maxsize is bounded, this is not a scaling problem.
-				with self._lock: #release the lock between all cycles to allow other threads to step in between two iterations.
-								#    This function can only change the order of entries, but does not delete any.
-								# Concurrent calls may remove the first entries of the list. In this case, this function should ignore these entries.
-								#    However, there is only a really slight chance that this happens, and it doesn't lead to inconsistency.
-								#	 This only means there is no guarantee that the key is still in the list when entering the lock.
-								#        Conclusion: only do something if the key is still cached.
-					if key in self._values:
-						res = self._values[key]
-						if res['auto_timeout'] <= time.time():
-							self.update(res['args'], res['kwargs'])
-		
-		
-	
+			with self._lock:
+				due = [(key, res['args'], res['kwargs']) for key, res in self._values.iteritems() if res['auto_timeout'] <= time.time()]
+			for key, args, kwargs in due: #the lock is not held here, so other threads can use the cache while refreshing.
+				self._fetch(key, args, kwargs)
+
+
+
 class CachedMethod:
 	def __init__(self, cache):
 		self._cache = cache
@@ -126,6 +226,21 @@ class CachedMethod:
 		return self._cache.get(args, kwargs)
 	def invalidate(self):
 		self._cache.clear()
+	def invalidate_call(self, *args, **kwargs):
+		try:
+			self._cache.remove(args, kwargs)
+		except KeyError:
+			pass
+	def invalidate_where(self, predicate):
+		self._cache.invalidate_where(predicate)
+	def invalidate_tag(self, tag):
+		self._cache.invalidate_tag(tag)
+	def peek(self, *args, **kwargs):
+		return self._cache.peek(args, kwargs)
+	def get_timeout(self):
+		return self._cache._timeout
+	def set_timeout(self, timeout):
+		self._cache.set_timeout(timeout)
 
 
 def invalidates(cachedFn):
@@ -143,11 +258,18 @@ def invalidates(cachedFn):
 	return wrap
 
 	
-def cached(timeout=None, maxSize=100, autoupdate=False):
+def cached(timeout=None, maxSize=100, autoupdate=False, tags=None):
+	"""
+	cache the results of the decorated function.
+	:param timeout: lifetime of a cached value in seconds. None means forever.
+	:param maxSize: maximum number of cached values. The least recently used one is removed first.
+	:param autoupdate: refresh values in the background before they time out.
+	:param tags: function that takes a result and returns a list of tags. These can be used in invalidate_tag.
+	"""
 	if maxSize is None:
 		maxSize = 10000
 	def wrap(fn):
-		_cache = Cache(fn=fn, timeout=timeout, maxSize=maxSize, autoupdate=autoupdate)
+		_cache = Cache(fn=fn, timeout=timeout, maxSize=maxSize, autoupdate=autoupdate, tags=tags)
 		call = CachedMethod(_cache)
 		call.__name__ = fn.__name__
 		call.__doc__ = fn.__doc__
@@ -0,0 +1,118 @@
+import threading, random, itertools
+from collections import deque
+
+from .error import NetworkError
+
+class ChangeFeed(object):
+	"""
+	A bounded log of changed objects.
+	Other modules poll it (see since()) and invalidate their caches for the objects that actually changed.
+
+	Every change has a sequence number. The epoch identifies this log, so consumers notice when the
+	publishing module has been restarted and they might have missed changes.
+	"""
+	__slots__ = ("_changes", "_seq", "_epoch", "_lock")
+
+	def __init__(self, size=10000):
+		self._changes = deque(maxlen=size)  # [(seq, class_name, id, membership)]
+		self._seq = 0
+		self._epoch = "%016x" % random.getrandbits(64)
+		self._lock = threading.Lock()
+
+	def publish(self, class_name, id_, membership=False):
+		"""
+		record a change.
+		:param str class_name: class of the changed object, as in hierarchy.ClassName
+		:param str id_: id of the changed object, as used in the *_info API calls.
+		:param bool membership: whether the object may have been added to or removed from list results.
+		                        This is the case for creation, removal and changes to attributes that lists are filtered by.
+		"""
+		with self._lock:
+			self._seq += 1
+			self._changes.append((self._seq, class_name, id_, membership))
+
+	def since(self, epoch=None, seq=0):
+		"""
+		get all changes after the given position.
+		:param str epoch: epoch of the last poll, None on the first poll.
+		:param int seq: sequence number of the last change seen.
+		:return: dict containing 'epoch', 'seq' (last change), 'changes' (list of [class_name, id, membership])
+		         and 'complete'. If complete is False, changes may have been missed and all caches should be cleared.
+		:rtype: dict
+		"""
+		with self._lock:
+			oldest = self._changes[0][0] if self._changes else self._seq + 1
+			complete = epoch == self._epoch and oldest <= seq + 1 and seq <= self._seq
+			if complete:
+				start = seq + 1 - oldest
+				changes = [[class_name, id_, membership] for (_, class_name, id_, membership) in itertools.islice(self._changes, start, None)]
+			else:
+				changes = []
+			return {
+				"epoch": self._epoch,
+				"seq": self._seq,
+				"complete": complete,
+				"changes": changes
+			}
+
+feed = ChangeFeed()
+
+def publish(class_name, id_, membership=False):
+	feed.publish(class_name, id_, membership)
+
+def since(epoch=None, seq=0):
+	return feed.since(epoch, seq)
+
+
+class ChangeListener(object):
+	"""
+	Follows the change feed of another module.
+
+	poll() should be called regularly. As long as every poll succeeds, on_change is called for every change.
+	Whenever changes may have been missed, on_reset is called instead and the listener is not synchronized
+	until the next successful poll.
+	"""
+	__slots__ = ("_fetch", "_on_change", "_on_reset", "_epoch", "_seq", "synchronized")
+
+	def __init__(self, fetch, on_change, on_reset):
+		"""
+		:param fetch: function(epoch, seq) that calls ChangeFeed.since() on the remote module.
+		:param on_change: function(class_name, id_, membership)
+		:param on_reset: function() that clears everything that may be outdated.
+		"""
+		self._fetch = fetch
+		self._on_change = on_change
+		self._on_reset = on_reset
+		self._epoch = None
+		self._seq = 0
+		self.synchronized = False
+
+	def _reset(self):
+		self.synchronized = False
+		self._on_reset()
+
+	def poll(self):
+		try:
+			res = self._fetch(self._epoch, self._seq)
+		except NetworkError:
+			# the other module is unreachable. Do not dump this, it will be noticed elsewhere.
+			self._reset()
+			return
+		except:
+			self._reset()
+			raise
+		if res['complete']:
+			for class_name, id_, membership in res['changes']:
+				self._on_change(class_name, id_, membership)
+		else:
+			self._reset()
+		self._epoch = res['epoch']
+		self._seq = res['seq']
+		self.synchronized = True
+
+	def info(self):
+		return {
+			"epoch": self._epoch,
+			"seq": self._seq,
+			"synchronized": self.synchronized
+		}
@@ -2,6 +2,7 @@ import sys, os, time, traceback, hashlib, zlib, threading, re, base64, gzip, ins
 
 from . import anyjson as json
 from .error import InternalError, generate_inspect_trace
+from .dump_store import DumpStore
 
 from .settings import settings, Config
 
@@ -15,15 +16,14 @@ envCmds = {}
 tomato_component = None
 tomato_version = None
 
-#this will contain all dumps, except for environment data, since environment data may be huge (about 20K if compressed, around 1M if not compressed)
-#environment data is saved to disk loaded on demand if needed.
-#the keys are the dumps IDs, for faster access.
-dumps = {}
-#when adding or removing keys to this array, it has to be locked.
+#all dumps are stored in a DumpStore in the dump directory. It is opened on first use (see get_store()).
+#environment data is only loaded from disk when needed, since it may be huge (about 20K if compressed, around 1M if not compressed)
+store = None
+#lock this to do several operations on the dumps without other threads of this process interfering.
 dumps_lock = threading.RLock()
 
 #set to true when initialized.
-#In uninitialized mode, the dumps dict is not used.
+#In uninitialized mode (e.g., in web), no environment data is collected and the number of dumps is not limited.
 initialized = False
 
 
@@ -43,7 +43,7 @@ boot_time = 0
 #   description:dict     # short description about what happened (i.e., for an exception: position in code, exception subject)
 #   type:string          # Reason why the dump was created (i.e., "Exception").
 #   group_id:string      # an id given to what happened. Group ID should be the same iff it happened due to the same reason (same stack trace, same position in code, same exception, etc).
-#   data:any             # anything, depending on what happened. not in RAM due to size, only in the file.
+#   data:any             # anything, depending on what happened. not in RAM due to size, only in the segment files.
 #   dump_id:string       # ID of the dump. used to address the dump
 #   software_version:dict     # Information about software component (i.e., hostmanager or backend) and the version
 # }
@@ -61,17 +61,25 @@ def getEnv():
 			data[name] = str(err)
 	return data
 
+#get the store of this module's dumps, open it if necessary.
+def get_store():
+	global store
+	with dumps_lock:
+		if store is None:
+			dump_config = settings.get_dump_config()
+			store = DumpStore(dump_config[Config.DUMPS_DIRECTORY],
+							  compressionLevel=dump_config.get(Config.DUMPS_COMPRESSION_LEVEL, 6),
+							  segmentSize=dump_config.get(Config.DUMPS_SEGMENT_SIZE, 4 << 20))
+		return store
+
+#ids of all dumps, oldest first
 def list_all_dumps_ids():
-	if initialized:
-		with dumps_lock:
-			return dumps.keys()
-	else:
-		dump_dir = settings.get_dump_config()[Config.DUMPS_DIRECTORY]
-		if os.path.exists(dump_dir):
-			return [re.sub('\.meta\.json', '', d) for d in os.listdir(dump_dir) if d.endswith(".meta.json")]
-		else:
-			os.makedirs(dump_dir)
-			return []
+	return get_store().ids()
+
+#ids of the oldest dumps
+#param count: maximum number of ids to return
+def list_oldest_dump_ids(count):
+	return get_store().ids(limit=count)
 
 def getCaller():
 	caller = None
@@ -84,40 +92,19 @@ def getCaller():
 	return caller
 
 
-#resolve a dump_id to a filename for a file inside the dumps directory
-#get the absolute path of a dump for the given filename
-#is_meta: if true, this is the filename for the meta file, if false, this is the filename for the data file
-def get_absolute_path(dump_id, is_meta, dump_file_version=1):
-
-	filename = None
-	if is_meta:
-		filename = dump_id + ".meta.json"
-	else:
-		if dump_file_version == 0:
-			filename = dump_id + ".data.json"
-		elif dump_file_version == 1:
-			filename = dump_id + ".data.gz"
-
-	dump_dir = settings.get_dump_config()[Config.DUMPS_DIRECTORY]
-	if not os.path.exists(dump_dir):
-		os.makedirs(dump_dir)
-	return os.path.join(dump_dir, filename)
-
-
 #get a free dump ID
 def get_free_dumpid(timestamp):
 	with dumps_lock:
-		global dumps
 		dump_id = str(timestamp)
-		if not dump_id in dumps:
+		if not get_store().exists(dump_id):
 			return dump_id
 		i = 0
-		while dump_id + "_" + str(i) in dumps:
+		while get_store().exists(dump_id + "_" + str(i)):
 			i += 1
 		return dump_id + "_" + str(i)
 
 
-#save dump to a file and store it in the dumps dict. return the dump's ID
+#save dump to the store. return the dump's ID
 #arguments are mostly according to the dump structure.
 #param caller: ???
 #data should not contain environment data. this will be inserted automatically.
@@ -125,7 +112,6 @@ def get_free_dumpid(timestamp):
 def save_dump(timestamp=None, caller=None, description=None, type=None, group_id=None, data=None):
 	if not data: data = {}
 	if not description: description = {}
-	global dumps
 
 	#collect missing info
 	if not timestamp:
@@ -134,7 +120,7 @@ def save_dump(timestamp=None, caller=None, description=None, type=None, group_id
 		data["caller"] = getCaller()
 	data["environment"] = getEnv()
 
-	#we need to lock between choosing an ID and saving it to the array.
+	#we need to lock between choosing an ID and saving it.
 	with dumps_lock:
 		dump_id = get_free_dumpid(timestamp)
 
@@ -145,28 +131,17 @@ def save_dump(timestamp=None, caller=None, description=None, type=None, group_id
 			"type": type,
 			"group_id": type + "__" + group_id,
 			'dump_id': dump_id,
-			"software_version": {"component": tomato_component, "version": tomato_version},
-			"dump_file_version": 1
+			"software_version": {"component": tomato_component, "version": tomato_version}
 		}
 
-		#save it (in the dumps array, and on disk)
 		try:
-			meta_str = json.dumps(dump_meta)
-			data_str = json.dumps(data)
+			get_store().add(dump_meta, data)
 		except Exception:
 			import traceback
 			traceback.print_exc()
 			raise
-		with open(get_absolute_path(dump_id, True), "w") as f:
-			f.write(meta_str)
-		fp = gzip.GzipFile(get_absolute_path(dump_id, False), "w", 9)
-		try:
-			fp.write(data_str)
-		finally:
-			fp.close()
 
 		if initialized:
-			dumps[dump_id] = dump_meta
 			remove_too_many_dumps()
 
 	try:
@@ -177,100 +152,48 @@ def save_dump(timestamp=None, caller=None, description=None, type=None, group_id
 	return dump_id
 
 
-#load a dump from file.
+#load a dump.
 #similar arguments as list()
-#param push_to_dumps: if true, the dump will stored in the dumps dict. this is only useful for the init function.
-#param load_from_file: if true, the dump will be loaded from the meta file. if false, the dump will be taken from the dumps dict.
 #dump_on_error: set to true if you wish a dump to be created on error, i.e., this was an internal call.
-def load_dump(dump_id, load_data=True, compress_data=False, push_to_dumps=False, load_from_file=False, dump_on_error=False):
-	global dumps
-	with dumps_lock:
-		dump = None
-		if load_from_file or not initialized:
-			filename = get_absolute_path(dump_id, True)
-			try:
-				with open(filename, "r") as f:
-					dump = json.load(f)
-			except:
-				raise InternalError(code=InternalError.INVALID_PARAMETER, message="error reading dump file", data={'filename':filename,'dump_id':dump_id}, todump=dump_on_error)
-		else:
-			if dump_id in dumps:
-				dump = dumps[dump_id].copy()
-			else:
-				raise InternalError(code=InternalError.INVALID_PARAMETER, message="dump not found", data={'dump_id':dump_id}, todump=dump_on_error)
-
-		if push_to_dumps and initialized:
-			dumps[dump_id] = dump.copy()
-
-		dump_file_version = 0
-		if "dump_file_version" in dump:
-			dump_file_version = dump["dump_file_version"]
-		del dump["dump_file_version"]
-
-		if load_data:
-			if dump_file_version == 0:
-				with open(get_absolute_path(dump_id, False, 0), "r") as f:
-					dump_data = json.load(f)
-					data = dump_data['data']
-					is_compressed = dump_data['compressed']
-				if compress_data:
-					if is_compressed:
-						dump['data'] = data
-					else:
-						dump['data'] = base64.b64encode(zlib.compress(json.dumps(data), 9))
-				else:
-					if is_compressed:
-						dump['data'] = json.loads(zlib.decompress(base64.b64decode(data)))
-					else:
-						dump['data'] = data
-			elif dump_file_version == 1:
-				filename = get_absolute_path(dump_id, False, 1)
-				try:
-					fp = gzip.GzipFile(filename, "r")
-					try:
-						dump['data'] = json.loads(fp.read())
-					finally:
-						fp.close()
-					if compress_data:
-						dump['data'] = base64.b64encode(zlib.compress(json.dumps(dump['data']), 9))
-				except:
-					raise InternalError(code=InternalError.INVALID_PARAMETER, message="error reading dump file", data={'filename':filename,'dump_id':dump_id}, todump=True)
-		return dump
+def load_dump(dump_id, load_data=True, compress_data=False, dump_on_error=False):
+	dump = get_store().meta(dump_id)
+	if dump is None:
+		raise InternalError(code=InternalError.INVALID_PARAMETER, message="dump not found", data={'dump_id':dump_id}, todump=dump_on_error)
+	if load_data:
+		try:
+			#the store keeps the data as zlib-compressed JSON, so it does not need to be compressed again
+			data = get_store().data(dump_id, compressed=compress_data)
+		except:
+			raise InternalError(code=InternalError.INVALID_PARAMETER, message="error reading dump data", data={'dump_id':dump_id}, todump=True)
+		if data is None:
+			raise InternalError(code=InternalError.INVALID_PARAMETER, message="dump not found", data={'dump_id':dump_id}, todump=dump_on_error)
+		dump['data'] = base64.b64encode(data) if compress_data else data
+	return dump
 
 
 #remove a dump
 def remove_dump(dump_id):
-	with dumps_lock:
-		global dumps
-		if dump_id in dumps:
-			del dumps[dump_id]
-		for p in (get_absolute_path(dump_id, True), get_absolute_path(dump_id, False)):
-			if os.path.exists(p):
-				os.remove(p)
+	get_store().remove([dump_id])
+
+
+#remove several dumps
+def remove_dumps(dump_ids):
+	get_store().remove(dump_ids)
 
 
 #remove all dumps matching a criterion. If criterion is set to None, ignore this criterion.
 #before: remove only if the exception is older than this argument. time.Time object
 #group_id: remove only if it is an instance of the given group_id
 def remove_all_where(before=None, group_id=None):
-	global dumps
 	#if no criterion is selected, do nothing.
 	if before is None and group_id is None:
 		return
 
 	with dumps_lock:
-		for d in list_all_dumps_ids():
-			dump = dumps[d]
-
-			#for every criterion: if it is not none and does not apply, do not remove the dump file
-			matches_criteria = True
-			if before is not None and before < dump['timestamp']:
-				matches_criteria = False
-			if group_id is not None and group_id != dump['group_id']:
-				matches_criteria = False
-
-			if matches_criteria:
-				remove_dump(d)
+		dump_ids = get_store().ids(before=before)
+		if group_id is not None:
+			dump_ids = [d for d in dump_ids if get_store().meta(d)['group_id'] == group_id]
+		get_store().remove(dump_ids)
 
 
 #this will be done daily.
@@ -281,78 +204,91 @@ def auto_cleanup():
 
 #called after operations. remove oldest dumps if too many
 def remove_too_many_dumps():
-	global dumps
 	with dumps_lock:
-		todel = len(dumps) - DUMP_LIMIT
+		todel = get_store().count() - DUMP_LIMIT
 		if todel > 0:
-			for d in sorted(dumps.itervalues(), key=lambda d: d['timestamp'])[:todel]:
-				remove_dump(d['dump_id'])
-
-
-
+			get_store().remove(list_oldest_dump_ids(todel))
 
 
 #return the total number of error dumps
 def getCount():
-	global dumps
-	return len(dumps)
+	return get_store().count()
 
 
 #param after: if set, only return dumps with timestamp after this
-#param list_only: if true, only return dumps with timestamp after this time (time.Time object)
+#param list_only: if true, only return dump ids
 #param include_data: include environment data (may be about 1M!, or set compress_data true). Only used if not list_only
-#param compress_data: use zlib to compress environment data. only used if include_data==True. decompress with json.loads(zlib.decompress(base64.decode(dump['environment'])))
-def getAll(after=None, list_only=False, include_data=False):
-	global dumps
+#param after_id: together with after, only return dumps after the dump (after, after_id). Used to fetch dumps page by page.
+#param limit: return at most this many dumps (the oldest ones)
+def getAll(after=None, list_only=False, include_data=False, after_id=None, limit=None):
 	return_list = []
 
 	with dumps_lock:  # the use of load_dump in the loop would throw an error if a dump is removed by the autopusher during this iteration.
-		for dump_id in list_all_dumps_ids():
-			_dump = load_dump(dump_id, False, False, dump_on_error=True)
-			if (after is None) or (_dump['timestamp'] >= after):
-				if list_only:
-					dump = dump_id
-				elif include_data:
-					dump = load_dump(dump_id, True, False, dump_on_error=True)
-				else:
-					dump = _dump
-				return_list.append(dump)
+		dump_ids = get_store().ids(after=after, afterId=after_id, limit=limit)
+		if list_only:
+			return dump_ids
+		for dump_id in dump_ids:
+			return_list.append(load_dump(dump_id, include_data, False, dump_on_error=True))
 	return return_list
 
 def get_recent_dumps():
 	global boot_time
-	return len(getAll(max(boot_time, time.time()-6*60*60), True))
+	return get_store().count(after=max(boot_time, time.time()-6*60*60))
+
+
+#dumps used to be stored as two files per dump: <dump_id>.meta.json and <dump_id>.data.gz (or <dump_id>.data.json
+#in dump_file_version 0). Move them to the store.
+def migrate_legacy_dumps(dump_dir):
+	for filename in os.listdir(dump_dir):
+		if not filename.endswith(".meta.json"):
+			continue
+		dump_id = filename[:-len(".meta.json")]
+		paths = [os.path.join(dump_dir, dump_id + ext) for ext in (".meta.json", ".data.gz", ".data.json")]
+		try:
+			with open(paths[0], "r") as f:
+				dump_meta = json.load(f)
+			if dump_meta.pop("dump_file_version", 0) == 1:
+				fp = gzip.GzipFile(paths[1], "r")
+				try:
+					data = json.loads(fp.read())
+				finally:
+					fp.close()
+			else:
+				with open(paths[2], "r") as f:
+					dump_data = json.load(f)
+				data = dump_data['data']
+				if dump_data['compressed']:
+					data = json.loads(zlib.decompress(base64.b64decode(data)))
+			if not get_store().exists(dump_id):
+				get_store().add(dump_meta, data)
+		except:
+			import traceback
+			traceback.print_exc()
+		else:
+			for path in paths:
+				if os.path.exists(path):
+					os.remove(path)
 
 #initialize dump management on server startup.
 def init(env_cmds, tomatoVersion):
 	with dumps_lock:
 		global envCmds
-		global dumps
 		global tomato_component
 		global tomato_version
 		global boot_time
+		global initialized
 		envCmds = env_cmds
 		tomato_component = settings.get_tomato_module_name()
 		tomato_version = tomatoVersion
 		boot_time = time.time()
 
-		dump_dir = settings.get_dump_config()[Config.DUMPS_DIRECTORY]
-		if not os.path.exists(dump_dir):
-			os.makedirs(dump_dir)
-		else:
-
-			dump_id_list = list_all_dumps_ids()
-			global initialized
-			initialized = True
-			for dump_id in dump_id_list:
-				try:
-					load_dump(dump_id, push_to_dumps=True, load_data=False, load_from_file=True, dump_on_error=True)
-					remove_too_many_dumps()
-				except:
-					import traceback
-					traceback.print_exc()
+		get_store()
+		migrate_legacy_dumps(settings.get_dump_config()[Config.DUMPS_DIRECTORY])
+		initialized = True
+		remove_too_many_dumps()
 	from .. import scheduler
-	scheduler.scheduleRepeated(60 * 60 * 24, auto_cleanup, immediate=True)
+	from .tasks import TaskClass
+	scheduler.scheduleRepeated(60 * 60 * 24, auto_cleanup, immediate=True, taskClass=TaskClass.HOUSEKEEPING)
 
 
 
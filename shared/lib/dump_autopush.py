@@ -1,10 +1,15 @@
 from service import get_backend_debug_proxy
 from settings import settings, Config
+from error import InternalError
 import dump as dump_lib
 import threading
 import thread
 import time
 
+PUSH_BATCH_SIZE = 50  # maximum number of dumps per push
+PUSH_MIN_DELAY = 1  # minimum time between two pushes
+PUSH_MAX_DELAY = 300  # maximum time between two attempts after failed pushes
+
 auto_push = False
 must_autopush = threading.Event()
 
@@ -12,29 +17,52 @@ must_autopush = threading.Event()
 def on_dump_create():
 	must_autopush.set()
 
+def push_batch(batch_size):
+	"""
+	push the oldest dumps to backend_debug and remove the ones it has stored.
+	The dumps lock is only held while choosing the dumps, so saving dumps is not blocked by the push.
+	:return: number of dumps that have been pushed and number of dumps that have been stored
+	:rtype: tuple
+	"""
+	with dump_lib.dumps_lock:
+		dump_ids = dump_lib.list_oldest_dump_ids(batch_size)
+	dumps = []
+	for dump_id in dump_ids:
+		try:
+			dumps.append(dump_lib.load_dump(dump_id, load_data=True))
+		except InternalError:
+			pass  # removed in the meantime
+	if not dumps:
+		return 0, 0
+	stored = get_backend_debug_proxy().dump_push_many_from_backend(settings.get_tomato_module_name(), dumps)
+	dump_lib.remove_dumps(stored)
+	return len(dumps), len(stored)
+
 def dump_pusher():
 	# there must be one thread running this.
 	# this thread is started in init()
+	# batch size and delay adapt to backend_debug: the batch size doubles after successful pushes and is halved
+	# after failures. Pushes are at least as far apart as the last push took, failed pushes are retried with
+	# exponential backoff.
+	batch_size = 1
+	delay = PUSH_MIN_DELAY
 	while auto_push:
+		must_autopush.wait()
+		must_autopush.clear()
 		try:
-			with dump_lib.dumps_lock:
-				if len(dump_lib.list_all_dumps_ids()) > 0:
-					# get dump_id with smallest timestamp
-					dump_id = sorted(dump_lib.dumps.iteritems(), key=lambda d: d[1]['timestamp'])[0][0]
-
-					# push to backend_debug
-					get_backend_debug_proxy().dump_push_from_backend(
-						settings.get_tomato_module_name(),
-						dump_lib.load_dump(dump_id, load_data=True))
-
-					# remove from list
-					dump_lib.remove_dump(dump_id)
-				else:
-					must_autopush.clear()
+			start = time.time()
+			pushed, stored = push_batch(batch_size)
+			if pushed and not stored:
+				raise InternalError(code=InternalError.UNKNOWN, message="backend_debug did not store any dumps", todump=False)
+			if pushed >= batch_size:
+				must_autopush.set()  # there may be more dumps
+			batch_size = min(PUSH_BATCH_SIZE, batch_size * 2)
+			delay = min(PUSH_MAX_DELAY, max(PUSH_MIN_DELAY, time.time() - start))
 		except:
-			must_autopush.clear()  # wait for next round if an error occurred.
-		time.sleep(5)  # avoid flooding: only one dump per 5 seconds via push!
-		must_autopush.wait()
+			must_autopush.set()  # try again later
+			batch_size = max(1, batch_size // 2)
+			delay = min(PUSH_MAX_DELAY, delay * 2)
+		time.sleep(delay)
 
 
 def init():
@@ -0,0 +1,309 @@
+import os, re, struct, zlib, fcntl, bisect, threading, random
+
+from . import anyjson as json
+
+INDEX_FILE = "dumps.idx"
+LOCK_FILE = "dumps.lock"
+SEGMENT_FILE = "dumps.%06d.seg"
+SEGMENT_PATTERN = re.compile("^dumps\.(\d{6})\.seg$")
+
+RECORD_HEADER = struct.Struct(">I")
+
+COMPACT_MIN_REMOVED = 100  # the index is not rewritten unless it contains at least this many removed dumps
+
+
+class DumpStore(object):
+	"""
+	Append-only storage for error dumps.
+
+	The data of the dumps is compressed and appended to segment files. A new segment is started when the
+	current one is larger than segmentSize, segments are deleted as soon as all their dumps have been removed.
+	The metadata of all dumps is kept in memory, ordered by timestamp, and in an index file that is append-only
+	as well: it contains one JSON line for every added and every removed dump, so starting up only reads this
+	file. The index is rewritten when it contains more removed than existing dumps, its first line identifies
+	the current version of the file.
+
+	Several processes (e.g. web) may use the same directory. Changes are made while holding a lock on the
+	directory, and changes of other processes are read from the index before every operation.
+	"""
+
+	def __init__(self, directory, compressionLevel=6, segmentSize=4 << 20):
+		"""
+		:param str directory: directory to store the dumps in
+		:param int compressionLevel: zlib compression level of the dump data
+		:param int segmentSize: a new segment file is started when the current one is larger than this
+		"""
+		self.directory = directory
+		self.compressionLevel = compressionLevel
+		self.segmentSize = segmentSize
+		if not os.path.exists(directory):
+			os.makedirs(directory)
+		self._lock = threading.RLock()
+		self._lockDepth = 0
+		self._lockFile = None
+		self._reset()
+		with self._locked():
+			self._refresh()
+			self._removeUnusedSegments()
+
+	def _reset(self):
+		self._meta = {}  # dump_id -> meta
+		self._location = {}  # dump_id -> (segment, offset)
+		self._segments = {}  # segment -> number of dumps
+		self._timeline = []  # [(timestamp, dump_id)], sorted
+		self._segment = 0  # segment that is appended to
+		self._removed = 0  # number of removed dumps in the index
+		self._indexPos = 0
+		self._indexHeader = ""
+
+	def _path(self, name):
+		return os.path.join(self.directory, name)
+
+	def _segmentPath(self, segment):
+		return self._path(SEGMENT_FILE % segment)
+
+	def _locked(self):
+		return _DirectoryLock(self)
+
+	def _apply(self, entry):
+		if "add" in entry:
+			meta = entry["add"]
+			dump_id = meta["dump_id"]
+			if dump_id in self._meta:
+				return
+			self._meta[dump_id] = meta
+			self._location[dump_id] = (entry["segment"], entry["offset"])
+			self._segments[entry["segment"]] = self._segments.get(entry["segment"], 0) + 1
+			self._segment = max(self._segment, entry["segment"])
+			bisect.insort(self._timeline, (meta["timestamp"], dump_id))
+		elif "remove" in entry:
+			dump_id = entry["remove"]
+			self._removed += 1
+			meta = self._meta.pop(dump_id, None)
+			if not meta:
+				return
+			segment, _ = self._location.pop(dump_id)
+			self._segments[segment] -= 1
+			if not self._segments[segment]:
+				del self._segments[segment]
+			pos = bisect.bisect_left(self._timeline, (meta["timestamp"], dump_id))
+			del self._timeline[pos]
+
+	def _refresh(self):
+		"""
+		read the changes that have been written to the index since the last call.
+		Must be called with the lock held.
+		"""
+		path = self._path(INDEX_FILE)
+		if not os.path.exists(path):
+			if self._indexPos:
+				self._reset()
+			return
+		with open(path, "r+") as f:
+			if f.readline() != self._indexHeader:
+				# the index has been rewritten
+				self._reset()
+			f.seek(0, os.SEEK_END)
+			if f.tell() == self._indexPos:
+				return
+			f.seek(self._indexPos)
+			data = f.read()
+			end = data.rfind("\n") + 1
+			if end < len(data):
+				# incomplete entry of a writer that crashed, nobody else is writing while we hold the lock
+				f.truncate(self._indexPos + end)
+			lines = data[:end].splitlines(True)
+			if not self._indexPos and lines:
+				self._indexHeader = lines.pop(0)
+				try:
+					self._segment = json.loads(self._indexHeader).get("segment", 0)
+				except:
+					pass
+			for line in lines:
+				try:
+					self._apply(json.loads(line))
+				except:
+					print "Skipping invalid entry in dump index: %r" % line[:100]
+			self._indexPos += end
+
+	def _header(self):
+		return json.dumps({"version": 1, "generation": "%016x" % random.getrandbits(64), "segment": self._segment}) + "\n"
+
+	def _write(self, entries):
+		"""
+		append entries to the index and apply them.
+		Must be called with the lock held, after _refresh().
+		"""
+		data = "".join(json.dumps(entry) + "\n" for entry in entries)
+		if not self._indexPos:
+			self._indexHeader = self._header()
+			data = self._indexHeader + data
+		with open(self._path(INDEX_FILE), "a") as f:
+			f.write(data)
+			f.flush()
+		self._indexPos += len(data)
+		for entry in entries:
+			self._apply(entry)
+
+	def _removeUnusedSegments(self):
+		for name in os.listdir(self.directory):
+			match = SEGMENT_PATTERN.match(name)
+			if match and int(match.group(1)) not in self._segments and int(match.group(1)) != self._segment:
+				os.remove(self._path(name))
+
+	def _compact(self):
+		if self._removed < max(COMPACT_MIN_REMOVED, len(self._meta)):
+			return
+		tmp = self._path(INDEX_FILE + ".tmp")
+		header = self._header()
+		with open(tmp, "w") as f:
+			f.write(header)
+			for _, dump_id in self._timeline:
+				segment, offset = self._location[dump_id]
+				f.write(json.dumps({"add": self._meta[dump_id], "segment": segment, "offset": offset}) + "\n")
+			f.flush()
+			os.fsync(f.fileno())
+			size = f.tell()
+		os.rename(tmp, self._path(INDEX_FILE))
+		self._indexHeader, self._indexPos, self._removed = header, size, 0
+
+	def add(self, meta, data):
+		"""
+		store a dump.
+		:param dict meta: metadata of the dump, must contain 'dump_id' and 'timestamp'
+		:param data: data of the dump, must be serializable to JSON
+		"""
+		data = zlib.compress(json.dumps(data), self.compressionLevel)
+		with self._locked():
+			self._refresh()
+			path = self._segmentPath(self._segment)
+			if os.path.exists(path) and os.path.getsize(path) >= self.segmentSize:
+				if self._segment not in self._segments:
+					os.remove(path)
+				self._segment += 1
+				path = self._segmentPath(self._segment)
+			with open(path, "ab") as f:
+				f.seek(0, os.SEEK_END)
+				offset = f.tell()
+				f.write(RECORD_HEADER.pack(len(data)))
+				f.write(data)
+			self._write([{"add": meta, "segment": self._segment, "offset": offset}])
+
+	def remove(self, dump_ids):
+		"""
+		remove dumps. Unknown ids are ignored.
+		:param list dump_ids: ids of the dumps to remove
+		"""
+		with self._locked():
+			self._refresh()
+			segments = set(self._location[dump_id][0] for dump_id in dump_ids if dump_id in self._location)
+			self._write([{"remove": dump_id} for dump_id in dump_ids if dump_id in self._meta])
+			for segment in segments:
+				if segment not in self._segments and segment != self._segment:
+					if os.path.exists(self._segmentPath(segment)):
+						os.remove(self._segmentPath(segment))
+			self._compact()
+
+	def exists(self, dump_id):
+		with self._locked():
+			self._refresh()
+			return dump_id in self._meta
+
+	def meta(self, dump_id):
+		"""
+		get the metadata of a dump.
+		:return: a copy of the metadata or None if the dump does not exist
+		:rtype: dict
+		"""
+		with self._locked():
+			self._refresh()
+			meta = self._meta.get(dump_id)
+			return meta.copy() if meta else None
+
+	def data(self, dump_id, compressed=False):
+		"""
+		read the data of a dump.
+		:param bool compressed: return the zlib-compressed JSON string as stored instead of the decoded data
+		:return: data of the dump, None if the dump does not exist
+		"""
+		with self._locked():
+			self._refresh()
+			if not dump_id in self._location:
+				return None
+			segment, offset = self._location[dump_id]
+			with open(self._segmentPath(segment), "rb") as f:
+				f.seek(offset)
+				size, = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+				data = f.read(size)
+		if compressed:
+			return data
+		return json.loads(zlib.decompress(data))
+
+	def ids(self, after=None, before=None, limit=None, afterId=None):
+		"""
+		get the ids of dumps, ordered by timestamp and id (oldest first).
+		:param float after: only dumps with timestamp >= after
+		:param str afterId: together with after: only dumps after the dump (after, afterId), i.e. the last dump of the previous page
+		:param float before: only dumps with timestamp <= before
+		:param int limit: return at most this many ids (the oldest ones)
+		:rtype: list
+		"""
+		with self._locked():
+			self._refresh()
+			if after is None:
+				start = 0
+			elif afterId is not None:
+				start = bisect.bisect_right(self._timeline, (after, afterId))
+			else:
+				start = bisect.bisect_left(self._timeline, (after,))
+			if before is not None:
+				end = bisect.bisect_left(self._timeline, (before,))
+				while end < len(self._timeline) and self._timeline[end][0] == before:
+					end += 1
+			else:
+				end = len(self._timeline)
+			if limit is not None:
+				end = min(end, start + limit)
+			return [dump_id for _, dump_id in self._timeline[start:end]]
+
+	def count(self, after=None):
+		"""
+		get the number of dumps.
+		:param float after: only count dumps with timestamp >= after
+		"""
+		with self._locked():
+			self._refresh()
+			if after is None:
+				return len(self._timeline)
+			return len(self._timeline) - bisect.bisect_left(self._timeline, (after,))
+
+
+class _DirectoryLock(object):
+	"""
+	Holds the thread lock of the store and an exclusive lock on the lock file of its directory.
+	Can be nested.
+	"""
+	__slots__ = ("store",)
+
+	def __init__(self, store):
+		self.store = store
+
+	def __enter__(self):
+		store = self.store
+		store._lock.acquire()
+		if not store._lockDepth:
+			try:
+				store._lockFile = open(store._path(LOCK_FILE), "a")
+				fcntl.flock(store._lockFile.fileno(), fcntl.LOCK_EX)
+			except:
+				store._lock.release()
+				raise
+		store._lockDepth += 1
+
+	def __exit__(self, *args):
+		store = self.store
+		store._lockDepth -= 1
+		if not store._lockDepth:
+			store._lockFile.close()  # releases the lock
+			store._lockFile = None
+		store._lock.release()
@@ -226,6 +226,7 @@ class TransportError(Error):
 	SSL = "ssl"
 	CONNECT = "connect"
 	RPC = "rpc"
+	UNKNOWN_METHOD = "method.unknown_method" # the sslrpc server does not provide the called method
 
 @ErrorType
 class NetworkError(Error):
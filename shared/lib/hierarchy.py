@@ -9,6 +9,11 @@ class ClassName:
 	TOPOLOGY = "topology"
 	USER = "user"
 	ORGANIZATION = "organization"
+	SITE = "site"
+	TEMPLATE = "template"
+	PROFILE = "profile"
+	NETWORK = "network"
+	NETWORK_INSTANCE = "network_instance"
 
 _translations = {}
 
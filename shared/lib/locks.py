@@ -0,0 +1,186 @@
+import threading, time
+
+_registries = {}  # name -> LockRegistry
+_statistics = False
+
+
+class _Entry(object):
+	__slots__ = ("lock", "refs", "owner", "depth", "acquired")
+
+	def __init__(self):
+		self.lock = threading.RLock()
+		self.refs = 0  # number of acquisitions that are held or waited for
+		self.owner = None  # name of the thread holding the lock, only with statistics
+		self.depth = 0
+		self.acquired = None
+
+
+class LockRegistry(object):
+	"""
+	Reentrant locks for objects identified by a key.
+
+	An entry only exists while its lock is held or waited for: every acquisition counts as a reference and the
+	entry is removed when the last one has been released. The entries are protected by several stripe locks,
+	so getting a lock does not contend with unrelated keys.
+	With statistics enabled, the number of acquisitions, contended acquisitions and the time spent waiting are
+	counted and the holders of the locks are recorded (see info()).
+	"""
+
+	def __init__(self, name, stripes=16):
+		"""
+		:param str name: name of the registry in info()
+		:param int stripes: number of locks protecting the entries
+		"""
+		self.name = name
+		self.statistics = _statistics
+		self._entries = {}  # key -> _Entry
+		self._stripes = [threading.Lock() for _ in xrange(stripes)]
+		self._statsLock = threading.Lock()
+		self._resetStatistics()
+		_registries[name] = self
+
+	def _resetStatistics(self):
+		self._acquisitions = 0
+		self._contended = 0
+		self._waitTotal = 0.0
+		self._waitMax = 0.0
+
+	def _stripe(self, key):
+		return self._stripes[hash(key) % len(self._stripes)]
+
+	def get(self, key):
+		"""
+		get the lock of an object. The lock can be used like a threading.RLock.
+		:param key: hashable key of the object
+		:rtype: KeyLock
+		"""
+		return KeyLock(self, key)
+
+	def _acquire(self, key, blocking=True):
+		with self._stripe(key):
+			entry = self._entries.get(key)
+			if not entry:
+				entry = self._entries[key] = _Entry()
+			entry.refs += 1
+		if not self.statistics:
+			if entry.lock.acquire(blocking):
+				return True
+			self._unref(key, entry)
+			return False
+		start = time.time()
+		contended = not entry.lock.acquire(False)
+		if contended and not (blocking and entry.lock.acquire()):
+			self._unref(key, entry)
+			return False
+		waited = time.time() - start
+		if not entry.depth:
+			entry.owner, entry.acquired = threading.current_thread().name, time.time()
+		entry.depth += 1
+		with self._statsLock:
+			self._acquisitions += 1
+			if contended:
+				self._contended += 1
+				self._waitTotal += waited
+				self._waitMax = max(self._waitMax, waited)
+		return True
+
+	def _release(self, key):
+		with self._stripe(key):
+			entry = self._entries.get(key)
+			if not entry:
+				raise RuntimeError("cannot release un-acquired lock")
+			if entry.depth:
+				entry.depth -= 1
+				if not entry.depth:
+					entry.owner = entry.acquired = None
+			entry.lock.release()
+			self._unrefLocked(key, entry)
+
+	def _unref(self, key, entry):
+		with self._stripe(key):
+			self._unrefLocked(key, entry)
+
+	def _unrefLocked(self, key, entry):
+		entry.refs -= 1
+		if not entry.refs:
+			del self._entries[key]
+
+	def isLocked(self, key):
+		"""
+		:return: whether the lock of the object is held by any thread
+		"""
+		with self._stripe(key):
+			return key in self._entries
+
+	def __len__(self):
+		return len(self._entries)
+
+	def info(self, maxHolders=100):
+		"""
+		get the state of this registry.
+		:param int maxHolders: include at most this many of the longest-held locks
+		:return: dict containing 'entries', 'statistics' and, if statistics are enabled, 'acquisitions', 'contended',
+		         'wait_total', 'wait_max' and 'holders' (list of dicts with 'key', 'thread', 'held', 'waiting')
+		:rtype: dict
+		"""
+		info = {"entries": len(self._entries), "statistics": self.statistics}
+		if not self.statistics:
+			return info
+		with self._statsLock:
+			info.update(acquisitions=self._acquisitions, contended=self._contended, wait_total=self._waitTotal,
+						wait_max=self._waitMax)
+		now = time.time()
+		holders = []
+		for key, entry in self._entries.items():
+			acquired = entry.acquired
+			if acquired is None:
+				continue
+			holders.append({"key": repr(key), "thread": entry.owner, "held": now - acquired,
+							"waiting": max(entry.refs - entry.depth, 0)})
+		holders.sort(key=lambda h: -h["held"])
+		info["holders"] = holders[:maxHolders]
+		return info
+
+
+class KeyLock(object):
+	"""
+	The lock of one object in a LockRegistry.
+	"""
+	__slots__ = ("registry", "key")
+
+	def __init__(self, registry, key):
+		self.registry = registry
+		self.key = key
+
+	def acquire(self, blocking=True):
+		return self.registry._acquire(self.key, blocking)
+
+	def release(self):
+		self.registry._release(self.key)
+
+	def __enter__(self):
+		self.acquire()
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		self.release()
+
+
+def configure(statistics=False):
+	"""
+	:param bool statistics: whether all registries collect contention statistics
+	"""
+	global _statistics
+	_statistics = statistics
+	for registry in _registries.values():
+		if registry.statistics != statistics:
+			registry._resetStatistics()
+		registry.statistics = statistics
+
+
+def info():
+	"""
+	:return: info() of all registries by name
+	:rtype: dict
+	"""
+	return {name: registry.info() for name, registry in _registries.items()}
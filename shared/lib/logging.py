@@ -1,15 +1,58 @@
 from datetime import datetime
-import sys, time, traceback, hashlib
+import sys, os, time, traceback, hashlib, threading, Queue, atexit, random
 from . import anyjson as json
 
+OVERFLOW_DROP = "drop"
+OVERFLOW_BLOCK = "block"
+
+CALLS_LOG = "calls"
+CALLS_AGGREGATE = "aggregate"
+CALLS_OFF = "off"
+
+_STOP = object()
+
 
 class JSONLogger:
-	def __init__(self, path):
+	"""
+	Writes log entries as JSON lines.
+
+	log() only serializes the entry and puts it into a bounded queue, a background thread formats the entries
+	(including masking passwords) and writes them in batches. If the queue is full, entries are dropped (and the number
+	of dropped entries is logged) or the caller waits, depending on the overflow policy.
+	The file is rotated when it gets larger than maxSize or older than rotateInterval.
+	"""
+	def __init__(self, path, queueSize=10000, overflow=OVERFLOW_DROP, batchSize=100, maxSize=0, rotateInterval=0, backupCount=5,
+				 categories=None):
+		"""
+		:param str path: file to write to
+		:param int queueSize: maximum number of entries waiting to be written
+		:param str overflow: what to do if the queue is full: OVERFLOW_DROP or OVERFLOW_BLOCK
+		:param int batchSize: maximum number of entries written at once
+		:param int maxSize: rotate the file when it is larger than this many bytes. 0 to disable.
+		:param int rotateInterval: rotate the file after this many seconds. 0 to disable.
+		:param int backupCount: number of rotated files to keep (path.1 to path.N)
+		:param dict categories: category -> bool. Entries of disabled categories are not logged.
+		"""
 		self.path = path
+		self.disabled = set(name for name, enabled in (categories or {}).iteritems() if not enabled)
+		self.overflow = overflow
+		self.batchSize = batchSize
+		self.maxSize = maxSize
+		self.rotateInterval = rotateInterval
+		self.backupCount = backupCount
+		self._queue = Queue.Queue(queueSize)
+		self._dropped = 0
+		self._droppedLock = threading.Lock()
+		self._closed = False
 		self.open()
+		self._writer = threading.Thread(target=self._run, name="log writer")
+		self._writer.daemon = True
+		self._writer.start()
 
 	def open(self):
 		self._fp = open(self.path, "a")
+		self._size = os.fstat(self._fp.fileno()).st_size
+		self._opened = time.time()
 
 	def __enter__(self):
 		return self
@@ -18,35 +61,103 @@ class JSONLogger:
 		self.close()
 
 	def close(self):
+		"""
+		write all queued entries and close the file.
+		"""
+		if self._closed:
+			return
+		self._closed = True
+		self._queue.put(_STOP)
+		self._writer.join()
+
+	def _rotate(self):
 		self._fp.close()
-		self._fp = None
+		for i in xrange(self.backupCount - 1, 0, -1):
+			if os.path.exists("%s.%d" % (self.path, i)):
+				os.rename("%s.%d" % (self.path, i), "%s.%d" % (self.path, i + 1))
+		if self.backupCount:
+			os.rename(self.path, "%s.1" % self.path)
+		else:
+			os.remove(self.path)
+		self.open()
+
+	def _needsRotation(self):
+		if self.maxSize and self._size >= self.maxSize:
+			return True
+		return self.rotateInterval and time.time() - self._opened >= self.rotateInterval
 
-	def _write(self, data):
+	def _format(self, entry):
+		category, timestamp, caller, kwargs = entry
+		data = {"category": category, "timestamp": datetime.fromtimestamp(timestamp).strftime("%Y-%m-%dT%H:%M:%S.%f%z")}
+		if caller:
+			data["caller"] = caller
 		try:
-			data = json.dumps(data)
-			self._fp.write(data + "\n")
+			if isinstance(kwargs, basestring):
+				kwargs = json.loads(kwargs)
+			data.update(maskPasswords(kwargs))
+			return json.dumps(data) + "\n"
 		except:
 			print "Failed to write log entry: %s" % data
+			return None
+
+	def _write(self, lines):
+		try:
+			if self._needsRotation():
+				self._rotate()
+			data = "".join(lines)
+			self._fp.write(data)
+			self._fp.flush()
+			self._size += len(data)
+		except:
+			print "Failed to write %d log entries" % len(lines)
+
+	def _run(self):
+		while True:
+			batch = [self._queue.get()]
+			while len(batch) < self.batchSize:
+				try:
+					batch.append(self._queue.get_nowait())
+				except Queue.Empty:
+					break
+			lines = [self._format(entry) for entry in batch if entry is not _STOP]
+			with self._droppedLock:
+				dropped, self._dropped = self._dropped, 0
+			if dropped:
+				lines.append(self._format(("logging", time.time(), None, {"message": "log queue full, entries dropped", "count": dropped})))
+			lines = filter(None, lines)
+			if lines:
+				self._write(lines)
+			if _STOP in batch:
+				self._fp.close()
+				return
 
 	def _caller(self):
-		caller = None
-		for t in traceback.extract_stack():
-			if t[0] == __file__:
-				break
-			caller = list(t[0:3])
-		if caller:
-			caller[0] = "..." + caller[0][-22:]
-		return caller
+		f = sys._getframe(1)
+		while f and f.f_code.co_filename == _srcfile:
+			f = f.f_back
+		if not f:
+			return None
+		return ["..." + f.f_code.co_filename[-22:], f.f_lineno, f.f_code.co_name]
+
+	def enabled(self, category):
+		return category not in self.disabled
 
 	def log(self, category=None, timestamp=None, caller=None, **kwargs):
+		if category in self.disabled:
+			return
 		if not timestamp:
 			timestamp = time.time()
-		timestr = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%dT%H:%M:%S.%f%z")
-		data = {"category": category, "timestamp": timestr}
-		if not caller is False:
-			data["caller"] = self._caller()
-		data.update(maskPasswords(kwargs))
-		self._write(data)
+		# the entry is formatted later, the caller may change its objects in the meantime
+		kwargs = _serialize(kwargs)
+		entry = (category, timestamp, self._caller() if not caller is False else None, kwargs)
+		if self.overflow == OVERFLOW_BLOCK:
+			self._queue.put(entry)
+			return
+		try:
+			self._queue.put_nowait(entry)
+		except Queue.Full:
+			with self._droppedLock:
+				self._dropped += 1
 
 	def logMessage(self, message, category=None, **kwargs):
 		self.log(message=message, category=category, **kwargs)
@@ -57,18 +168,141 @@ class JSONLogger:
 		self.log(category="exception", trace=trace, caller=False, exception=(type.__name__, str(value)), **kwargs)
 
 
+class CallLogger:
+	"""
+	Logs the API calls of an rpc server (before() is used as beforeExecute, after() as afterExecute and
+	error() from onError).
+
+	In CALLS_LOG mode, one entry is written per call. Calls are sampled with a per-method rate, the rate is
+	included in the entry so that counts can be extrapolated. Long string arguments are truncated.
+	In CALLS_AGGREGATE mode, only the number of calls, errors and the execution times per method are
+	collected and written as one entry per method every aggregateInterval seconds.
+	"""
+	def __init__(self, logger, mode=CALLS_LOG, sampleRate=1.0, sampleRates=None, maxArgLength=0, aggregateInterval=60):
+		"""
+		:param JSONLogger logger: logger to write to
+		:param str mode: CALLS_LOG, CALLS_AGGREGATE or CALLS_OFF
+		:param float sampleRate: fraction of calls that are logged for methods without own rate
+		:param dict sampleRates: method name -> fraction of calls that are logged
+		:param int maxArgLength: strings in arguments are truncated to this length. 0 to disable.
+		:param int aggregateInterval: seconds between two summaries in aggregate mode
+		"""
+		self.logger = logger
+		self.mode = mode
+		self.sampleRate = sampleRate
+		self.sampleRates = dict(sampleRates or {})
+		self.maxArgLength = maxArgLength
+		self.aggregateInterval = aggregateInterval
+		self._current = threading.local()
+		self._stats = {}  # method name -> [count, errors, total time, max time]
+		self._statsLock = threading.Lock()
+		self._statsSince = time.time()
+
+	def _truncate(self, value):
+		if isinstance(value, basestring):
+			if len(value) > self.maxArgLength:
+				return value[:self.maxArgLength] + "...(%d chars)" % len(value)
+			return value
+		if isinstance(value, dict):
+			return dict((k, self._truncate(v)) for k, v in value.iteritems())
+		if isinstance(value, (list, tuple)):
+			return [self._truncate(v) for v in value]
+		return value
+
+	def before(self, function, args, kwargs, **extra):
+		if self.mode == CALLS_AGGREGATE:
+			self._current.call = (function, time.time())
+			return
+		if self.mode != CALLS_LOG or not self.logger.enabled("api"):
+			return
+		rate = self.sampleRates.get(function.__name__, self.sampleRate)
+		if rate < 1.0:
+			if random.random() >= rate:
+				return
+			extra["sample_rate"] = rate
+		if self.maxArgLength:
+			args, kwargs = self._truncate(args), self._truncate(kwargs)
+		self.logger.log(category="api", method=function.__name__, args=args, kwargs=kwargs, **extra)
+
+	def _finished(self, function, failed):
+		call = getattr(self._current, "call", None)
+		self._current.call = None
+		if not call or call[0] is not function:
+			return
+		duration = time.time() - call[1]
+		with self._statsLock:
+			stats = self._stats.get(function.__name__)
+			if not stats:
+				stats = self._stats[function.__name__] = [0, 0, 0.0, 0.0]
+			stats[0] += 1
+			if failed:
+				stats[1] += 1
+			stats[2] += duration
+			stats[3] = max(stats[3], duration)
+		if call[1] - self._statsSince >= self.aggregateInterval:
+			self.flush()
+
+	def after(self, function, args, kwargs, result):
+		if self.mode == CALLS_AGGREGATE:
+			self._finished(function, False)
+
+	def error(self, function):
+		if self.mode == CALLS_AGGREGATE:
+			self._finished(function, True)
+
+	def flush(self):
+		"""
+		write the summaries collected since the last flush.
+		"""
+		now = time.time()
+		with self._statsLock:
+			stats, self._stats = self._stats, {}
+			since, self._statsSince = self._statsSince, now
+		for method, (count, errors, total, max_) in stats.iteritems():
+			self.logger.log(category="api_summary", caller=False, method=method, count=count, errors=errors,
+							time_avg=total / count, time_max=max_, interval=now - since)
+
+
 _default = None
+_calls = None
 
 
-def openDefault(path, **kwargs):
-	global _default
+def openDefault(path, config=None, **kwargs):
+	"""
+	open the default logger.
+	:param str path: file to write to
+	:param dict config: logging settings, see settings.get_logging_settings()
+	"""
+	global _default, _calls
+	calls = {}
+	if config:
+		kwargs.setdefault("queueSize", config.get("queue-size", 10000))
+		kwargs.setdefault("overflow", config.get("overflow", OVERFLOW_DROP))
+		kwargs.setdefault("batchSize", config.get("batch-size", 100))
+		kwargs.setdefault("maxSize", config.get("max-size", 0))
+		kwargs.setdefault("rotateInterval", config.get("rotate-interval", 0))
+		kwargs.setdefault("backupCount", config.get("backup-count", 5))
+		kwargs.setdefault("categories", config.get("categories"))
+		calls = config.get("api-calls") or {}
 	_default = JSONLogger(path, **kwargs)
+	_calls = CallLogger(_default, mode=calls.get("mode", CALLS_LOG), sampleRate=calls.get("sample-rate", 1.0),
+						sampleRates=calls.get("sample-rates"), maxArgLength=calls.get("max-arg-length", 0),
+						aggregateInterval=calls.get("aggregate-interval", 60))
 
 
 def closeDefault():
-	global _default
+	global _default, _calls
+	_calls.flush()
 	_default.close()
 	_default = None
+	_calls = None
+
+
+@atexit.register
+def _closeAtExit():
+	# write the summaries and queued entries of the current default loggers
+	if _default:
+		closeDefault()
 
 
 def logException(**kwargs):
@@ -89,15 +323,59 @@ def log(**kwargs):
 	_default.log(**kwargs)
 
 
+def logCall(function, args, kwargs, **extra):
+	"""
+	log an API call, to be used as beforeExecute of rpc servers.
+	:param function: called function
+	:param extra: additional values to log, e.g. the user
+	"""
+	if not _calls:
+		return
+	_calls.before(function, args, kwargs, **extra)
+
+
+def logCallEnd(function, args, kwargs, result=None):
+	"""
+	to be used as afterExecute of rpc servers.
+	"""
+	if not _calls:
+		return
+	_calls.after(function, args, kwargs, result)
+
+
+def logCallError(function):
+	"""
+	to be called by the onError handler of rpc servers.
+	"""
+	if not _calls:
+		return
+	_calls.error(function)
+
+
+def _serialize(kwargs):
+	try:
+		return json.dumps(kwargs)
+	except:
+		pass
+	# objects that JSON does not support are logged with their representation instead of dropping the entry
+	try:
+		return json.orig.dumps(kwargs, default=repr)
+	except:
+		return json.orig.dumps(dict((key, repr(value)) for key, value in kwargs.iteritems()))
+
 def maskPasswords(data):
 	tmp = {}
 	for key, value in data.iteritems():
 		if isinstance(value, dict):
 			value = maskPasswords(value)
 		else:
+			value_repr = repr(value)
 			for pattern in ["password", "passwd", "pwd"]:
-				if pattern in key or pattern in repr(value):
-					value = "(contains passwords)MD5=%s" % hashlib.md5(repr(value)).hexdigest()
+				if pattern in key or pattern in value_repr:
+					value = "(contains passwords)MD5=%s" % hashlib.md5(value_repr).hexdigest()
 					break
 		tmp[key] = value
 	return tmp
+
+# frames of this file are skipped when looking for the caller
+_srcfile = maskPasswords.func_code.co_filename
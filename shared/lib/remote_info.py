@@ -3,6 +3,7 @@ from exceptionhandling import deprecated
 from service import get_backend_users_proxy, get_backend_core_proxy, get_backend_accounting_proxy
 from cache import cached
 from hierarchy import ClassName
+from settings import Config
 import topology_role
 import time
 
@@ -46,6 +47,13 @@ class ExistenceCheck(object):
 		"""
 		self._exists = exists
 
+	def forget(self):
+		"""
+		drop locally cached knowledge about this object without invalidating anything else.
+		:return: None
+		"""
+		self._exists = None
+
 	def exists(self):
 		"""
 		check whether this exists. This information probably cached locally.
@@ -88,6 +96,10 @@ class InfoObj(ExistenceCheck):
 		self.invalidate_exists()
 		self.invalidate_list()
 
+	def forget(self):
+		super(InfoObj, self).forget()
+		self._info = None
+
 	def _fetch_info(self, fetch=False):
 		"""
 		fetch info from server. Do not modify any fields here!
@@ -257,7 +269,7 @@ class UserInfo(InfoObj):
 	__slots__ = ("name", "_usage_obj")
 
 	def invalidate_list(self):
-		get_user_list.invalidate()
+		get_user_list.invalidate_tag(self.name)
 
 	def __init__(self, username):
 		super(UserInfo, self).__init__()
@@ -299,6 +311,9 @@ class UserInfo(InfoObj):
 		if orga is not None:
 			get_organization_info(orga).invalidate_info()
 			get_organization_info(attrs['organization']).invalidate_info()
+		if orga is not None or 'flags' in attrs:
+			# user lists are filtered by organization and flags
+			get_user_list.invalidate()
 		return res
 
 	def _remove(self):
@@ -311,7 +326,7 @@ class OrganizationInfo(InfoObj):
 	__slots__ = ("name", "_usage_obj")
 
 	def invalidate_list(self):
-		get_organization_list.invalidate()
+		get_organization_list.invalidate_tag(self.name)
 
 	def __init__(self, organization_name):
 		super(OrganizationInfo, self).__init__()
@@ -353,7 +368,7 @@ class TopologyInfo(ActionObj):
 	__slots__ = ("topology_id", "_usage_obj")
 
 	def invalidate_list(self):
-		get_topology_list.invalidate()
+		get_topology_list.invalidate_tag(self.topology_id)
 
 	@staticmethod
 	def create(initial_owner):
@@ -420,6 +435,8 @@ class TopologyInfo(ActionObj):
 		res = get_backend_core_proxy().topology_set_permission(self.topology_id, user, role)
 		if self._info is not None:
 			self._info['permissions'][user] = role
+		# topology lists are filtered by permissions
+		get_topology_list.invalidate()
 		return res
 
 	def get_id(self):
@@ -474,7 +491,7 @@ class SiteInfo(InfoObj):
 		return res
 
 	def invalidate_list(self):
-		get_site_list.invalidate()
+		get_site_list.invalidate_tag(self.name)
 
 	def invalidate_exists(self):
 		get_organization_info(self.get_organization_name()).invalidate_info()
@@ -503,6 +520,7 @@ class SiteInfo(InfoObj):
 		if orga is not None:
 			get_organization_info(orga).invalidate_info()
 			get_organization_info(attrs['organization']).invalidate_info()
+			get_site_list.invalidate()
 		return res
 
 	def _remove(self):
@@ -521,7 +539,7 @@ class HostInfo(ActionObj):
 	__slots__ = ("name","_usage_obj")
 
 	def invalidate_list(self):
-		get_host_list.invalidate()
+		get_host_list.invalidate_tag(self.name)
 
 	@staticmethod
 	def create(name, site_info, attrs):
@@ -564,6 +582,7 @@ class HostInfo(ActionObj):
 		if site is not None:
 			get_site_info(site).invalidate_info()
 			get_site_info(attrs['site']).invalidate_info()
+			get_host_list.invalidate()
 		return res
 
 	def _remove(self):
@@ -578,8 +597,11 @@ class HostInfo(ActionObj):
 	def get_clock_offset(self):
 		return self.info()['host_info'].get('time_diff', None)
 
-	def get_dumps(self, after):
-		return get_backend_core_proxy().host_dump_list(self.name, after)
+	def get_dumps(self, after, after_id=None, limit=None, include_data=True):
+		return get_backend_core_proxy().host_dump_list(self.name, after, after_id, limit, include_data)
+
+	def get_dump(self, dump_id):
+		return get_backend_core_proxy().host_dump_info(self.name, dump_id)
 
 	def get_usage(self, hide_no_such_record_error=False):
 		return self._usage_obj.get_usage(hide_no_such_record_error)
@@ -690,7 +712,7 @@ class TemplateInfo(InfoObj):
 	__slots__ = ("template_id")
 
 	def invalidate_list(self):
-		get_template_list.invalidate()
+		get_template_list.invalidate_tag(self.template_id)
 
 	@staticmethod
 	def create(type, name, attrs):
@@ -726,7 +748,7 @@ class ProfileInfo(InfoObj):
 		return res
 
 	def invalidate_list(self):
-		get_profile_list.invalidate()
+		get_profile_list.invalidate_tag(self.profile_id)
 
 	def __init__(self, profile_id):
 		super(ProfileInfo, self).__init__()
@@ -755,7 +777,7 @@ class NetworkInfo(InfoObj):
 		return res
 
 	def invalidate_list(self):
-		get_network_list.invalidate()
+		get_network_list.invalidate_tag(self.kind)
 
 	def __init__(self, kind):
 		super(NetworkInfo, self).__init__()
@@ -783,7 +805,7 @@ class NetworkInstanceInfo(InfoObj):
 		return res
 
 	def invalidate_list(self):
-		get_network_instance_list.invalidate()
+		get_network_instance_list.invalidate_tag(self.niid)
 
 	def __init__(self, network_instance_id):
 		super(NetworkInstanceInfo, self).__init__()
@@ -793,7 +815,10 @@ class NetworkInstanceInfo(InfoObj):
 		return get_backend_core_proxy().network_instance_info(self.niid)
 
 	def _modify(self, attrs):
-		return get_backend_core_proxy().network_instance_modify(self.niid, attrs)
+		res = get_backend_core_proxy().network_instance_modify(self.niid, attrs)
+		if 'network' in attrs or 'host' in attrs:
+			get_network_instance_list.invalidate()
+		return res
 
 	def _remove(self):
 		get_backend_core_proxy().network_instance_remove(self.niid)
@@ -802,6 +827,13 @@ class NetworkInstanceInfo(InfoObj):
 
 
 
+def _ids(key):
+	"""
+	tag a cached list with the ids of its entries, so that it can be invalidated when one of them changes.
+	:param str key: name of the id field of the entries
+	"""
+	return lambda entries: [entry[key] for entry in entries]
+
 @cached(60)
 def get_user_info(username):
 	"""
@@ -812,7 +844,7 @@ def get_user_info(username):
 	"""
 	return UserInfo(username)
 
-@cached(60)
+@cached(60, tags=_ids('name'))
 def get_user_list(organization=None, with_flag=None):
 	"""
 	get the list of users.
@@ -833,7 +865,7 @@ def get_organization_info(organization_name):
 	"""
 	return OrganizationInfo(organization_name)
 
-@cached(1800)
+@cached(1800, tags=_ids('name'))
 def get_organization_list():
 	"""
 	get the list of organizations
@@ -852,7 +884,7 @@ def get_topology_info(topology_id):
 	"""
 	return TopologyInfo(topology_id)
 
-@cached(10)
+@cached(10, tags=_ids('id'))
 def get_topology_list(full=False, organization_filter=None, username_filter=None):
 	"""
 	get the list of topologies
@@ -874,7 +906,7 @@ def get_site_info(site_name):
 	"""
 	return SiteInfo(site_name)
 
-@cached(1800)
+@cached(1800, tags=_ids('name'))
 def get_site_list(organization=None):
 	"""
 	get the list of sites
@@ -894,16 +926,17 @@ def get_host_info(host_name):
 	"""
 	return HostInfo(host_name)
 
-@cached(1)
-def get_host_list(site=None, organization=None):
+@cached(1, tags=_ids('name'))
+def get_host_list(site=None, organization=None, unhealthy=False):
 	"""
 	get the list of hosts, filtered by site or organization, if requested.
 	:param str site: site filter
 	:param str organization: organization filter
+	:param bool unhealthy: only hosts with problems
 	:return: list of hosts
 	:rtype: list(dict)
 	"""
-	return get_backend_core_proxy().host_list(site, organization)
+	return get_backend_core_proxy().host_list(site, organization, unhealthy)
 
 @cached(1800)
 def get_element_info(element_id):
@@ -935,7 +968,7 @@ def get_template_info(template_id):
 	"""
 	return TemplateInfo(template_id)
 
-@cached(1)
+@cached(1, tags=_ids('id'))
 def get_template_list(type=None):
 	"""
 	get the list of all templates
@@ -955,7 +988,7 @@ def get_profile_info(profile_id):
 	"""
 	return ProfileInfo(profile_id)
 
-@cached(1)
+@cached(1, tags=_ids('id'))
 def get_profile_list(type=None):
 	"""
 	get the list of all profile
@@ -966,7 +999,7 @@ def get_profile_list(type=None):
 	return get_backend_core_proxy().profile_list(type)
 
 
-@cached(1800)
+@cached(1800, tags=lambda id_: [id_])
 def _template_id(type, name):
 	"""
 	get template id by type and name
@@ -990,7 +1023,7 @@ def get_template_info_by_typename(type, name):
 	return get_template_info(_template_id(type, name))
 
 
-@cached(1800)
+@cached(1800, tags=lambda id_: [id_])
 def _profile_id(type, name):
 	"""
 	get profile id by tech and name
@@ -1024,7 +1057,7 @@ def get_network_info(kind):
 	"""
 	return NetworkInfo(kind)
 
-@cached(1800)
+@cached(1800, tags=_ids('kind'))
 def get_network_list():
 	"""
 	get the list of networks
@@ -1043,7 +1076,7 @@ def get_network_instance_info(network_instance_id):
 	"""
 	return NetworkInstanceInfo(network_instance_id)
 
-@cached(1800)
+@cached(1800, tags=_ids('id'))
 def get_network_instance_list(network=None, host=None):
 	"""
 	get the list of network instances
@@ -1053,3 +1086,70 @@ def get_network_instance_list(network=None, host=None):
 	:rtype: list(dict)
 	"""
 	return get_backend_core_proxy().network_instance_list(network, host)
+
+
+
+
+# caches that can be kept up to date by the change feed (see changefeed.py) of the module that owns the objects.
+# {class_name: (tomato_module, info object getter, list getters)}
+_CHANGE_TARGETS = {
+	ClassName.USER: (Config.TOMATO_MODULE_BACKEND_USERS, get_user_info, (get_user_list,)),
+	ClassName.ORGANIZATION: (Config.TOMATO_MODULE_BACKEND_USERS, get_organization_info, (get_organization_list,)),
+	ClassName.TOPOLOGY: (Config.TOMATO_MODULE_BACKEND_CORE, get_topology_info, (get_topology_list,)),
+	ClassName.SITE: (Config.TOMATO_MODULE_BACKEND_CORE, get_site_info, (get_site_list,)),
+	ClassName.HOST: (Config.TOMATO_MODULE_BACKEND_CORE, get_host_info, (get_host_list,)),
+	ClassName.ELEMENT: (Config.TOMATO_MODULE_BACKEND_CORE, get_element_info, ()),
+	ClassName.CONNECTION: (Config.TOMATO_MODULE_BACKEND_CORE, get_connection_info, ()),
+	ClassName.TEMPLATE: (Config.TOMATO_MODULE_BACKEND_CORE, get_template_info, (get_template_list, _template_id)),
+	ClassName.PROFILE: (Config.TOMATO_MODULE_BACKEND_CORE, get_profile_info, (get_profile_list, _profile_id)),
+	ClassName.NETWORK: (Config.TOMATO_MODULE_BACKEND_CORE, get_network_info, (get_network_list,)),
+	ClassName.NETWORK_INSTANCE: (Config.TOMATO_MODULE_BACKEND_CORE, get_network_instance_info, (get_network_instance_list,)),
+}
+
+_default_list_timeouts = {list_fn: list_fn.get_timeout() for (_, _, list_fns) in _CHANGE_TARGETS.values() for list_fn in list_fns}
+
+def apply_change(class_name, id_, membership=False):
+	"""
+	invalidate everything that is cached locally about an object that has been changed by its owning module.
+	Unlike invalidate_info, this only affects list entries that contain the object.
+	:param str class_name: class of the object as in ClassName
+	:param str id_: id of the object
+	:param bool membership: if True, the object may have been added to or removed from lists. All lists of this class are invalidated.
+	:return: None
+	"""
+	if class_name not in _CHANGE_TARGETS:
+		return
+	_, info_fn, list_fns = _CHANGE_TARGETS[class_name]
+	obj = info_fn.peek(id_)
+	if obj is not None:
+		obj.forget()
+	for list_fn in list_fns:
+		if membership:
+			list_fn.invalidate()
+		else:
+			list_fn.invalidate_tag(id_)
+
+def reset_caches(tomato_module):
+	"""
+	invalidate all info and lists about objects of the given module.
+	:param str tomato_module: owning module as in Config
+	:return: None
+	"""
+	for module, info_fn, list_fns in _CHANGE_TARGETS.values():
+		if module == tomato_module:
+			info_fn.invalidate()
+			for list_fn in list_fns:
+				list_fn.invalidate()
+
+def set_list_timeout(tomato_module, timeout=None):
+	"""
+	change the cache timeout of all lists of objects of the given module.
+	Lists can be cached a lot longer while the change feed of this module is followed.
+	:param str tomato_module: owning module as in Config
+	:param timeout: new timeout in seconds. None restores the default.
+	:return: None
+	"""
+	for module, _, list_fns in _CHANGE_TARGETS.values():
+		if module == tomato_module:
+			for list_fn in list_fns:
+				list_fn.set_timeout(timeout if timeout is not None else _default_list_timeouts[list_fn])
@@ -1,4 +1,4 @@
-import ssl, socket, SocketServer, inspect, threading, thread, sys, msgpack, snappy
+import ssl, socket, SocketServer, inspect, threading, sys, time, itertools, weakref, Queue, struct, msgpack, snappy
 
 if msgpack.version < (0, 4, 0):
 	print >>sys.stderr, "Warning: Older msgpack-python versions are broken"
@@ -70,9 +70,10 @@ class SSLConnection:
 		except:
 			raise NetworkError(NetworkError.ReadError)
 
-	def write(self, data):
+	def write(self, *chunks):
 		try:
-			self.wfile.write(data)
+			for data in chunks:
+				self.wfile.write(data)
 		except:
 			raise NetworkError(NetworkError.WriteError)
 
@@ -118,6 +119,7 @@ class MessageError(Exception):
 	InvalidReplyTypeType = 8
 	InvalidErrorType = 9
 	UnknownReplyType = 10
+	MissingBatchResult = 11
 
 	def __init__(self, code, id=None):
 		self.code = code
@@ -145,6 +147,9 @@ class TimedOut(Exception):
 	def __init__(self):
 		pass
 
+	def __str__(self):
+		return "Timed out"
+
 
 class Failure(Exception):
 	def __init__(self, data):
@@ -154,6 +159,69 @@ class Failure(Exception):
 		return "Failure: %s" % self.data
 
 
+FRAME_HEADER = struct.Struct(">I") # encoding (8 bits) and payload size (24 bits)
+MAX_FRAME_SIZE = (1 << 24) - 1
+SCATTER_MIN_SIZE = 1 << 16 # larger payloads are written separately from their header instead of being copied
+READ_CHUNK_SIZE = 1 << 16 # larger payloads are read in chunks of this size and decoded as a stream
+COMPRESS_MIN_SIZE = 1024 # smaller payloads are never compressed
+COMPRESS_SAMPLE_SIZE = 4096
+COMPRESS_MIN_RATIO = 0.9 # payloads are only compressed if this saves at least 10%
+
+
+def _compress(data):
+	"""
+	select the encoding of a payload.
+	Large payloads are only compressed if a sample of them is compressible, e.g. already compressed
+	data is sent as it is.
+	:return: (encoding, payload)
+	"""
+	if len(data) < COMPRESS_MIN_SIZE:
+		return Message.Encoding.Raw, data
+	if len(data) > 2 * COMPRESS_SAMPLE_SIZE:
+		start = (len(data) - COMPRESS_SAMPLE_SIZE) // 2
+		sample = data[start:start + COMPRESS_SAMPLE_SIZE]
+		if len(snappy.compress(sample)) > COMPRESS_MIN_RATIO * len(sample):
+			return Message.Encoding.Raw, data
+	compressed = snappy.compress(data)
+	if len(compressed) > COMPRESS_MIN_RATIO * len(data):
+		return Message.Encoding.Raw, data
+	return Message.Encoding.Snappy, compressed
+
+
+def _unpack(con, size):
+	"""
+	read and decode a raw payload.
+	Large payloads are fed into an Unpacker in chunks, so they are never held as one string.
+	The Unpacker and its buffer are reused for all messages of a connection.
+	"""
+	if size <= READ_CHUNK_SIZE:
+		try:
+			return msgpack.unpackb(con.read(size))
+		except Exception:
+			raise FramingError(FramingError.InvalidFormatedData)
+	unpacker = getattr(con, "unpacker", None)
+	if unpacker is None:
+		unpacker = con.unpacker = msgpack.Unpacker()
+	while size:
+		chunk = con.read(min(size, READ_CHUNK_SIZE))
+		unpacker.feed(chunk)
+		size -= len(chunk)
+	try:
+		data = unpacker.unpack()
+	except Exception:
+		con.unpacker = None
+		raise FramingError(FramingError.InvalidFormatedData)
+	try:
+		unpacker.unpack()
+	except msgpack.OutOfData:
+		# the frame contained exactly one object
+		return data
+	except Exception:
+		pass
+	con.unpacker = None
+	raise FramingError(FramingError.InvalidFormatedData)
+
+
 class Message:
 	def encode(self):
 		raise NotImplementedError()
@@ -163,38 +231,34 @@ class Message:
 		Snappy = 1
 
 	def writeTo(self, con):
-		bytes = msgpack.packb(self.encode())
-		method = Message.Encoding.Raw
-		if len(bytes) > 100:
-			compressed = snappy.compress(bytes)
-			if len(compressed) < len(bytes):
-				bytes = compressed
-				method = Message.Encoding.Snappy
+		method, bytes = _compress(msgpack.packb(self.encode()))
 		size = len(bytes)
-		con.write(chr(method) + chr(size>>16) + chr((size>>8) & 0xff) + chr(size & 0xff) + bytes)
+		if size > MAX_FRAME_SIZE:
+			raise FramingError(FramingError.MessageTooLarge)
+		header = FRAME_HEADER.pack((method << 24) | size)
+		if size < SCATTER_MIN_SIZE:
+			con.write(header + bytes)
+		else:
+			con.write(header, bytes)
 
 	@classmethod
 	def readFrom(cls, con):
-		header = con.read(4)
-		method = ord(header[0])
-		size = (ord(header[1]) << 16) + (ord(header[2]) << 8) + (ord(header[3]))
-		bytes = con.read(size)
+		method, size = divmod(FRAME_HEADER.unpack(con.read(4))[0], 1 << 24)
 		if method == Message.Encoding.Raw:
-			pass
+			data = _unpack(con, size)
 		elif method == Message.Encoding.Snappy:
 			try:
-				bytes = snappy.uncompress(bytes)
+				bytes = snappy.uncompress(con.read(size))
 			except snappy.UncompressError:
 				raise FramingError(FramingError.InvalidCompressedData)
-			size = len(bytes)
-			if size >= 1<<24:
+			if len(bytes) > MAX_FRAME_SIZE:
 				raise FramingError(FramingError.MessageTooLarge)
+			try:
+				data = msgpack.unpackb(bytes)
+			except Exception:
+				raise FramingError(FramingError.InvalidFormatedData)
 		else:
 			raise FramingError(FramingError.UnknownEncoding)
-		try:
-			data = msgpack.unpackb(bytes)
-		except msgpack.UnpackException:
-			raise FramingError(FramingError.InvalidFormatedData)
 		return cls.decode(data)
 
 
@@ -214,6 +278,8 @@ class Request(Message, object):
 	def decode(cls, val):
 		if not isinstance(val, (tuple, list)):
 			raise MessageError(MessageError.InvalidBaseType)
+		if len(val) == 2:
+			return BatchRequest.decode(val)
 		if len(val) != 4:
 			raise MessageError(MessageError.InvalidBaseSize)
 		id, method, args, kwargs = val
@@ -231,6 +297,33 @@ class Request(Message, object):
 		return cls(id, method, args, kwargs)
 
 
+class BatchRequest(Message, object):
+	"""
+	Several calls in one message.
+	The server answers with one Reply whose value is a list of [result, value], one for each call.
+	"""
+	__slots__ = ("id", "calls")
+
+	def __init__(self, id, calls):
+		self.id = id
+		self.calls = calls
+
+	def encode(self):
+		return (self.id, [(call.method, call.args, call.kwargs) for call in self.calls])
+
+	@classmethod
+	def decode(cls, val):
+		id, calls = val
+		if not isinstance(id, int):
+			raise MessageError(MessageError.InvalidIdType)
+		if not isinstance(calls, (list, tuple)):
+			raise MessageError(MessageError.InvalidArgsType, id)
+		for call in calls:
+			if not isinstance(call, (list, tuple)) or len(call) != 3:
+				raise MessageError(MessageError.InvalidBaseSize, id)
+		return cls(id, [Request.decode([id] + list(call)) for call in calls])
+
+
 class Reply(Message, object):
 	__slots__ = ("id", "result", "value")
 
@@ -301,9 +394,86 @@ class DummyWrapper:
 		pass
 
 
+class WorkerPool:
+	"""
+	A bounded pool of threads that executes the requests of all connections of a server.
+	Threads are started when all existing threads are busy, up to maxWorkers.
+	"""
+	def __init__(self, maxWorkers=50):
+		self.maxWorkers = maxWorkers
+		self._queue = Queue.Queue()
+		self._lock = threading.RLock()
+		self.workers = 0
+		self.idle = 0
+		self.busy = 0
+		self.executed = 0
+		self.maxDelay = 0.0
+
+	def submit(self, fn, *args):
+		"""
+		queue fn(queued, *args) for execution. queued is the time when the call has been submitted.
+		"""
+		self._queue.put((time.time(), fn, args))
+		with self._lock:
+			if self.idle >= self._queue.qsize() or self.workers >= self.maxWorkers:
+				return
+			self.workers += 1
+		worker = threading.Thread(target=self._run, name="sslrpc2 worker")
+		worker.daemon = True
+		worker.start()
+
+	def _run(self):
+		while True:
+			with self._lock:
+				self.idle += 1
+			queued, fn, args = self._queue.get()
+			with self._lock:
+				self.idle -= 1
+				self.busy += 1
+				self.maxDelay = max(self.maxDelay, time.time() - queued)
+			try:
+				fn(queued, *args)
+			except:
+				import traceback
+				traceback.print_exc()
+			finally:
+				with self._lock:
+					self.busy -= 1
+					self.executed += 1
+
+	def info(self):
+		with self._lock:
+			info = {
+				"max_workers": self.maxWorkers,
+				"workers": self.workers,
+				"busy": self.busy,
+				"queued": self._queue.qsize(),
+				"executed": self.executed,
+				"max_delay": self.maxDelay
+			}
+			self.maxDelay = 0.0
+			return info
+
+
 class Server(SocketServer.ThreadingMixIn, SSLServer):
-	def __init__(self, server_address, certCheck=None, wrapper=DummyWrapper(), beforeExecute=None, afterExecute=None, onError=None, **sslargs):
+	def __init__(self, server_address, certCheck=None, wrapper=DummyWrapper(), beforeExecute=None, afterExecute=None, onError=None,
+				 maxWorkers=50, connectionQueueSize=20, requestTimeout=None, batchParallelism=4, **sslargs):
+		"""
+		:param int maxWorkers: maximum number of requests that are executed at the same time
+		:param int connectionQueueSize: maximum number of unfinished requests per connection. No more requests are read from
+		                                a connection until one of its requests has been answered.
+		:param requestTimeout: requests that have been queued for longer than this many seconds are answered with a
+		                       failure instead of being executed. None for no timeout.
+		:param int batchParallelism: maximum number of calls of one batch that are executed at the same time
+		"""
 		SSLServer.__init__(self, server_address, Handler, **sslargs)
+		self.pool = WorkerPool(maxWorkers)
+		self.connectionQueueSize = connectionQueueSize
+		self.requestTimeout = requestTimeout
+		self.batchParallelism = batchParallelism
+		self.timedOut = 0
+		self.blockedConnections = 0
+		self.statsLock = threading.RLock()
 		self.beforeExecute = beforeExecute
 		self.afterExecute = afterExecute
 		self.wrapper = wrapper
@@ -314,6 +484,7 @@ class Server(SocketServer.ThreadingMixIn, SSLServer):
 		self.register(self._list, "$list$")
 		self.register(self._info, "$info$")
 		self.register(self._infoall, "$infoall$")
+		self.register(self.info, "$stats$")
 
 	def register(self, func, name=None):
 		if not callable(func):
@@ -345,11 +516,15 @@ class Server(SocketServer.ThreadingMixIn, SSLServer):
 	def getMethod(self, name):
 		return self.funcs.get(name)
 
-	def handleRequest(self, request):
+	def handleRequest(self, request, queued=None):
 		method = self.getMethod(request.method)
 		if not method:
 			raise NoSuchMethodError(request.method)
 		try:
+			if self.requestTimeout and queued and time.time() - queued > self.requestTimeout:
+				with self.statsLock:
+					self.timedOut += 1
+				raise TimedOut()
 			if callable(self.beforeExecute):
 				self.beforeExecute(method, request.args, request.kwargs)
 			res = method(*request.args, **request.kwargs)
@@ -375,13 +550,43 @@ class Server(SocketServer.ThreadingMixIn, SSLServer):
 	def _infoall(self):
 		return dict([(key, method_info(func)) for (key, func) in self.funcs.iteritems()])
 
+	def info(self):
+		"""
+		statistics of the request execution.
+		max_delay is the maximal time a request waited for execution since the last call.
+		"""
+		with self.children_lock:
+			connections = len(self.children)
+		with self.statsLock:
+			return {
+				"pool": self.pool.info(),
+				"connections": connections,
+				"blocked_connections": self.blockedConnections,
+				"connection_queue_size": self.connectionQueueSize,
+				"request_timeout": self.requestTimeout,
+				"timed_out": self.timedOut
+			}
+
 
 class Handler(SocketServer.StreamRequestHandler):
 	def __init__(self, *args, **kwargs):
 		self._wlock = threading.RLock()
 		self.failed = False
+		self._slots = None
 		SocketServer.StreamRequestHandler.__init__(self, *args, **kwargs)
 
+	def _acquireSlot(self):
+		if self._slots.acquire(blocking=False):
+			return
+		# backpressure: stop reading until one of the requests of this connection has been answered
+		with self.server.statsLock:
+			self.server.blockedConnections += 1
+		try:
+			self._slots.acquire()
+		finally:
+			with self.server.statsLock:
+				self.server.blockedConnections -= 1
+
 	def handle(self):
 		if callable(self.server.certCheck):
 			if not self.server.certCheck(self.connection.getpeercert()):
@@ -389,7 +594,9 @@ class Handler(SocketServer.StreamRequestHandler):
 				self.server.delSession()
 				return
 		self.server.session = None
+		self._slots = threading.Semaphore(self.server.connectionQueueSize)
 		while self.server.running and not self.failed:
+			self._acquireSlot()
 			try:
 				request = Request.readFrom(self)
 			except ConnectionEnded:
@@ -400,6 +607,7 @@ class Handler(SocketServer.StreamRequestHandler):
 				break
 			except MessageError as err:
 				reply = Reply(err.id, Reply.Result.RequestError, err.code)
+				self._slots.release()
 				try:
 					reply.writeTo(self)
 					continue
@@ -409,25 +617,36 @@ class Handler(SocketServer.StreamRequestHandler):
 				import traceback
 				traceback.print_exc()
 				break
-			thread.start_new_thread(self.handleRequest, (request, self.server.session))
+			if isinstance(request, BatchRequest):
+				_BatchExecution(self, request, self.server.session).start()
+			else:
+				self.server.pool.submit(self.handleRequest, request, self.server.session)
 		self.server.delSession()
 
-	def handleRequest(self, request, session):
+	def handleRequest(self, queued, request, session):
+		try:
+			self.writeReply(self.execute(queued, request, session))
+		finally:
+			self._slots.release()
+
+	def execute(self, queued, request, session):
 		with self.server.wrapper:
 			self.server.session = session
 			try:
-				result = self.server.handleRequest(request)
-				reply = Reply(request.id, Reply.Result.Success, result)
+				result = self.server.handleRequest(request, queued)
+				return Reply(request.id, Reply.Result.Success, result)
 			except NoSuchMethodError as err:
-				reply = Reply(request.id, Reply.Result.NoSuchMethod, err.method)
+				return Reply(request.id, Reply.Result.NoSuchMethod, err.method)
 			except Failure as err:
-				reply = Reply(request.id, Reply.Result.Failure, err.data)
+				return Reply(request.id, Reply.Result.Failure, err.data)
 			except Exception as err:
-				reply = Reply(request.id, Reply.Result.Failure, {"type": str(type(err)), "message": str(err)})
+				return Reply(request.id, Reply.Result.Failure, {"type": str(type(err)), "message": str(err)})
+
+	def writeReply(self, reply):
 		try:
 			reply.writeTo(self)
 		except Exception as err:
-			reply = Reply(request.id, Reply.Result.Failure, {"type": str(type(err)), "message": str(err)})
+			reply = Reply(reply.id, Reply.Result.Failure, {"type": str(type(err)), "message": str(err)})
 			try:
 				reply.writeTo(self)
 			except:
@@ -442,108 +661,418 @@ class Handler(SocketServer.StreamRequestHandler):
 		except:
 			raise NetworkError(NetworkError.ReadError)
 
-	def write(self, data):
+	def write(self, *chunks):
 		try:
 			with self._wlock:
-				self.wfile.write(data)
+				for data in chunks:
+					self.wfile.write(data)
 				self.wfile.flush()
 		except:
 			raise NetworkError(NetworkError.WriteError)
 
 
+class _BatchExecution:
+	"""
+	Executes the calls of a batch request in the worker pool.
+	Up to batchParallelism workers take calls from the batch, whoever finishes the last call sends the reply.
+	Workers that start after all calls have been taken have nothing to do, so a batch never waits for workers.
+	"""
+	def __init__(self, handler, request, session):
+		self.handler = handler
+		self.request = request
+		self.session = session
+		self.results = [None] * len(request.calls)
+		self.remaining = len(request.calls)
+		self.calls = iter(enumerate(request.calls))
+		self.lock = threading.RLock()
+
+	def start(self):
+		if not self.remaining:
+			self.finish()
+			return
+		for _ in xrange(min(self.remaining, max(1, self.handler.server.batchParallelism))):
+			self.handler.server.pool.submit(self.work)
+
+	def work(self, queued):
+		while True:
+			with self.lock:
+				try:
+					index, call = next(self.calls)
+				except StopIteration:
+					return
+			reply = self.handler.execute(queued, call, self.session)
+			with self.lock:
+				self.results[index] = [reply.result, reply.value]
+				self.remaining -= 1
+				if self.remaining:
+					continue
+			self.finish()
+			return
+
+	def finish(self):
+		try:
+			self.handler.writeReply(Reply(self.request.id, Reply.Result.Success, self.results))
+		finally:
+			self.handler._slots.release()
+
+
+_callbackLock = threading.Lock()
+_callbackPool = WorkerPool(maxWorkers=10)
+
+class PendingCall(object):
+	"""
+	A request that has been sent and is waiting for its reply, i.e. the future of a call.
+	Many calls can be pending at once without a thread per call, use wait_all() and as_completed() to
+	wait for several calls.
+	"""
+	__slots__ = ("deadline", "_onError", "_event", "_value", "_error", "_callbacks")
+
+	def __init__(self, deadline=None, onError=None):
+		self.deadline = deadline
+		self._onError = onError
+		self._event = threading.Event()
+		self._value = None
+		self._error = None
+		self._callbacks = []
+
+	def _done(self):
+		with _callbackLock:
+			if self._event.is_set():
+				return
+			self._event.set()
+			callbacks, self._callbacks = self._callbacks, None
+		for callback, inline in callbacks:
+			if inline:
+				callback(self)
+			else:
+				_callbackPool.submit(lambda queued, callback=callback: callback(self))
+
+	def add_done_callback(self, callback, inline=False):
+		"""
+		call callback(call) when the call is done.
+		Callbacks are executed by a small thread pool, they may block and make other calls.
+		Inline callbacks are executed by the thread that received the reply and must never block.
+		"""
+		with _callbackLock:
+			if not self._event.is_set():
+				self._callbacks.append((callback, inline))
+				return
+		if inline:
+			callback(self)
+		else:
+			_callbackPool.submit(lambda queued: callback(self))
+
+	def done(self):
+		return self._event.is_set()
+
+	def resolve(self, reply):
+		if reply.result == Reply.Result.Success:
+			self._value = reply.value
+		elif reply.result == Reply.Result.Failure:
+			self._error = reply.value
+		elif reply.result == Reply.Result.RequestError:
+			self._error = MessageError(reply.value)
+		elif reply.result == Reply.Result.NoSuchMethod:
+			self._error = NoSuchMethodError(reply.value)
+		self._done()
+
+	def fail(self, error):
+		self._error = error
+		self._done()
+
+	def wait(self, timeout=None):
+		"""
+		wait for the reply.
+		:return: whether the call succeeded
+		:raises TimedOut: if there is no reply within timeout seconds
+		"""
+		if not self._event.wait(timeout):
+			raise TimedOut()
+		return self._error is None
+
+	def get(self, timeout=None):
+		"""
+		wait for the reply.
+		:return: the result of the call
+		:raises: the error of the call, converted by onError
+		"""
+		if not self.wait(timeout):
+			raise self._onError(self._error) if self._onError else self._error
+		return self._value
+
+	result = get
+
+	def exception(self, timeout=None):
+		"""
+		wait for the reply.
+		:return: the error of the call, converted by onError, or None if it succeeded
+		"""
+		if self.wait(timeout):
+			return None
+		return self._onError(self._error) if self._onError else self._error
+
+
+def wait_all(calls, timeout=None):
+	"""
+	wait until all calls are done.
+	:param list calls: PendingCall objects
+	:param timeout: maximal time to wait in seconds, None to wait forever
+	:return: whether all calls are done
+	"""
+	deadline = time.time() + timeout if timeout is not None else None
+	for call in calls:
+		try:
+			call.wait(max(0, deadline - time.time()) if deadline is not None else None)
+		except TimedOut:
+			return False
+	return True
+
+
+def as_completed(calls, timeout=None):
+	"""
+	iterate over calls in the order they are done.
+	:param list calls: PendingCall objects
+	:param timeout: maximal time to wait in seconds, None to wait forever
+	:raises TimedOut: if not all calls are done within timeout seconds
+	"""
+	calls = list(calls)
+	deadline = time.time() + timeout if timeout is not None else None
+	done = Queue.Queue()
+	for call in calls:
+		call.add_done_callback(done.put, inline=True)
+	for _ in xrange(len(calls)):
+		if deadline is None:
+			yield done.get()
+			continue
+		try:
+			yield done.get(timeout=max(0, deadline - time.time()))
+		except Queue.Empty:
+			raise TimedOut()
+
+
+class Channel:
+	"""
+	One connection of a Proxy.
+	Requests are pipelined, a reader thread dispatches the replies to the pending calls.
+	If the connection fails, only the calls pending on this channel fail.
+	"""
+	def __init__(self, address, **sslargs):
+		self._con = SSLConnection(address, timeout=None, **sslargs)
+		self._wlock = threading.RLock()
+		self._lock = threading.RLock()
+		self._pending = {}
+		self._ping = None
+		self.closed = False
+		self.lastActivity = time.time()
+		reader = threading.Thread(target=self._readLoop, name="sslrpc2 reader %s:%d" % address)
+		reader.daemon = True
+		reader.start()
+
+	@property
+	def outstanding(self):
+		return len(self._pending)
+
+	def send(self, request, pending):
+		"""
+		send a request. Its reply will resolve the given PendingCall.
+		:raises NetworkError: if the request could not be sent.
+		"""
+		with self._lock:
+			if self.closed:
+				raise NetworkError(NetworkError.WriteError)
+			self._pending[request.id] = pending
+		try:
+			with self._wlock:
+				request.writeTo(self._con)
+		except NetworkError, err:
+			self.close(err)
+			raise
+		self.lastActivity = time.time()
+
+	def _readLoop(self):
+		while not self.closed:
+			try:
+				reply = Reply.readFrom(self._con)
+			except Exception, err:
+				if not isinstance(err, NetworkError):
+					err = NetworkError(NetworkError.ReadError)
+				self.close(err)
+				return
+			self.lastActivity = time.time()
+			with self._lock:
+				pending = self._pending.pop(reply.id, None)
+			if pending:
+				pending.resolve(reply)
+
+	def ping(self, request, pending):
+		"""
+		send a heartbeat request. If it is not answered before its deadline, the connection is dead.
+		"""
+		self._ping = request.id
+		self.send(request, pending)
+
+	def expire(self, now):
+		"""
+		fail the calls that have passed their deadline, the other calls on this channel are not affected.
+		:return: whether the connection is dead, i.e. the heartbeat has not been answered
+		"""
+		with self._lock:
+			expired = [id_ for id_, p in self._pending.iteritems() if p.deadline is not None and p.deadline < now]
+			calls = [self._pending.pop(id_) for id_ in expired]
+		for p in calls:
+			p.fail(TimedOut())
+		return self._ping in expired
+
+	def close(self, error=None):
+		with self._lock:
+			if self.closed:
+				return
+			self.closed = True
+			pending, self._pending = self._pending, {}
+		try:
+			self._con.socket.shutdown(socket.SHUT_RDWR)
+		except:
+			pass
+		try:
+			self._con.close()
+		except:
+			pass
+		for p in pending.itervalues():
+			p.fail(error or NetworkError(NetworkError.ReadError))
+
+
 class Proxy:
-	def __init__(self, address, onError=(lambda x: x), timeout=60, **sslargs):
-		self._con = None
+	"""
+	Client for a sslrpc2 server.
+	Calls are spread over up to poolSize connections, each call is routed to the connection with the
+	least outstanding requests. Connections are opened when needed and replaced when they fail.
+	Idle connections are checked by calling 'ping' every heartbeat seconds.
+	"""
+	def __init__(self, address, onError=(lambda x: x), timeout=60, poolSize=1, heartbeat=None, **sslargs):
 		self._onError = onError
 		self._address = address
 		self._sslargs = sslargs
 		self._timeout = timeout
-		self._reconnect()
-		self._id = 0
-		self._rlock = threading.RLock()
-		self._wlock = threading.RLock()
-		self._resLock = threading.RLock()
-		self._resCond = threading.Condition(self._resLock)
-		self._results = {}
-		self._errors = {}
-		self._waiting = set()
-
-	def _reconnect(self):
+		self._poolSize = max(1, poolSize)
+		self._heartbeat = heartbeat
+		self._ids = itertools.count(1)
+		self._lock = threading.RLock()
+		self._channels = []
+		self._connecting = 0
+		self._channels.append(self._connect())
+		_monitor(self)
+
+	def _connect(self):
 		try:
-			self._con = SSLConnection(self._address, timeout=self._timeout, **self._sslargs)
+			return Channel(self._address, **self._sslargs)
 		except socket.error, err:
 			raise self._onError(NetworkError(NetworkError.ReadError))
 
+	def _channel(self):
+		with self._lock:
+			self._channels = [c for c in self._channels if not c.closed]
+			best = min(self._channels, key=lambda c: c.outstanding) if self._channels else None
+			if best is not None and (not best.outstanding or len(self._channels) + self._connecting >= self._poolSize):
+				return best
+			self._connecting += 1
+		try:
+			channel = self._connect()
+		finally:
+			with self._lock:
+				self._connecting -= 1
+		with self._lock:
+			self._channels.append(channel)
+		return channel
+
 	def _nextId(self):
-		with self._wlock:
-			self._id += 1
-			return self._id
+		return next(self._ids)
 
-	def _callInternal(self, name, args=None, kwargs=None):
-		if not kwargs: kwargs = {}
-		if not args: args = []
-		with self._wlock:
-			request_id = self._nextId()
-			request = Request(request_id, name, args, kwargs)
-			request.writeTo(self._con)
-		with self._resLock:
-			self._waiting.add(request_id)
-		while True:
-			with self._resLock:
-				# Check if our response is there
-				if request_id in self._results:
-					result = self._results[request_id]
-					del self._results[request_id]
-					self._waiting.remove(request_id)
-					return result
-				if request_id in self._errors:
-					error = self._errors[request_id]
-					del self._errors[request_id]
-					self._waiting.remove(request_id)
-					raise self._onError(error)
-			if self._rlock.acquire(blocking=False):
-				# We are waiting for a message
-				try:
-					response = Reply.readFrom(self._con)
-					with self._resLock:
-						# Save response
-						if response.result == Reply.Result.Success:
-							self._results[response.id] = response.value
-						elif response.result == Reply.Result.Failure:
-							self._errors[response.id] = response.value
-						elif response.result == Reply.Result.RequestError:
-							self._errors[response.id] = MessageError(response.value)
-						elif response.result == Reply.Result.NoSuchMethod:
-							self._errors[response.id] = NoSuchMethodError(response.value)
-						# Notify everyone who is waiting for responses
-						self._resCond.notifyAll()
-				except:
-					with self._resLock:
-						for id in self._waiting:
-							self._errors[id] = NetworkError(NetworkError.ReadError)
-						self._resCond.notifyAll()
-				finally:
-					self._rlock.release()
-			else:
-				# Someone else is waiting for a message
-				with self._resCond:
-					# Wait for a message to come in
-					self._resCond.wait()
+	def _pending(self, timeout=None):
+		timeout = timeout or self._timeout
+		return PendingCall(time.time() + timeout if timeout else None, self._onError)
 
-	def _call(self, name, args=None, kwargs=None):
-		if not kwargs: kwargs = {}
-		if not args: args = []
+	def _send(self, request, timeout=None):
+		"""
+		send a request (or batch request) and return its PendingCall.
+		Requests that could not be sent are tried again on another connection.
+		"""
 		tries = 3
 		while True:
+			pending = self._pending(timeout)
 			try:
-				return self._callInternal(name, args, kwargs)
+				self._channel().send(request, pending)
+				return pending
 			except NetworkError:
+				# the request has not been sent, try again on another connection
 				tries -= 1
 				if tries == 0:
 					raise
-				self._reconnect()
-			except Exception, err:
-				raise self._onError(err), None, sys.exc_info()[2]
+
+	def _call(self, name, args=None, kwargs=None):
+		if not kwargs: kwargs = {}
+		if not args: args = []
+		try:
+			pending = self._send(Request(self._nextId(), name, args, kwargs))
+		except Exception, err:
+			raise self._onError(err), None, sys.exc_info()[2]
+		return pending.get()
+
+	def _submit(self, name, args=None, kwargs=None):
+		if not kwargs: kwargs = {}
+		if not args: args = []
+		try:
+			return self._send(Request(self._nextId(), name, args, kwargs))
+		except Exception, err:
+			pending = self._pending()
+			pending.fail(err)
+			return pending
+
+	def batch(self):
+		"""
+		collect calls and send them in one message.
+		Calls on the batch return PendingCall objects that can be read with get() after the batch has been executed:
+
+		with proxy.batch() as batch:
+			calls = [batch.resource_modify(id_, attrs) for id_, attrs in changes]
+		results = [call.get() for call in calls]
+
+		The calls are executed independently, i.e. a failing call does not affect the others.
+		:rtype: Batch
+		"""
+		return Batch(self)
+
+	def _check(self, now):
+		"""
+		called regularly by the monitor thread.
+		fails calls that have timed out, sends heartbeats on idle connections and closes connections
+		whose heartbeat has not been answered.
+		"""
+		with self._lock:
+			channels = list(self._channels)
+		for channel in channels:
+			if channel.closed:
+				continue
+			if channel.expire(now):
+				channel.close(NetworkError(NetworkError.ReadError))
+			elif self._heartbeat and not channel.outstanding and now - channel.lastActivity > self._heartbeat:
+				try:
+					channel.ping(Request(self._nextId(), "ping", [], {}), PendingCall(now + self._heartbeat))
+				except NetworkError:
+					pass
+
+	def info(self):
+		with self._lock:
+			return {
+				"address": "%s:%d" % self._address,
+				"pool_size": self._poolSize,
+				"connections": [{"outstanding": c.outstanding, "last_activity": c.lastActivity} for c in self._channels if not c.closed]
+			}
+
+	def close(self):
+		with self._lock:
+			channels, self._channels = self._channels, []
+		for channel in channels:
+			channel.close()
 
 	def _listMethods(self):
 		return self._call("$list$")
@@ -556,11 +1085,106 @@ class Proxy:
 
 	def __del__(self):
 		try:
-			self._con.close()
+			self.close()
 		except:
 			pass
 
 
+MONITOR_INTERVAL = 1.0
+_proxies = {} # {id: weakref to Proxy}
+_proxiesLock = threading.Lock()
+_monitorThread = None
+
+def _monitorLoop():
+	while True:
+		time.sleep(MONITOR_INTERVAL)
+		now = time.time()
+		with _proxiesLock:
+			proxies = [ref() for ref in _proxies.values()]
+		for proxy in proxies:
+			if proxy is None:
+				continue
+			try:
+				proxy._check(now)
+			except:
+				pass
+		# do not keep the proxies alive while sleeping
+		proxies = proxy = None
+
+def _monitor(proxy):
+	global _monitorThread
+	key = id(proxy)
+	def remove(ref):
+		with _proxiesLock:
+			if _proxies.get(key) is ref:
+				del _proxies[key]
+	with _proxiesLock:
+		_proxies[key] = weakref.ref(proxy, remove)
+		if not _monitorThread:
+			_monitorThread = threading.Thread(target=_monitorLoop, name="sslrpc2 monitor")
+			_monitorThread.daemon = True
+			_monitorThread.start()
+
+
+class Batch(object):
+	"""
+	Calls that are sent in one message, see Proxy.batch()
+	"""
+	def __init__(self, proxy):
+		self._proxy = proxy
+		self._calls = []
+		self._pending = []
+
+	def call(self, name, *args, **kwargs):
+		pending = self._proxy._pending()
+		self._calls.append(Request(None, name, list(args), kwargs))
+		self._pending.append(pending)
+		return pending
+
+	def __getattr__(self, name):
+		if name.startswith("__"):
+			raise AttributeError(name)
+		return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+
+	def execute(self):
+		"""
+		send all collected calls and wait for their results.
+		"""
+		calls, pending = self._calls, self._pending
+		self._calls, self._pending = [], []
+		if not calls:
+			return
+		request = BatchRequest(self._proxy._nextId(), calls)
+		try:
+			results = self._proxy._send(request).get()
+		except Exception, err:
+			for p in pending:
+				p.fail(err)
+			return
+		for p, (result, value) in zip(pending, results):
+			p.resolve(Reply(request.id, result, value))
+		for p in pending[len(results):]:
+			p.fail(MessageError(MessageError.MissingBatchResult, request.id))
+
+	def abort(self, error):
+		"""
+		fail all collected calls with the given error without sending them.
+		"""
+		pending = self._pending
+		self._calls, self._pending = [], []
+		for p in pending:
+			p.fail(error)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		if exc_type is None:
+			self.execute()
+		else:
+			self.abort(exc_val if isinstance(exc_val, BaseException) else exc_type(exc_val))
+
+
 class MethodProxy:
 	def __init__(self, proxy, name, info):
 		self.proxy = proxy
@@ -572,14 +1196,13 @@ class MethodProxy:
 	def __call__(self, *args, **kwargs):
 		return self.proxy._call(self.name, args, kwargs)
 
-	def _asyncCall(self, callback, error, args, kwargs):
-		try:
-			res = self(*args, **kwargs)
-		except Exception, exc:
-			if error:
-				error(exc)
-			return
-		callback(res)
+	def submit(self, *args, **kwargs):
+		"""
+		send the call without waiting for its reply.
+		:return: the pending call, its get() returns the result.
+		:rtype: PendingCall
+		"""
+		return self.proxy._submit(self.name, args, kwargs)
 
 	def async(self, callback, args, kwargs=None, error=None):
 		if not kwargs: kwargs = {}
@@ -587,4 +1210,12 @@ class MethodProxy:
 			raise TypeError("Callback not callable")
 		if error and not callable(error):
 			raise TypeError("Error callback not callable")
-		thread.start_new_thread(self._asyncCall, (callback, error, args, kwargs))
+		def done(call):
+			try:
+				res = call.get()
+			except Exception, exc:
+				if error:
+					error(exc)
+				return
+			callback(res)
+		self.submit(*args, **kwargs).add_done_callback(done)
@@ -17,7 +17,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.	If not, see <http://www.gnu.org/licenses/>
 
-import xmlrpclib, socket, SocketServer, BaseHTTPServer, gzip, sys
+import xmlrpclib, socket, SocketServer, BaseHTTPServer, gzip, sys, select
 from OpenSSL import SSL
 
 """
@@ -82,10 +82,15 @@ if not hasattr(SocketServer.BaseServer, "shutdown_request"):
 
 # Bugfix: _fileobject does not handle OpenSSL WantReadErrors well
 class WrappedSSLConnection:
-	def __init__(self, con):
+	def __init__(self, con, timeout=None):
 		self._con = con
+		self._timeout = timeout
 
 	def recv(self, *args, **kwargs):
+		# the socket stays blocking for OpenSSL, so the timeout is applied by waiting for data here
+		if self._timeout is not None and not self._con.pending():
+			if not select.select([self._con], [], [], self._timeout)[0]:
+				raise socket.timeout("timed out")
 		try:
 			return self._con.recv(*args, **kwargs)
 		except SSL.WantReadError, err:
@@ -104,10 +109,17 @@ class WrappedSSLConnection:
 class SecureRequestHandler:
 	def setup(self):
 		self.connection = self.request
+		try:
+			# responses are written at once, do not wait for more data
+			self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		except:
+			pass
 		if self.server.sslOpts:
-			self.rfile = socket._fileobject(WrappedSSLConnection(self.request), "rb", self.rbufsize)
+			self.rfile = socket._fileobject(WrappedSSLConnection(self.request, self.timeout), "rb", self.rbufsize)
 			self.wfile = socket._fileobject(WrappedSSLConnection(self.request), "wb", self.wbufsize)
 		else:
+			if self.timeout is not None:
+				self.connection.settimeout(self.timeout)
 			self.rfile = self.connection.makefile('rb', self.rbufsize)
 			self.wfile = self.connection.makefile('wb', self.wbufsize)
 
@@ -147,13 +159,20 @@ class SecureServer():
 
 
 class XMLRPCHandler(SecureRequestHandler, BaseHTTPServer.BaseHTTPRequestHandler):
+	# HTTP/1.1 keeps connections open for further requests (keep-alive).
+	# Idle connections are closed after timeout seconds.
+	protocol_version = "HTTP/1.1"
+	timeout = 120
+	# buffer the response, it is flushed by handle_one_request
+	wbufsize = -1
+
 	def do_POST(self):
 		with self.server.wrapper:
 			credentials = self.getCredentials()
 			sslCert = self.getSSLCertificate()
 			if not self.server.checkAuth(credentials, sslCert):
 				self.send_error(403)
-				return self.finish()
+				return
 			(method, args, kwargs) = self.getRpcRequest()
 			func = self.server.findMethod(method)
 			if not func:
@@ -164,7 +183,7 @@ class XMLRPCHandler(SecureRequestHandler, BaseHTTPServer.BaseHTTPRequestHandler)
 				self.send((ret,))
 			except ErrorUnauthorized:
 				self.send_error(403 if (credentials or sslCert) else 401)
-				return self.finish()
+				return
 			except Exception, err:
 				if not isinstance(err, xmlrpclib.Fault):
 					err = xmlrpclib.Fault(-1, str(err))
@@ -190,7 +209,6 @@ class XMLRPCHandler(SecureRequestHandler, BaseHTTPServer.BaseHTTPRequestHandler)
 		self.send_header("Content-Type", "text/xml")
 		self.end_headers()
 		self.wfile.write(res)
-		self.finish()
 
 	def getRpcRequest(self):
 		length = int(self.headers.get("Content-Length", None))
@@ -221,6 +239,9 @@ class DummyWrapper:
 		pass
 
 class XMLRPCServer(SecureServer, SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	# idle keep-alive connections must not keep the process from exiting
+	daemon_threads = True
+
 	def __init__(self, address, loginFunc=lambda u, p: True, sslOpts=False, wrapper=DummyWrapper(), beforeExecute=None, afterExecute=None,
 				 onError=None):
 		BaseHTTPServer.HTTPServer.__init__(self, address, XMLRPCHandler, bind_and_activate=not bool(sslOpts))
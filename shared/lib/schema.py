@@ -1,22 +1,41 @@
 import types, re
 from .error import UserError as Error
 
+def _compileOptions(options):
+	"""
+	:return: the options as a frozenset for fast lookups or None if the options are not hashable
+	"""
+	if options is None:
+		return None
+	try:
+		return frozenset(options)
+	except TypeError:
+		return None
+
 class Common(object):
-	__slots__ = ("options", "optionsDesc", "minValue", "maxValue", "null")
+	__slots__ = ("options", "optionsDesc", "minValue", "maxValue", "null", "_optionSet")
 	def __init__(self, options=None, optionsDesc=None, minValue=None, maxValue=None, null=False):
 		self.options = options
 		self.optionsDesc = optionsDesc
 		self.minValue = minValue
 		self.maxValue = maxValue
 		self.null = null
+		self._optionSet = _compileOptions(options)
 	def _error(self, reason, value):
 		raise Error(code=Error.INVALID_VALUE, message=reason, data={"value": value, "schema": self.describe()})
+	def _isOption(self, value):
+		if not self._optionSet is None:
+			try:
+				return value in self._optionSet
+			except TypeError:
+				pass
+		return value in self.options
 	def check(self, value):
 		if not self.null and value is None:
 			self._error("Value must not be null", value)
 		if value is None:
 			return
-		if not self.options is None and not value in self.options:
+		if not self.options is None and not self._isOption(value):
 			self._error("Value must be one of the given options", value)
 		if not self.minValue is None and value < self.minValue:
 			self._error("Value must not be below minimum", value)
@@ -110,12 +129,13 @@ class Sequence(Type):
 		return desc
 
 class String(Sequence):
-	__slots__ = ("regex",)
+	__slots__ = ("regex", "_pattern")
 	TYPES = types.StringTypes
 	TYPE_NAMES = ["string"]
 	def __init__(self, regex=None, **kwargs):
 		Sequence.__init__(self, **kwargs)
 		self.regex = regex
+		self._pattern = None  # compiled on first use
 	@property
 	def errormsg(self):
 		return "String must match regular expression"
@@ -123,7 +143,9 @@ class String(Sequence):
 		Sequence.check(self, value)
 		if value is None or self.regex is None:
 			return
-		if not re.match("^%s$" % self.regex, value):
+		if self._pattern is None:
+			self._pattern = re.compile("^%s$" % self.regex)
+		if not self._pattern.match(value):
 			self._error(self.errormsg, value)
 	def describe(self):
 		desc = Sequence.describe(self)
@@ -61,6 +61,8 @@ backend_api:
     enabled:  true
     auto-push:  true
     directory:  /var/log/tomato/dumps  # location where error dumps are stored
+    compression-level:  6  # zlib compression level of the dump data (1-9)
+    segment-size:  4194304  # dumps are appended to segment files, a new segment is started when the current one is larger than this (bytes)
     lifetime:  604800  # 7 days. Dumps older than this will be deleted. This does not affect dumps that have been collected by the dump manager.
   ssl:
     cert:  /etc/tomato/backend_api.pem
@@ -68,6 +70,12 @@ backend_api:
     ca:  /etc/tomato/ca.pem
   tasks:
     max-workers: 25
+  change-feed:
+    # follow the change feeds of backend_core and backend_users and only invalidate cached info
+    # about objects that have actually changed.
+    enabled:  true
+    poll-interval:  2  # seconds between two polls
+    list-cache-timeout:  300  # lifetime of cached lists while the change feed is followed
 
 backend_accounting:
   data-path: /data
@@ -86,6 +94,8 @@ backend_core:
     enabled:  true
     auto-push:  true
     directory:  /var/log/tomato/dumps  # location where error dumps are stored
+    compression-level:  6  # zlib compression level of the dump data (1-9)
+    segment-size:  4194304  # dumps are appended to segment files, a new segment is started when the current one is larger than this (bytes)
     lifetime:  604800  # 7 days. Dumps older than this will be deleted. This does not affect dumps that have been collected by the dump manager.
   ssl:
     cert:  /etc/tomato/backend_core.pem
@@ -104,6 +114,10 @@ backend_core:
     availability-factor: 0.9999946516564278  # (1/2) ^ (update_interval / availability_halftime)
   tasks:
     max-workers: 25
+    classes:  # maximum number of concurrently running tasks per task class
+      host_sync:  12
+      accounting:  6
+      link_ping:  6
 
 backend_users:
   paths:
@@ -112,6 +126,8 @@ backend_users:
     enabled:  true
     auto-push:  true
     directory:  /var/log/tomato/dumps  # location where error dumps are stored
+    compression-level:  6  # zlib compression level of the dump data (1-9)
+    segment-size:  4194304  # dumps are appended to segment files, a new segment is started when the current one is larger than this (bytes)
     lifetime:  604800  # 7 days. Dumps older than this will be deleted. This does not affect dumps that have been collected by the dump manager.
   ssl:
     cert:  /etc/tomato/backend_users.pem
@@ -132,6 +148,8 @@ backend_debug:
     enabled:  true
     auto-push:  true
     directory:  /var/log/tomato/dumps  # location where error dumps are stored
+    compression-level:  6  # zlib compression level of the dump data (1-9)
+    segment-size:  4194304  # dumps are appended to segment files, a new segment is started when the current one is larger than this (bytes)
     lifetime:  604800  # 7 days. Dumps older than this will be deleted. This does not affect dumps that have been collected by the dump manager.
   ssl:
     cert:  /etc/tomato/backend_debug.pem
@@ -151,6 +169,8 @@ web:
   dumps:
     enabled:  true
     directory:  /var/log/tomato/dumps  # location where error dumps are stored
+    compression-level:  6  # zlib compression level of the dump data (1-9)
+    segment-size:  4194304  # dumps are appended to segment files, a new segment is started when the current one is larger than this (bytes)
   ssl:
     cert:  /etc/tomato/web.pem
     key:  /etc/tomato/web.pem
@@ -182,6 +202,35 @@ web:
   account-info-update-interval: 120
 
 rpc-timeout: 300
+rpc-connections:
+  # connections between backend modules (sslrpc2)
+  pool-size:  4  # maximum number of connections to each module. Calls are spread over these connections.
+  heartbeat-interval:  30  # idle connections are checked by a ping after this many seconds
+rpc-server:
+  # execution of requests from other backend modules (sslrpc2)
+  max-workers:  50  # maximum number of requests that are executed at the same time
+  connection-queue-size:  20  # no more requests are read from a connection while this many of its requests are unfinished
+  request-timeout:  300  # requests that waited longer than this many seconds are rejected
+  batch-parallelism:  4  # maximum number of calls of one batch request that are executed at the same time
+locks:
+  # per-object locks of entities
+  statistics:  false  # count lock contention and record lock holders, shown in debug_stats
+logging:
+  # log entries are written by a background thread
+  queue-size:  10000  # maximum number of entries waiting to be written
+  overflow:  drop  # what to do when the queue is full: drop (entries are counted) or block
+  batch-size:  100  # maximum number of entries written at once
+  max-size:  104857600  # rotate the log file when it is larger than this (bytes). 0 to disable
+  rotate-interval:  0  # rotate the log file after this many seconds. 0 to disable
+  backup-count:  5  # number of rotated log files to keep
+  categories: {}  # entries of categories set to false are not logged, e.g. {host: false}
+  api-calls:
+    # logging of API calls
+    mode:  calls  # calls: one entry per call, aggregate: summary per method (count, errors, times) every aggregate-interval, off
+    sample-rate:  1.0  # fraction of calls that are logged in calls mode
+    sample-rates: {}  # sample rates of single methods, e.g. {element_info: 0.01, host_info: 0.01}
+    max-arg-length:  1000  # strings in arguments are truncated to this length. 0 to disable
+    aggregate-interval:  60  # seconds between two summaries in aggregate mode
 
 email:
   smtp-server: localhost
@@ -225,6 +274,8 @@ topologies:
   timeout-destroy: 1209600  # 14 days - topology destructed n seconds after timeout
   timeout-remove: 7776000  # 90 days - topology removed n seconds after timeout
   timeout-options: [86400, 259200, 1209600, 2592000]  # 1, 3, 14, 30 days
+  prepare-parallelism: 10  # maximum number of elements that are prepared at the same time
+  prepare-per-host: 2  # maximum number of elements that are prepared on one host at the same time
 
 user-quota:
   default:
@@ -236,6 +287,8 @@ user-quota:
 
 dumpmanager:
   collection-interval: 1800  # 30 minutes. Interval in which the dumpmanager will collect error dumps from sources.
+  fetch-concurrency: 4  # maximum number of sources the dumpmanager collects dumps from at the same time
+  fetch-page-size: 100  # number of dumps that are collected from a source at once. Their data is only collected when a dump is opened.
   api_store_secret_key: "CHANGEME"  # secret key to store dumps from anonymous API calls
 
 debugging:
@@ -334,6 +387,8 @@ class Config:
 	TOPOLOGY_TIMEOUT_DESTROY = 'timeout-destroy'
 	TOPOLOGY_TIMEOUT_REMOVE = 'timeout-remove'
 	TOPOLOGY_TIMEOUT_OPTIONS = 'timeout-options'
+	TOPOLOGY_PREPARE_PARALLELISM = 'prepare-parallelism'
+	TOPOLOGY_PREPARE_PER_HOST = 'prepare-per-host'
 
 	HOST_UPDATE_INTERVAL = 'update-interval'
 	HOST_AVAILABILITY_HALFTIME = 'availability-halftime'
@@ -342,12 +397,17 @@ class Config:
 	HOST_AVAILABILITY_FACTOR = 'availability-factor'
 
 	DUMPMANAGER_COLLECTION_INTERVAL = "collection-interval"
+	DUMPMANAGER_FETCH_CONCURRENCY = "fetch-concurrency"
+	DUMPMANAGER_FETCH_PAGE_SIZE = "fetch-page-size"
 	DUMPS_ENABLED = "enabled"
 	DUMPS_DIRECTORY = "directory"
 	DUMPS_LIFETIME = "lifetime"
 	DUMPS_AUTO_PUSH = "auto-push"
+	DUMPS_COMPRESSION_LEVEL = "compression-level"
+	DUMPS_SEGMENT_SIZE = "segment-size"
 
 	TASKS_MAX_WORKERS = 'max-workers'
+	TASKS_CLASSES = 'classes'
 
 	GITHUB_ACCESS_TOKEN = "access-token"
 	GITHUB_REPOSITORY_OWNER = "repository-owner"
@@ -409,7 +469,7 @@ class SettingsProvider:
 	def get_tasks_settings(self):
 		"""
 		get the tasks settings of the current module
-		:return: dict containing Config.TASKS_MAX_WORKERS
+		:return: dict containing Config.TASKS_MAX_WORKERS and optionally Config.TASKS_CLASSES
 		:rtype: dict
 		"""
 		InternalError.check('tasks' in self.original_settings[self.tomato_module], code=InternalError.CONFIGURATION_ERROR, message="tasks configuration missing")
@@ -459,6 +519,16 @@ class SettingsProvider:
 		InternalError.check('duration-log' in self.original_settings[self.tomato_module], code=InternalError.CONFIGURATION_ERROR, message="duration log configuration missing")
 		return {k: v for k, v in self.original_settings[self.tomato_module]['duration-log'].iteritems()}
 
+	def get_change_feed_settings(self):
+		"""
+		get the settings for following the change feeds of other modules
+		:return: dict containing 'enabled', 'poll-interval', 'list-cache-timeout'
+		:rtype: dict
+		"""
+		conf = dict(default_settings[self.tomato_module].get('change-feed', {'enabled': False}))
+		conf.update(self.original_settings[self.tomato_module].get('change-feed') or {})
+		return conf
+
 	def get_host_connections_settings(self):
 		"""
 		get host connections settings
@@ -521,6 +591,18 @@ class SettingsProvider:
 		"""
 		return self.original_settings[self.tomato_module]['paths']['log']
 
+	def get_logging_settings(self):
+		"""
+		get the settings of the logger
+		:return: dict containing 'queue-size', 'overflow', 'batch-size', 'max-size', 'rotate-interval', 'backup-count',
+		         'categories' and 'api-calls' (dict containing 'mode', 'sample-rate', 'sample-rates', 'max-arg-length', 'aggregate-interval')
+		:rtype: dict
+		"""
+		conf = dict(default_settings['logging'])
+		conf.update(self.original_settings.get('logging') or {})
+		conf['api-calls'] = dict(default_settings['logging']['api-calls'], **(conf.get('api-calls') or {}))
+		return conf
+
 	def get_github_settings(self):
 		"""
 		get the github config
@@ -538,6 +620,36 @@ class SettingsProvider:
 		"""
 		return self.original_settings['rpc-timeout']
 
+	def get_rpc_connection_settings(self):
+		"""
+		get the settings for connections between backend modules
+		:return: dict containing 'pool-size', 'heartbeat-interval'
+		:rtype: dict
+		"""
+		conf = dict(default_settings['rpc-connections'])
+		conf.update(self.original_settings.get('rpc-connections') or {})
+		return conf
+
+	def get_rpc_server_settings(self):
+		"""
+		get the settings for executing requests from other backend modules
+		:return: dict containing 'max-workers', 'connection-queue-size', 'request-timeout', 'batch-parallelism'
+		:rtype: dict
+		"""
+		conf = dict(default_settings['rpc-server'])
+		conf.update(self.original_settings.get('rpc-server') or {})
+		return conf
+
+	def get_lock_settings(self):
+		"""
+		get the settings for per-object locks
+		:return: dict containing 'statistics'
+		:rtype: dict
+		"""
+		conf = dict(default_settings['locks'])
+		conf.update(self.original_settings.get('locks') or {})
+		return conf
+
 	def get_user_quota(self, config_name):
 		"""
 		get quota parameters for the configuration configured in settings under this name
@@ -562,19 +674,19 @@ class SettingsProvider:
 	def get_dump_config(self):
 		"""
 		get the dump config
-		:return: dict containing 'enabled', 'directory', 'lifetime'
+		:return: dict containing 'enabled', 'directory', 'lifetime', 'auto-push', 'compression-level', 'segment-size'
 		"""
 		return {k: v for k, v in self.original_settings[self.tomato_module]['dumps'].iteritems()}
 
 	def get_dumpmanager_config(self):
 		"""
 		get the dumpmanager config
-		:return: dict containing the parameter 'collection-interval'
+		:return: dict containing the parameters 'collection-interval', 'fetch-concurrency' and 'fetch-page-size'
 		:rtype: dict
 		"""
-		return {
-			'collection-interval': self.original_settings['dumpmanager']['collection-interval']
-		}
+		conf = dict(default_settings['dumpmanager'])
+		conf.update(self.original_settings.get('dumpmanager') or {})
+		return {k: conf[k] for k in ('collection-interval', 'fetch-concurrency', 'fetch-page-size')}
 
 	def get_email_settings(self, message_type):
 		"""
@@ -4,15 +4,75 @@ Created on Jan 24, 2014
 @author: dswd
 '''
 
-import threading, time, random
+import threading, time, random, heapq
 from .error import Error
 from .exceptionhandling import wrap_and_handle_current_exception
 
 MAX_WAIT = 3600.0
+BLOCKED_WAIT = 1.0 # maximal wait while due tasks are held back because their class has used up its budget
+PRIORITY_STEP = 5.0 # seconds of lateness that one priority level is worth
+LATENESS_BUCKETS = (0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+class TaskClass(object):
+	"""
+	A family of tasks that share a concurrency budget.
+	Tasks of a class whose budget is used up stay queued, so slow tasks of one class can not delay the others.
+	When several classes have due tasks, the task with the highest priority is chosen. Each priority level
+	is worth PRIORITY_STEP seconds of lateness, so low priority tasks are not delayed forever.
+	"""
+	__slots__ = ("name", "maxConcurrent", "priority", "running", "queue", "lateness")
+	DEFAULT = "default"
+	HOST_SYNC = "host_sync"
+	ACCOUNTING = "accounting"
+	LINK_PING = "link_ping"
+	HOUSEKEEPING = "housekeeping"
+	DUMP_FETCH = "dump_fetch"
+
+	def __init__(self, name, maxConcurrent=None, priority=0):
+		"""
+		:param str name: name of the class
+		:param int maxConcurrent: maximum number of tasks of this class that are executed at the same time. None for no limit.
+		:param int priority: priority of tasks of this class
+		"""
+		self.name = name
+		self.maxConcurrent = maxConcurrent
+		self.priority = priority
+		self.running = 0
+		self.queue = [] # heap of (next, taskId). Entries are removed lazily: they are only valid while task.next matches and the task is not busy.
+		self.lateness = [0] * len(LATENESS_BUCKETS)
+	def available(self):
+		return self.maxConcurrent is None or self.running < self.maxConcurrent
+	def enqueue(self, taskId, task, tasks):
+		heapq.heappush(self.queue, (task.next, taskId))
+		if len(self.queue) > 2 * len(tasks) + 100:
+			# too many invalid entries, rebuild the heap
+			self.queue = [(t.next, tid) for tid, t in tasks.iteritems() if t.taskClass == self.name and not t.busy]
+			heapq.heapify(self.queue)
+	def head(self, tasks):
+		while self.queue:
+			next_, taskId = self.queue[0]
+			task = tasks.get(taskId)
+			if task is not None and not task.busy and task.next == next_:
+				return (taskId, task)
+			heapq.heappop(self.queue)
+		return (None, None)
+	def recordLateness(self, lateness):
+		for i, limit in enumerate(LATENESS_BUCKETS):
+			if lateness <= limit:
+				self.lateness[i] += 1
+				return
+	def info(self, tasks):
+		return {
+			"max_concurrent": self.maxConcurrent,
+			"priority": self.priority,
+			"running": self.running,
+			"queued": len([t for t in tasks.itervalues() if t.taskClass == self.name and not t.busy]),
+			"lateness": [[str(limit), count] for limit, count in zip(LATENESS_BUCKETS, self.lateness)]
+		}
 
 class Task(object):
-	__slots__ = ("timeout", "repeated", "fn", "args", "kwargs", "next_timeout", "busy", "next", "last", "duration", "success")
-	def __init__(self, fn, args=None, kwargs=None, timeout=0, repeated=False, immediate=False, random_offset=True):
+	__slots__ = ("timeout", "repeated", "fn", "args", "kwargs", "next_timeout", "busy", "next", "last", "duration", "success", "taskClass")
+	def __init__(self, fn, args=None, kwargs=None, timeout=0, repeated=False, immediate=False, random_offset=True, taskClass=TaskClass.DEFAULT):
 		if not kwargs:
 			kwargs = {}
 		if not args:
@@ -22,6 +82,7 @@ class Task(object):
 		self.fn = fn
 		self.args = args
 		self.kwargs = kwargs
+		self.taskClass = taskClass
 
 		# if random offset to be used as first timeout, next_timeout must be randomly selected.
 		if random_offset:
@@ -66,6 +127,7 @@ class Task(object):
 			"args": [str(arg) for arg in self.args],
 			"kwargs": {name: str(value) for name, value in self.kwargs.items()},
 			"repeated": self.repeated,
+			"class": self.taskClass,
 			"timeout": self.timeout,
 			"next": self.next,
 			"last": self.last,
@@ -74,17 +136,26 @@ class Task(object):
 		}
 
 class TaskScheduler(threading.Thread):
-	__slots__ = ("tasks", "tasksLock", "nextId", "workers", "workersLock", "stopped", "wakeup", "stopped_confirm", "maxLateTime", "maxWorkers", "minWorkers", "waitFrac")
+	__slots__ = ("tasks", "classes", "maintenanceTasks", "tasksLock", "nextId", "workers", "workersLock", "stopped", "wakeup", "changes", "stopped_confirm", "maxLateTime", "maxWorkers", "minWorkers", "waitFrac")
 	DAILY = 3600*24
-	def __init__(self, maxLateTime=2.0, maxWorkers=5, minWorkers=1):
+	def __init__(self, maxLateTime=2.0, maxWorkers=5, minWorkers=1, classes=None):
+		"""
+		:param float maxLateTime: start another worker if a task is later than this
+		:param int maxWorkers: maximum number of workers
+		:param int minWorkers: minimum number of workers
+		:param dict classes: concurrency budgets {class name: maximum number of concurrent tasks} that override the defaults
+		"""
 		self.tasks = {}
+		self.classes = {}
+		self.maintenanceTasks = {} # {maintenancefn: {ident: taskId}}
 		self.tasksLock = threading.RLock()
 		self.nextId = 1
 		self.workers = 0
 		self.workersLock = threading.RLock()
 		threading.Thread.__init__(self)
 		self.stopped = False
-		self.wakeup = threading.Event()
+		self.wakeup = threading.Condition(self.tasksLock) # notified when tasks or budgets change
+		self.changes = 0 # increased on every notification, so that workers do not miss one before they wait
 		self.stopped_confirm = threading.Event()
 		self.maxLateTime = maxLateTime
 		self.maxWorkers = maxWorkers
@@ -92,17 +163,75 @@ class TaskScheduler(threading.Thread):
 		self.waitFrac = 0.5
 		self.lastTask = 0
 		self.taskRate = 0
+		# slow RPCs to hosts must not occupy all workers
+		self.configureClass(TaskClass.DEFAULT, priority=1)
+		self.configureClass(TaskClass.HOUSEKEEPING, priority=2)
+		self.configureClass(TaskClass.LINK_PING, maxConcurrent=max(1, maxWorkers // 4), priority=1)
+		self.configureClass(TaskClass.HOST_SYNC, maxConcurrent=max(1, maxWorkers // 2), priority=0)
+		self.configureClass(TaskClass.ACCOUNTING, maxConcurrent=max(1, maxWorkers // 4), priority=0)
+		self.configureClass(TaskClass.DUMP_FETCH, maxConcurrent=max(1, maxWorkers // 4), priority=0)
+		for name, maxConcurrent in (classes or {}).items():
+			self.configureClass(name, maxConcurrent=maxConcurrent)
+	def configureClass(self, name, maxConcurrent=None, priority=None):
+		"""
+		create or change a task class.
+		:param str name: name of the class
+		:param int maxConcurrent: maximum number of tasks of this class that are executed at the same time. None for no limit.
+		:param int priority: priority of this class. None to keep the current priority (0 for new classes).
+		"""
+		with self.tasksLock:
+			cls = self.classes.get(name)
+			if cls is None:
+				cls = self.classes[name] = TaskClass(name, maxConcurrent, priority or 0)
+			else:
+				cls.maxConcurrent = maxConcurrent
+				if priority is not None:
+					cls.priority = priority
+		self._notify()
+	def _notify(self):
+		with self.tasksLock:
+			self.changes += 1
+			self.wakeup.notify_all()
+	def _class(self, task):
+		cls = self.classes.get(task.taskClass)
+		if cls is None:
+			cls = self.classes[task.taskClass] = TaskClass(task.taskClass)
+		return cls
+	def _enqueue(self, taskId, task):
+		self._class(task).enqueue(taskId, task, self.tasks)
 	def _nextTask(self):
-		try:
-			with self.tasksLock:
-				availableTasks = filter(lambda (tid, task): not task.busy, self.tasks.items())
-				return min(availableTasks, key=lambda (tid, task): task.next)
-		except ValueError:
-			return (None, None)
+		"""
+		select the task to be executed next, ignoring classes that have used up their budget.
+		If tasks are due, the one with the best combination of priority and lateness is selected,
+		otherwise the one that will be due first.
+		"""
+		with self.tasksLock:
+			now = time.time()
+			best, bestKey = (None, None), None
+			for cls in self.classes.itervalues():
+				if not cls.available():
+					continue
+				taskId, task = cls.head(self.tasks)
+				if task is None:
+					continue
+				if task.next <= now:
+					key = (0, task.next - cls.priority * PRIORITY_STEP)
+				else:
+					key = (1, task.next)
+				if bestKey is None or key < bestKey:
+					best, bestKey = (taskId, task), key
+			return best
 	def _waitTime(self):
 		with self.tasksLock:
 			_, nextTask = self._nextTask()
-			return min(nextTask.next - time.time(), MAX_WAIT) if nextTask else MAX_WAIT
+			wait = min(nextTask.next - time.time(), MAX_WAIT) if nextTask else MAX_WAIT
+			if wait > BLOCKED_WAIT:
+				now = time.time()
+				for cls in self.classes.itervalues():
+					_, task = cls.head(self.tasks)
+					if not cls.available() and task is not None and task.next <= now:
+						return BLOCKED_WAIT
+			return wait
 	def _adaptWorkers(self, wait, mainThread):
 		startThread = False
 		with self.workersLock:
@@ -125,11 +254,14 @@ class TaskScheduler(threading.Thread):
 		return True #continue running
 	def _workerLoop(self, mainThread=False):
 		while not self.stopped:
-			wait = self._waitTime()
+			with self.tasksLock:
+				wait, changes = self._waitTime(), self.changes
 			if not self._adaptWorkers(wait, mainThread):
 				break
 			if wait > 0:
-				self.wakeup.wait(wait)
+				with self.tasksLock:
+					if self.changes == changes and not self.stopped:
+						self.wakeup.wait(wait)
 				if self.stopped:
 					break
 			taskId, _ = self._nextTask()
@@ -148,7 +280,13 @@ class TaskScheduler(threading.Thread):
 				return
 			if task.busy:
 				return
+			cls = self._class(task)
+			if not cls.available() and not force:
+				return
 			task.busy = True
+			cls.running += 1
+			if not force:
+				cls.recordLateness(time.time() - task.next)
 		task.execute()
 		now = time.time()
 		if int(now) % 60 != int(self.lastTask) % 60:
@@ -157,8 +295,13 @@ class TaskScheduler(threading.Thread):
 		self.lastTask = now
 		with self.tasksLock:
 			task.busy = False
+			cls.running -= 1
 			if not task.repeated:
-				del self.tasks[taskId]
+				self.tasks.pop(taskId, None)
+			elif taskId in self.tasks:
+				self._enqueue(taskId, task)
+		# workers might be waiting because the budget of this class was used up
+		self._notify()
 		return True
 	def run(self):
 		with self.workersLock:
@@ -169,48 +312,56 @@ class TaskScheduler(threading.Thread):
 		self._workerLoop(True)
 	def stop(self):
 		self.stopped = True
-		self.wakeup.set()
+		self._notify()
 		self.stopped_confirm.wait()
 	def _schedule(self, task):
-		taskid = self.nextId
-		self.tasks[taskid] = task
-		self.nextId += 1
-		self.wakeup.set()
-		self.wakeup.clear()
+		with self.tasksLock:
+			taskid = self.nextId
+			self.tasks[taskid] = task
+			self.nextId += 1
+			self._enqueue(taskid, task)
+		self._notify()
 		return taskid
 	def scheduleOnce(self, timeout, fn, *args, **kwargs):
-		return self._schedule(Task(fn, args, kwargs, timeout=timeout, repeated=False))
+		taskClass = kwargs.pop("taskClass", TaskClass.DEFAULT)
+		return self._schedule(Task(fn, args, kwargs, timeout=timeout, repeated=False, taskClass=taskClass))
 	def scheduleRepeated(self, timeout, fn, *args, **kwargs):
 		#print "Ignoring task %s" % fn
 		#return
 		immediate = kwargs.pop("immediate", True)
 		random_offset = kwargs.pop("random_offset", True)
-		return self._schedule(Task(fn, args, kwargs, timeout=timeout, repeated=True, immediate=immediate, random_offset=random_offset))
+		taskClass = kwargs.pop("taskClass", TaskClass.DEFAULT)
+		return self._schedule(Task(fn, args, kwargs, timeout=timeout, repeated=True, immediate=immediate, random_offset=random_offset, taskClass=taskClass))
 
-	def scheduleMaintenance(self, timeout, keyfn, maintenancefn):
+	def scheduleMaintenance(self, timeout, keyfn, maintenancefn, taskClass=TaskClass.DEFAULT):
 		"""
 		schedule maintenance for multiple objects.
 		Objects may be created or removed, without affecting maintenance (except for missing it once, maybe)
 		:param timeout: interval in which to run maintenance (per object)
 		:param keyfn: function which returns a list of object identifiers to be used by maintenancefn
 		:param maintenancefn: function takes an object identifier as argument, and runs the maintenance.
+		:param str taskClass: task class of the maintenance tasks. The scheduler itself is a housekeeping task.
 		:return: maintenance scheduler id
 		"""
+		current_tasks = self.maintenanceTasks.setdefault(maintenancefn, {})
 		def maintenance_scheduler():
 			to_sync = set(keyfn())
-			current_tasks = {t.args[0]: tid for tid, t in self.tasks.items() if t.fn == maintenancefn}
-			syncing = set(current_tasks.keys())
+			with self.tasksLock:
+				for ident, tid in current_tasks.items():
+					if not tid in self.tasks:
+						del current_tasks[ident]
+				syncing = set(current_tasks.keys())
 			for ident in to_sync - syncing:
-				self.scheduleRepeated(timeout, maintenancefn, ident, random_offset=True, immediate=True)
+				current_tasks[ident] = self.scheduleRepeated(timeout, maintenancefn, ident, random_offset=True, immediate=True, taskClass=taskClass)
 			for ident in syncing - to_sync:
-				self.cancelTask(current_tasks[ident])
+				self.cancelTask(current_tasks.pop(ident))
 		maintenance_scheduler.__name__ = "maintenance_scheduler:" + keyfn.__module__+"."+keyfn.__name__
 		maintenance_scheduler.__module__ = ""
-		self.scheduleRepeated(timeout, maintenance_scheduler, immediate=True)
+		self.scheduleRepeated(timeout, maintenance_scheduler, immediate=True, taskClass=TaskClass.HOUSEKEEPING)
 
 	def cancelTask(self, taskId):
 		with self.tasksLock:
-			del self.tasks[taskId]
+			del self.tasks[taskId] # its queue entry is dropped in TaskClass.head
 	def info(self):
 		tasks = []
 		with self.tasksLock:
@@ -218,8 +369,10 @@ class TaskScheduler(threading.Thread):
 				info = t.info()
 				info["id"] = id_
 				tasks.append(info)
+			classes = {name: cls.info(self.tasks) for name, cls in self.classes.items()}
 		info = {
 			"tasks": tasks,
+			"classes": classes,
 			"max_late_time": self.maxLateTime,
 			"max_workers": self.maxWorkers,
 			"min_workers": self.minWorkers,
@@ -0,0 +1 @@
+# unit tests of the shared library, e.g. python -m unittest tomato.lib.test.locks
@@ -0,0 +1,144 @@
+
+import unittest, threading, time
+from .. import cache
+
+class Test(unittest.TestCase):
+
+	def setUp(self):
+		self.calls = []
+		self.release = threading.Event()
+		self.release.set()
+		self.cache = cache.Cache(fn=self._fetch, tags=lambda value: value["tags"])
+
+	def tearDown(self):
+		self.release.set()
+
+	def _fetch(self, key):
+		self.calls.append(key)
+		call = len(self.calls)
+		self.release.wait()
+		return {"key": key, "call": call, "tags": [key[0]]}
+
+	def _get(self, key):
+		return self.cache.get((key,), {})
+
+	def _start(self, key):
+		"""
+		get the key in another thread and wait until the fetch is running or has joined a running one.
+		"""
+		result = []
+		calls = len(self.calls)
+		thread = threading.Thread(target=lambda: result.append(self._get(key)))
+		thread.start()
+		for _ in xrange(100):
+			if len(self.calls) > calls or self.cache._flights.get(cache.Cache.getKey((key,), {})) is not None:
+				break
+			time.sleep(0.01)
+		return thread, result
+
+	def test_cached(self):
+		self.assertEqual(self._get("a1")["call"], 1)
+		self.assertEqual(self._get("a1")["call"], 1)
+		self.assertEqual(self._get("b1")["call"], 2)
+		self.assertEqual(self.cache.peek(("a1",), {})["call"], 1)
+
+	def test_single_flight(self):
+		self.release.clear()
+		threads = [self._start("a1") for _ in xrange(5)]
+		time.sleep(0.05)
+		self.release.set()
+		for thread, _ in threads:
+			thread.join()
+		self.assertEqual(self.calls, ["a1"])
+		self.assertEqual([result[0]["call"] for _, result in threads], [1] * 5)
+
+	def test_single_flight_error(self):
+		def fail(key):
+			self.release.wait()
+			raise ValueError(key)
+		self.cache = cache.Cache(fn=fail)
+		self.release.clear()
+		errors = []
+		def get():
+			try:
+				self._get("a1")
+			except ValueError, err:
+				errors.append(err)
+		threads = [threading.Thread(target=get) for _ in xrange(3)]
+		for thread in threads:
+			thread.start()
+		time.sleep(0.05)
+		self.release.set()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(len(errors), 3)
+		self.assertFalse(self.cache.contains(("a1",), {}))
+		self.assertEqual(self.cache._flights, {})
+
+	def test_remove_during_fetch(self):
+		self.release.clear()
+		thread, _ = self._start("a1")
+		self.assertRaises(KeyError, self.cache.remove, ("a1",), {})
+		# later calls do not join the outdated fetch
+		second, result = self._start("a1")
+		self.release.set()
+		thread.join()
+		second.join()
+		self.assertEqual(self.calls, ["a1", "a1"])
+		self.assertEqual(result[0]["call"], 2)
+		self.assertEqual(self.cache.peek(("a1",), {})["call"], 2)
+
+	def test_clear_during_fetch(self):
+		self.release.clear()
+		thread, _ = self._start("a1")
+		self.cache.clear()
+		self.release.set()
+		thread.join()
+		self.assertFalse(self.cache.contains(("a1",), {}))
+
+	def test_invalidate_where_during_fetch(self):
+		self.release.clear()
+		first, _ = self._start("a1")
+		second, _ = self._start("b1")
+		self.cache.invalidate_where(lambda args, kwargs: args[0] == "a1")
+		self.release.set()
+		first.join()
+		second.join()
+		# only the result of the invalidated key is discarded
+		self.assertFalse(self.cache.contains(("a1",), {}))
+		self.assertTrue(self.cache.contains(("b1",), {}))
+
+	def test_invalidate_tag_during_fetch(self):
+		self._get("a1")
+		self.release.clear()
+		first, _ = self._start("a2")
+		second, _ = self._start("b1")
+		self.cache.invalidate_tag("a")
+		self.release.set()
+		first.join()
+		second.join()
+		self.assertFalse(self.cache.contains(("a1",), {}))
+		# the running fetch returned a value with the invalidated tag
+		self.assertFalse(self.cache.contains(("a2",), {}))
+		self.assertTrue(self.cache.contains(("b1",), {}))
+
+	def test_invalidate_tag(self):
+		self._get("a1")
+		self._get("a2")
+		self._get("b1")
+		self.cache.invalidate_tag("a")
+		self.assertFalse(self.cache.contains(("a1",), {}))
+		self.assertFalse(self.cache.contains(("a2",), {}))
+		self.assertTrue(self.cache.contains(("b1",), {}))
+		self.assertEqual(self.cache._tags.keys(), ["b"])
+
+	def test_eviction(self):
+		self.cache = cache.Cache(fn=self._fetch, maxSize=2)
+		self._get("a1")
+		self._get("a2")
+		self._get("a1")
+		self._get("a3")
+		# a2 is the least recently used entry
+		self.assertTrue(self.cache.contains(("a1",), {}))
+		self.assertFalse(self.cache.contains(("a2",), {}))
+		self.assertTrue(self.cache.contains(("a3",), {}))
@@ -0,0 +1,112 @@
+
+import unittest, os, shutil, tempfile
+from .. import dump_store
+
+class Test(unittest.TestCase):
+
+	def setUp(self):
+		self.temp = tempfile.mkdtemp()
+		self.compactMinRemoved = dump_store.COMPACT_MIN_REMOVED
+
+	def tearDown(self):
+		dump_store.COMPACT_MIN_REMOVED = self.compactMinRemoved
+		if os.path.exists(self.temp):
+			shutil.rmtree(self.temp)
+
+	def _store(self, **kwargs):
+		return dump_store.DumpStore(self.temp, **kwargs)
+
+	def _add(self, store, dump_id, timestamp, data=None):
+		store.add({"dump_id": dump_id, "timestamp": timestamp}, data if data is not None else {"id": dump_id})
+
+	def _segments(self):
+		return sorted(name for name in os.listdir(self.temp) if dump_store.SEGMENT_PATTERN.match(name))
+
+	def test_add(self):
+		store = self._store()
+		self._add(store, "b", 2.0, {"text": "x" * 1000})
+		self._add(store, "a", 1.0)
+		self.assertTrue(store.exists("a"))
+		self.assertFalse(store.exists("c"))
+		self.assertEqual(store.meta("b"), {"dump_id": "b", "timestamp": 2.0})
+		self.assertEqual(store.data("b"), {"text": "x" * 1000})
+		self.assertEqual(store.data("c"), None)
+		self.assertEqual(store.ids(), ["a", "b"])
+		self.assertEqual(store.count(), 2)
+		self.assertEqual(store.count(after=1.5), 1)
+
+	def test_remove(self):
+		store = self._store(segmentSize=1)
+		for i in xrange(3):
+			self._add(store, "d%d" % i, float(i))
+		self.assertEqual(len(self._segments()), 3)
+		store.remove(["d0", "unknown"])
+		self.assertEqual(store.ids(), ["d1", "d2"])
+		self.assertEqual(store.meta("d0"), None)
+		# the segment of the removed dump is deleted, the current segment is kept
+		self.assertEqual(len(self._segments()), 2)
+		store.remove(["d1", "d2"])
+		self.assertEqual(store.ids(), [])
+		self.assertEqual(len(self._segments()), 1)
+
+	def test_compaction(self):
+		dump_store.COMPACT_MIN_REMOVED = 0
+		store = self._store()
+		for i in xrange(4):
+			self._add(store, "d%d" % i, float(i))
+		index = os.path.join(self.temp, dump_store.INDEX_FILE)
+		size = os.path.getsize(index)
+		store.remove(["d0"])
+		# one removal in an index of three dumps is not worth a rewrite
+		self.assertTrue(os.path.getsize(index) > size)
+		store.remove(["d1", "d2"])
+		self.assertTrue(os.path.getsize(index) < size)
+		self.assertEqual(store.ids(), ["d3"])
+		self.assertEqual(store.data("d3"), {"id": "d3"})
+		self._add(store, "d4", 4.0)
+		self.assertEqual(self._store().ids(), ["d3", "d4"])
+
+	def test_reopen(self):
+		store = self._store()
+		for i in xrange(3):
+			self._add(store, "d%d" % i, float(i))
+		store.remove(["d1"])
+		store = self._store()
+		self.assertEqual(store.ids(), ["d0", "d2"])
+		self.assertEqual(store.data("d2"), {"id": "d2"})
+
+	def test_shared_directory(self):
+		dump_store.COMPACT_MIN_REMOVED = 0
+		first, second = self._store(), self._store()
+		for i in xrange(3):
+			self._add(first, "d%d" % i, float(i))
+		self.assertEqual(second.ids(), ["d0", "d1", "d2"])
+		# the index is rewritten by the first store, the second has to read it again
+		first.remove(["d0", "d1"])
+		self.assertEqual(second.ids(), ["d2"])
+		self._add(second, "d3", 3.0)
+		self.assertEqual(first.ids(), ["d2", "d3"])
+		self.assertEqual(first.data("d3"), {"id": "d3"})
+
+	def test_incomplete_index(self):
+		store = self._store()
+		self._add(store, "d0", 0.0)
+		with open(os.path.join(self.temp, dump_store.INDEX_FILE), "a") as f:
+			f.write('{"add": {"dump_id": "d1"')
+		store = self._store()
+		self.assertEqual(store.ids(), ["d0"])
+		self._add(store, "d1", 1.0)
+		self.assertEqual(self._store().ids(), ["d0", "d1"])
+
+	def test_paging(self):
+		store = self._store()
+		for dump_id, timestamp in [("a", 1.0), ("b", 2.0), ("c", 2.0), ("d", 2.0), ("e", 3.0)]:
+			self._add(store, dump_id, timestamp)
+		self.assertEqual(store.ids(limit=2), ["a", "b"])
+		# the next page starts after the last dump of the previous one, even with the same timestamp
+		self.assertEqual(store.ids(after=2.0, afterId="b", limit=2), ["c", "d"])
+		self.assertEqual(store.ids(after=2.0, afterId="d", limit=2), ["e"])
+		self.assertEqual(store.ids(after=3.0, afterId="e", limit=2), [])
+		self.assertEqual(store.ids(after=2.0), ["b", "c", "d", "e"])
+		self.assertEqual(store.ids(before=2.0), ["a", "b", "c", "d"])
+		self.assertEqual(store.ids(after=1.5, before=2.5, limit=10), ["b", "c", "d"])
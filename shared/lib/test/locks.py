@@ -0,0 +1,74 @@
+
+import unittest, threading
+from .. import locks
+
+class Test(unittest.TestCase):
+
+	def setUp(self):
+		self.registry = locks.LockRegistry("test")
+
+	def tearDown(self):
+		locks._registries.pop("test", None)
+
+	def _otherThread(self, fn):
+		result = []
+		thread = threading.Thread(target=lambda: result.append(fn()))
+		thread.start()
+		thread.join()
+		return result[0]
+
+	def test_reclaim(self):
+		lock = self.registry.get("a")
+		with lock:
+			self.assertTrue(self.registry.isLocked("a"))
+			self.assertEqual(len(self.registry), 1)
+		# the entry is removed with the last reference
+		self.assertFalse(self.registry.isLocked("a"))
+		self.assertEqual(len(self.registry), 0)
+
+	def test_reentrant(self):
+		lock = self.registry.get("a")
+		with lock:
+			with self.registry.get("a"):
+				self.assertEqual(len(self.registry), 1)
+			# still held by the outer acquisition
+			self.assertTrue(self.registry.isLocked("a"))
+			self.assertFalse(self._otherThread(lambda: self.registry.get("a").acquire(False)))
+		self.assertEqual(len(self.registry), 0)
+
+	def test_nonblocking_failure(self):
+		with self.registry.get("a"):
+			self.assertFalse(self._otherThread(lambda: self.registry.get("a").acquire(False)))
+			# the failed acquisition must not leave a reference behind
+			self.assertEqual(self.registry._entries["a"].refs, 1)
+			# other keys are independent
+			self.assertTrue(self._otherThread(lambda: self.registry.get("b").acquire(False)))
+		self.assertFalse(self.registry.isLocked("a"))
+
+	def test_nonblocking_failure_statistics(self):
+		self.registry.statistics = True
+		with self.registry.get("a"):
+			self.assertFalse(self._otherThread(lambda: self.registry.get("a").acquire(False)))
+			self.assertEqual(self.registry._entries["a"].refs, 1)
+			info = self.registry.info()
+			self.assertEqual(info["acquisitions"], 1)
+			self.assertEqual([h["key"] for h in info["holders"]], [repr("a")])
+		self.assertEqual(len(self.registry), 0)
+
+	def test_release_unacquired(self):
+		self.assertRaises(RuntimeError, self.registry.get("a").release)
+
+	def test_exclusive(self):
+		lock = self.registry.get("a")
+		lock.acquire()
+		acquired = threading.Event()
+		def wait():
+			with self.registry.get("a"):
+				acquired.set()
+		thread = threading.Thread(target=wait)
+		thread.start()
+		self.assertFalse(acquired.wait(0.2))
+		lock.release()
+		thread.join()
+		self.assertTrue(acquired.is_set())
+		self.assertEqual(len(self.registry), 0)
@@ -17,7 +17,8 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>
 
 from django.http import HttpResponse
-import xmlrpclib, urllib, hashlib, time
+import xmlrpclib, urllib, hashlib, time, threading
+from collections import OrderedDict
 from django.utils.functional import cached_property
 
 import anyjson as json
@@ -139,18 +140,78 @@ def log_api_duration(name, duration, args, kwargs):
 def get_server_proxy(url, **kwargs):
 	return ServerProxy(url, **kwargs)
 
+class TransportPool:
+	"""
+	Keeps idle transports for reuse, so that their HTTP/1.1 connections to backend_api are kept alive
+	across requests.
+	Transports are keyed by the url, which contains the credentials of the user.
+	A transport is only used by one thread at a time.
+	"""
+	def __init__(self, size=4, keys=100):
+		"""
+		:param int size: maximum number of idle transports per url
+		:param int keys: maximum number of urls with idle transports. Transports of the least recently used urls are closed.
+		"""
+		self.size = size
+		self.keys = keys
+		self._idle = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, url):
+		with self._lock:
+			idle = self._idle.pop(url, None)
+			if idle:
+				transport = idle.pop()
+				if idle:
+					self._idle[url] = idle
+				return transport
+		if url.startswith("https"):
+			return xmlrpclib.SafeTransport()
+		return xmlrpclib.Transport()
+
+	def put(self, url, transport):
+		closing = []
+		with self._lock:
+			idle = self._idle.pop(url, [])
+			if len(idle) < self.size:
+				idle.append(transport)
+			else:
+				closing.append(transport)
+			self._idle[url] = idle
+			while len(self._idle) > self.keys:
+				closing += self._idle.popitem(last=False)[1]
+		for t in closing:
+			t.close()
+
+_transports = TransportPool()
+
 class ServerProxy(object):
 	def __init__(self, url, **kwargs):
-		self._xmlrpc_server_proxy = xmlrpclib.ServerProxy(url, **kwargs)
+		self._url = url
+		self._kwargs = kwargs
 
-	def __getattr__(self, name):
-		call_proxy = getattr(self._xmlrpc_server_proxy, name)
+	def _request(self, name, args, kwargs):
+		transport = _transports.get(self._url)
+		try:
+			res = getattr(xmlrpclib.ServerProxy(self._url, transport=transport, **self._kwargs), name)(args, kwargs)
+		except xmlrpclib.Fault:
+			# the response has been read completely, the connection can be used again
+			_transports.put(self._url, transport)
+			raise
+		except:
+			transport.close()
+			raise
+		_transports.put(self._url, transport)
+		return res
 
+	def __getattr__(self, name):
+		if name.startswith("__"):
+			raise AttributeError(name)
 		def _call(*args, **kwargs):
 			import time
 			try:
 				before = time.time()
-				res = call_proxy(args, kwargs)
+				res = self._request(name, args, kwargs)
 				after = time.time()
 				if settings.get_duration_log_settings()['enabled']:
 					start_new_thread(